@@ -0,0 +1 @@
+"""Benchmarks for the statement parsers, payee mapping and csv writing. Run with `python -m benchmarks`."""
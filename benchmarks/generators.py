@@ -0,0 +1,170 @@
+"""Synthetic statements in the formats ynabify reads, with made-up but realistic-looking memos.
+
+All generators are deterministic for a given seed and write with openpyxl or plain file I/O,
+so generating does not skew what pandas has cached when parsing is timed.
+"""
+
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import openpyxl
+
+_SYLLABLES = ("ko", "ra", "mi", "sto", "lan", "ber", "gi", "zu", "wel", "tor", "fa", "nik", "ho", "sel", "da")
+_CITIES = ("ZURICH", "BERN", "BASEL", "LUZERN", "WINTERTHUR", "ST. GALLEN", "MOUNTAIN VIEW", "SAN FRANCISCO")
+_RAIFFEISEN_KINDS = ("Einkauf", "Gutschrift", "E-Banking Auftrag", "Lastschrift", "Bargeldbezug")
+_FIRST_DAY = date(2024, 1, 1)
+
+
+def merchants(n: int, seed: int = 0) -> list[str]:
+    """Return n distinct upper case merchant names."""
+    rng = random.Random(seed)  # noqa: S311 - test data, not security relevant
+    names: dict[str, None] = {}
+    while len(names) < n:
+        n_syllables = rng.randint(2, 5)
+        word = "".join(rng.choice(_SYLLABLES) for _ in range(n_syllables)).upper()
+        if rng.getrandbits(1):
+            word += " " + rng.choice(("AG", "GMBH", "SHOP", "MARKT", "CAFE", "LLC"))
+        names[word] = None
+    return list(names)
+
+
+def _cents(rng: random.Random, inflow_share: float) -> int:
+    cents = int(rng.lognormvariate(7.5, 1.2))
+    return cents if rng.random() < inflow_share else -cents
+
+
+def _amount(cents: int) -> str:
+    return format(Decimal(cents).scaleb(-2), "f")
+
+
+def raiffeisen_csv(
+    path: Path,
+    n_transactions: int,
+    n_ibans: int = 3,
+    continuation_share: float = 0.4,
+    seed: int = 0,
+) -> Path:
+    """Write a Raiffeisen export with n_transactions booked rows spread over n_ibans accounts.
+
+    About continuation_share of the bookings are followed by one to three continuation rows
+    that only carry more memo text, as e-banking orders and card payments are in real exports.
+    """
+    rng = random.Random(seed)  # noqa: S311 - test data, not security relevant
+    names = merchants(max(50, n_transactions // 20), seed)
+    ibans = [f"CH{rng.randrange(10**19):019d}" for _ in range(n_ibans)]
+    balances = [rng.randrange(10**5, 10**7) for _ in range(n_ibans)]
+    with path.open("w", encoding="cp1252", newline="") as handle:
+        handle.write("IBAN;Booked At;Text;Credit/Debit Amount;Balance;Valuta Date\r\n")
+        for i in range(n_transactions):
+            account = rng.randrange(n_ibans)
+            day = f"{_FIRST_DAY + timedelta(days=i * 365 // max(n_transactions, 1)):%Y-%m-%d} 00:00:00.0"
+            cents = _cents(rng, 0.1)
+            balances[account] += cents
+            text = f"{rng.choice(_RAIFFEISEN_KINDS)} {rng.choice(names)}, {rng.choice(_CITIES)}"
+            handle.write(f"{ibans[account]};{day};{text};{_amount(cents)};{_amount(balances[account])};{day}\r\n")
+            if rng.random() < continuation_share:
+                for _ in range(rng.randint(1, 3)):
+                    handle.write(f";;{rng.choice(names)} CHF {_amount(abs(cents))};;;\r\n")
+    return path
+
+
+_SWISSCARD_COLUMNS = {
+    "de": (
+        "Transaktionsdatum",
+        "Beschreibung",
+        "Händler",
+        "Kartennummer",
+        "Währung",
+        "Betrag",
+        "Fremdwährung",
+        "Betrag in Fremdwährung",
+        "Debit/Kredit",
+        "Status",
+        "Händlerkategorie",
+        "Registrierte Kategorie",
+    ),
+    "en": (
+        "Transaction date",
+        "Description",
+        "Merchant",
+        "Card number",
+        "Currency",
+        "Amount",
+        "Foreign Currency",
+        "Amount in foreign currency",
+        "Debit/Credit",
+        "Status",
+        "Merchant Category",
+        "Registered Category",
+    ),
+}
+_SWISSCARD_STATUS = {"de": ("Gebucht", "Ausstehend"), "en": ("Posted", "Pending")}
+_SWISSCARD_DEBIT_CREDIT = {"de": ("Belastung", "Gutschrift"), "en": ("Debit", "Credit")}
+
+
+def swisscard_xlsx(
+    path: Path,
+    n_transactions: int,
+    language: str = "de",
+    posted_share: float = 0.9,
+    seed: int = 0,
+) -> Path:
+    """Write a Swisscard bill in language ("de" or "en"); the other transactions are still pending."""
+    rng = random.Random(seed)  # noqa: S311 - test data, not security relevant
+    names = merchants(max(50, n_transactions // 20), seed)
+    posted, pending = _SWISSCARD_STATUS[language]
+    debit, credit = _SWISSCARD_DEBIT_CREDIT[language]
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(_SWISSCARD_COLUMNS[language])
+    for i in range(n_transactions):
+        day = _FIRST_DAY + timedelta(days=i * 365 // max(n_transactions, 1))
+        merchant = rng.choice(names)
+        cents = -_cents(rng, 0.05)
+        sheet.append(
+            (
+                day,
+                f"{merchant}, {rng.choice(_CITIES)}",
+                merchant.title(),
+                "1234 56**** *7890",
+                "CHF",
+                cents / 100,
+                None,
+                None,
+                debit if cents > 0 else credit,
+                posted if rng.random() < posted_share else pending,
+                None,
+                "MISCELLANEOUS STORES",
+            ),
+        )
+    workbook.save(path)
+    return path
+
+
+def ynab_xlsx(path: Path, n_transactions: int, seed: int = 0) -> Path:
+    """Write a hand-kept YNAB workbook with an outflow or an inflow in every row."""
+    rng = random.Random(seed)  # noqa: S311 - test data, not security relevant
+    names = merchants(max(50, n_transactions // 20), seed)
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(("Date", "Payee", "Outflow", "Inflow", "Memo"))
+    for i in range(n_transactions):
+        day = _FIRST_DAY + timedelta(days=i * 365 // max(n_transactions, 1))
+        cents = _cents(rng, 0.1)
+        outflow, inflow = (None, cents / 100) if cents > 0 else (-cents / 100, None)
+        sheet.append((day, None, outflow, inflow, f"{rng.choice(names)}, {rng.choice(_CITIES)}"))
+    workbook.save(path)
+    return path
+
+
+def mapping_xlsx(path: Path, n_entries: int, seed: int = 0) -> Path:
+    """Write a mapping workbook whose patterns are merchant names, as users build it up over time."""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(("from", "to"))
+    for merchant in merchants(n_entries, seed):
+        sheet.append((merchant, merchant.title()))
+    workbook.save(path)
+    return path
@@ -0,0 +1,190 @@
+"""Time detection, parsing, payee mapping and csv writing on synthetic statements.
+
+Results are saved as JSON and, given a baseline from an earlier run, compared stage by stage:
+
+    python -m benchmarks --sizes 1000 100000 --output after.json --baseline before.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+from benchmarks import generators
+from ynabify.exceptions import ParseError
+from ynabify.parser_base import ParserBase
+from ynabify.parser_registry import registered_parsers
+from ynabify.payee_matcher import PayeeMatcher, read_mapping
+from ynabify.sniff import sniff_header
+from ynabify.writer import AccountCsvWriter
+from ynabify.ynabify import replace_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+# replace_text scans the whole mapping for every memo; beyond this it only tells us what we know.
+REPLACE_TEXT_MAX_ROWS = 10_000
+
+
+@dataclass(frozen=True)
+class Case:
+    name: str
+    suffix: str
+    generate: Callable[[Path, int], Path]
+
+
+CASES = (
+    Case("raiffeisen_csv", ".csv", generators.raiffeisen_csv),
+    Case("swisscard_xlsx_de", ".xlsx", lambda path, n: generators.swisscard_xlsx(path, n, "de")),
+    Case("swisscard_xlsx_en", ".xlsx", lambda path, n: generators.swisscard_xlsx(path, n, "en")),
+    Case("ynab_xlsx", ".xlsx", generators.ynab_xlsx),
+)
+
+
+def best_of(repeat: int, action: Callable[[], object]) -> float:
+    """Return the fastest of repeat runs of action in seconds; the minimum is the least noisy estimate."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        action()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def generated(data_dir: Path, name: str, suffix: str, n: int, generate: Callable[[Path, int], Path]) -> Path:
+    """Return the synthetic file for name and n, generating it only if an earlier run has not."""
+    path = data_dir / f"{name}_{n}{suffix}"
+    if not path.exists():
+        logger.info(f"Generating {path}")
+        generate(path.with_suffix(".tmp" + suffix), n).replace(path)
+    return path
+
+
+def detect(path: Path) -> type[ParserBase]:
+    header = sniff_header(path)
+    if header is None:
+        raise ParseError(str(path))
+    return next(parser_cls for parser_cls in registered_parsers() if parser_cls.accepts(header))
+
+
+def bench_statement(case: Case, path: Path, matcher: PayeeMatcher, repeat: int, out_dir: Path) -> dict[str, float]:
+    parser_cls = detect(path)
+    results = {"detect": best_of(repeat, lambda: detect(path))}
+    results["parse"] = best_of(repeat, lambda: parser_cls(path).get_batches())
+
+    batches = parser_cls(path).get_batches()
+    memos = [memo for batch in batches.values() for memo in batch.memos]
+    results["map"] = best_of(repeat, lambda: matcher.match_many(memos))
+    if len(memos) <= REPLACE_TEXT_MAX_ROWS:
+        text_from, text_to = matcher.text_from, matcher.text_to
+        results["map_replace_text"] = best_of(1, lambda: [replace_text(m, text_from, text_to) for m in memos])
+
+    for batch in batches.values():
+        batch.resolve_payees(matcher.resolve)
+
+    def write() -> None:
+        writer = AccountCsvWriter(out_dir / f"{case.name}_ynab.csv")
+        for account, batch in batches.items():
+            writer.write(account, account, batch)
+        writer.close()
+
+    results["write"] = best_of(repeat, write)
+    return results
+
+
+def run(sizes: list[int], mapping_entries: int, repeat: int, data_dir: Path) -> dict[str, float]:
+    """Return the seconds every stage took, keyed by "<case>/<rows>/<stage>"."""
+    results = {}
+    for n in sorted({mapping_entries, *sizes}):
+        mapping_path = generated(data_dir, "mapping", ".xlsx", n, generators.mapping_xlsx)
+        results[f"mapping/{n}/parse"] = best_of(repeat, lambda: read_mapping(mapping_path))  # noqa: B023
+        text_from, text_to = read_mapping(mapping_path)
+        results[f"mapping/{n}/compile"] = best_of(repeat, lambda: PayeeMatcher(text_from, text_to))  # noqa: B023
+
+    mapping_path = generated(data_dir, "mapping", ".xlsx", mapping_entries, generators.mapping_xlsx)
+    matcher = PayeeMatcher(*read_mapping(mapping_path))
+    with tempfile.TemporaryDirectory() as out_dir:
+        for case in CASES:
+            for n in sizes:
+                path = generated(data_dir, case.name, case.suffix, n, case.generate)
+                logger.info(f"Benchmarking {path}")
+                for stage, seconds in bench_statement(case, path, matcher, repeat, Path(out_dir)).items():
+                    results[f"{case.name}/{n}/{stage}"] = seconds
+    return results
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], max_slowdown: float) -> list[str]:
+    """Log every stage next to its baseline and return the keys that got slower than max_slowdown allows."""
+    regressions = []
+    for key, seconds in results.items():
+        before = baseline.get(key)
+        if before is None:
+            logger.info(f"{key:<40} {seconds * 1000:>10.1f} ms  (new)")
+            continue
+        ratio = seconds / before if before else float("inf")
+        flag = "  REGRESSION" if ratio > max_slowdown else ""
+        logger.info(f"{key:<40} {seconds * 1000:>10.1f} ms  {before * 1000:>10.1f} ms  x{ratio:.2f}{flag}")
+        if flag:
+            regressions.append(key)
+    return regressions
+
+
+def _ynabify_version() -> str:
+    try:
+        return version("ynabify")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def main(argv: list[str] | None = None) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    arg_parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="statement rows")
+    arg_parser.add_argument("--mapping-entries", type=int, default=2_000, help="patterns in the mapping used")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs per stage, the fastest one counts")
+    arg_parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=Path(tempfile.gettempdir()) / "ynabify-benchmarks",
+        help="where generated statements are kept between runs",
+    )
+    arg_parser.add_argument("-o", "--output", type=Path, default=Path("bench_results.json"))
+    arg_parser.add_argument("--baseline", type=Path, default=None, help="results of an earlier run to compare with")
+    arg_parser.add_argument(
+        "--max-slowdown",
+        type=float,
+        default=1.25,
+        help="fail if a stage takes more than this factor of its baseline",
+    )
+    args = arg_parser.parse_args(argv)
+
+    args.data_dir.mkdir(parents=True, exist_ok=True)
+    results = run(args.sizes, args.mapping_entries, args.repeat, args.data_dir)
+    report = {
+        "meta": {
+            "ynabify": _ynabify_version(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "repeat": args.repeat,
+            "mapping_entries": args.mapping_entries,
+        },
+        "results": results,
+    }
+    args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    logger.info(f"Wrote {args.output}")
+
+    baseline = {} if args.baseline is None else json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+    if regressions := compare(results, baseline, args.max_slowdown):
+        logger.error(f"{len(regressions)} stages are more than {args.max_slowdown}x slower than {args.baseline}")
+        raise SystemExit(1)
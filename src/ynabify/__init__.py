@@ -1,3 +1,8 @@
 # SPDX-FileCopyrightText: 2025-present Stefan Rickli <git@stefanrickli.dev>
 #
 # SPDX-License-Identifier: MIT
+from ynabify.api import Conversion, convert
+from ynabify.exceptions import ParseError
+from ynabify.payee_matcher import PayeeMatcher, load_matcher
+
+__all__ = ["Conversion", "ParseError", "PayeeMatcher", "convert", "load_matcher"]
@@ -0,0 +1,82 @@
+"""Convert statements within a Python process, e.g. a web service, without the command line or temporary files."""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO
+
+from ynabify.exceptions import ParseError
+from ynabify.metrics import Metrics
+from ynabify.parser_registry import open_parser
+from ynabify.payee_matcher import PayeeMatcher, load_matcher
+from ynabify.sniff import StatementBytes
+from ynabify.writer import csv_bytes
+
+if TYPE_CHECKING:
+    from ynabify.parser_base import TransactionBatch
+    from ynabify.sniff import Source
+
+
+@dataclass
+class Conversion:
+    """The transactions of every account in a statement, with resolved payees."""
+
+    # Class name of the parser that read the statement, e.g. "RaiffeisenCsv".
+    parser: str
+    batches: dict[str, TransactionBatch]
+    # Name of every account as given by the mapping, which the command line puts into file names.
+    names: dict[str, str]
+
+    def to_csv(self) -> dict[str, bytes]:
+        """The YNAB csv of every account, byte for byte as the command line writes it."""
+        return {account: csv_bytes(batch) for account, batch in self.batches.items()}
+
+
+def _source(source: str | os.PathLike[str] | bytes | BinaryIO, name: str | None) -> Source:
+    if isinstance(source, str | os.PathLike):
+        return Path(source)
+    data = source if isinstance(source, bytes) else source.read()
+    name = name or getattr(source, "name", None)
+    return StatementBytes(data) if name is None else StatementBytes(data, str(name))
+
+
+def convert(
+    source: str | os.PathLike[str] | bytes | BinaryIO,
+    mapping: PayeeMatcher | str | os.PathLike[str] | None = None,
+    *,
+    name: str | None = None,
+    metrics: Metrics | None = None,
+) -> Conversion:
+    """Convert one statement and resolve its payees.
+
+    source is the path of a statement file, its content or a binary file object; content is
+    parsed in memory, nothing is written to disk. mapping is a PayeeMatcher, which is best
+    loaded once with load_matcher and reused for every call, or the path of a mapping workbook.
+    Without it, payees stay empty. name labels in-memory content in error messages.
+
+    Raises ParseError if no parser accepts the statement.
+    """
+    metrics = Metrics() if metrics is None else metrics
+    if mapping is None:
+        matcher = PayeeMatcher([], [])
+    elif isinstance(mapping, PayeeMatcher):
+        matcher = mapping
+    else:
+        with metrics.stage("mapping"):
+            matcher = load_matcher(Path(mapping))
+
+    statement = _source(source, name)
+    file_parser = open_parser(statement, metrics)
+    if file_parser is None:
+        raise ParseError(str(statement))
+    with metrics.stage("parse"):
+        batches = file_parser.get_batches()
+    with metrics.stage("payees") as stage:
+        for batch in batches.values():
+            batch.resolve_payees(matcher.resolve)
+            stage.add_rows(len(batch))
+        matcher.save_memo_cache()
+    names = {account: matcher.match(account) or account for account in batches}
+    return Conversion(file_parser.name, batches, names)
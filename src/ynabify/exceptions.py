@@ -1,3 +1,11 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
 class ParseError(Exception):
     """Exception raised for errors in the parsing process."""
 
@@ -10,3 +18,20 @@ class LanguageError(Exception):
 
     def __init__(self, path: str) -> None:
         super().__init__(f"Cannot determine language of {path}")
+
+
+class WriteError(Exception):
+    """Exception raised when the files of one or more accounts cannot be written.
+
+    errors maps each failed account to its exception, outputs lists the files written for the others.
+    """
+
+    def __init__(self, errors: dict[str, Exception], outputs: list[Path]) -> None:
+        self.errors = errors
+        self.outputs = outputs
+        details = "; ".join(f"{account}: {type(e).__name__}: {e}" for account, e in errors.items())
+        super().__init__(f"Cannot write {len(errors)} account(s): {details}")
+
+
+class ExportError(Exception):
+    """Exception raised when transactions cannot be sent to the YNAB API."""
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+
+from ynabify.parser_base import MAX_DECIMALS, format_amounts
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from pathlib import Path
+    from types import TracebackType
+
+    import pandas as pd
+
+    from ynabify.parser_base import TransactionBatch
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    fingerprint TEXT PRIMARY KEY,
+    account TEXT NOT NULL,
+    date TEXT NOT NULL,
+    memo TEXT NOT NULL,
+    inflow TEXT NOT NULL,
+    outflow TEXT NOT NULL,
+    imported_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_account_date ON transactions (account, date);
+CREATE TABLE IF NOT EXISTS held (
+    part TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    account TEXT NOT NULL,
+    date TEXT NOT NULL,
+    memo TEXT NOT NULL,
+    inflow TEXT NOT NULL,
+    outflow TEXT NOT NULL,
+    imported_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS held_part ON held (part);
+CREATE TEMP TABLE IF NOT EXISTS pending AS SELECT * FROM transactions WHERE 0;
+"""
+
+
+def _amount_texts(batch: TransactionBatch, column: str) -> list[str]:
+    """Render amounts independently of how many decimals the bank exported, e.g. 2000 and 2000.00."""
+    return format_amounts(batch.frame[column].to_numpy(), MAX_DECIMALS).tolist()
+
+
+def _rows(batch: TransactionBatch) -> Iterator[tuple[str, str, str, str]]:
+    return zip(
+        (f"{date:%Y-%m-%d}" for date in batch.frame["Date"]),
+        (str(memo) for memo in batch.memos),
+        _amount_texts(batch, "Inflow"),
+        _amount_texts(batch, "Outflow"),
+        strict=True,
+    )
+
+
+def _month_pattern(month: str | None) -> str:
+    """LIKE pattern of the dates in month ("YYYY-MM"), or of all dates for None."""
+    return "%" if month is None else f"{month}-%"
+
+
+def fingerprints(account: str, batch: TransactionBatch, occurrences: Counter[str] | None = None) -> list[str]:
+    """Return a stable id for every transaction in batch.
+
+    Identical transactions on the same day (two coffees at the same place) are told apart by
+    their occurrence number. Pass the same occurrences counter for all chunks of one statement.
+    """
+    if occurrences is None:
+        occurrences = Counter()
+    result = []
+    for row in _rows(batch):
+        key = "\x1f".join((account, *row))
+        n = occurrences[key]
+        occurrences[key] += 1
+        result.append(hashlib.sha256(f"{key}\x1f{n}".encode()).hexdigest())
+    return result
+
+
+class Ledger:
+    """SQLite record of every transaction ynabify has exported, used to export only new ones.
+
+    Recorded transactions are pending until commit(), which callers do once the output files are in
+    place, naming the accounts whose files were written. Transactions whose file is still waiting
+    to be moved into place can be held back until it is, see release.
+
+    Pending transactions live in a temporary table of this connection. The ledger itself is only
+    locked while commit, release or discard write to it, so that parallel workers can share it.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit: no implicit transaction would keep the ledger locked from record() to commit().
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._connection.executescript(_SCHEMA)
+
+    def __enter__(self) -> Ledger:  # noqa: PYI034 - typing.Self needs Python 3.11
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """Write to the ledger with its write lock taken up front, waiting for other writers."""
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def commit(
+        self,
+        written: Iterable[tuple[str, str | None]] | None = None,
+        held: Iterable[tuple[str, str | None, str]] = (),
+    ) -> None:
+        """Add the pending transactions to the ledger and drop the rest.
+
+        written limits this to the given (account, month) pairs, month being "YYYY-MM", or None
+        for all months of the account. By default every pending transaction is added. The
+        transactions of the (account, month, part) triples in held are kept apart under part
+        until release(part) or discard(part).
+        """
+        with self._transaction():
+            if written is None:
+                self._connection.execute("INSERT OR IGNORE INTO transactions SELECT * FROM pending")
+            else:
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO transactions SELECT * FROM pending WHERE account = ? AND date LIKE ?",
+                    ((account, _month_pattern(month)) for account, month in written),
+                )
+            self._connection.executemany(
+                "INSERT INTO held SELECT ?, * FROM pending WHERE account = ? AND date LIKE ?",
+                ((part, account, _month_pattern(month)) for account, month, part in held),
+            )
+            self._connection.execute("DELETE FROM pending")
+
+    def release(self, part: str) -> None:
+        """Add the transactions held back under part to the ledger, once their file is in place."""
+        with self._transaction():
+            self._connection.execute(
+                "INSERT OR IGNORE INTO transactions "
+                "SELECT fingerprint, account, date, memo, inflow, outflow, imported_at FROM held WHERE part = ?",
+                (part,),
+            )
+            self._connection.execute("DELETE FROM held WHERE part = ?", (part,))
+
+    def discard(self, part: str) -> None:
+        """Forget the transactions held back under part, whose file was never moved into place."""
+        self._connection.execute("DELETE FROM held WHERE part = ?", (part,))
+
+    def rollback(self) -> None:
+        """Drop the pending transactions."""
+        self._connection.execute("DELETE FROM pending")
+
+    def known(self, account: str, batch: TransactionBatch, ids: list[str]) -> pd.Series:
+        """Return a boolean mask of the rows of batch whose fingerprint in ids is already in the ledger."""
+        import pandas as pd
+
+        if not len(batch):
+            return pd.Series(dtype=bool)
+        dates = batch.frame["Date"]
+        rows = self._connection.execute(
+            "SELECT fingerprint FROM transactions WHERE account = ? AND date BETWEEN ? AND ?",
+            (account, f"{dates.min():%Y-%m-%d}", f"{dates.max():%Y-%m-%d}"),
+        )
+        seen = {fingerprint for (fingerprint,) in rows}
+        return pd.Series([fingerprint in seen for fingerprint in ids], dtype=bool)
+
+    def record(self, account: str, batch: TransactionBatch, ids: list[str]) -> None:
+        """Add the transactions of batch, with fingerprints ids, to the pending ones."""
+        imported_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self._connection.executemany(
+            "INSERT OR IGNORE INTO pending VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                (fingerprint, account, date, memo, inflow, outflow, imported_at)
+                for fingerprint, (date, memo, inflow, outflow) in zip(ids, _rows(batch), strict=True)
+            ),
+        )
@@ -0,0 +1,140 @@
+"""Merging overlapping statements of the same accounts, e.g. month-to-date and the previous quarter."""
+
+from __future__ import annotations
+
+import re
+from collections import Counter
+from typing import TYPE_CHECKING
+
+from ynabify.metrics import Metrics
+from ynabify.parser_base import ParsedStatement, TransactionBatch
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    import numpy as np
+    import pandas as pd
+
+    from ynabify.parser_base import ParserBase
+
+
+def normalize_memo(memo: str) -> str:
+    """The memo as statements are compared by: case-folded, with every run of whitespace as one space."""
+    return " ".join(memo.casefold().split())
+
+
+def _concat_categorical(columns: list[pd.Series]) -> tuple[np.ndarray, np.ndarray]:
+    """Codes and categories of the concatenated categorical columns; missing values keep code -1."""
+    import numpy as np
+    import pandas as pd
+
+    categories = [np.asarray(column.cat.categories, dtype=object) for column in columns]
+    # One hash table pass over all categories gives every category its code in the combined column.
+    combined, uniques = pd.factorize(np.concatenate(categories))
+    offsets = np.cumsum([0, *(len(c) for c in categories)])
+    codes = [
+        np.where(column_codes >= 0, combined[offset:][column_codes], -1)
+        for column_codes, offset in zip((column.cat.codes.to_numpy() for column in columns), offsets, strict=False)
+    ]
+    return np.concatenate(codes), uniques
+
+
+def merge_batches(batches: Sequence[TransactionBatch]) -> TransactionBatch:
+    """Merge the transactions of one account from several statements into one batch sorted by date.
+
+    A transaction is left out if an earlier statement already has it: same day, amount and
+    normalized memo. Identical transactions within one statement (two coffees on one day) are
+    told apart by their occurrence number, so a statement keeps all of them and an overlapping
+    statement adds only those beyond its predecessors' count. On equal days, transactions keep
+    the order of the statements and of their rows.
+
+    Runs in linear time apart from the sort: the statements are concatenated and sorted stably,
+    which for int64 days is timsort and merges the date-sorted runs of the statements like a
+    k-way merge, in O(n log k). Duplicates are found with hash tables.
+    """
+    import numpy as np
+    import pandas as pd
+
+    batches = [batch for batch in batches if len(batch)]
+    if len(batches) <= 1:
+        return batches[0] if batches else TransactionBatch.empty()
+
+    frame = pd.concat([batch.frame.drop(columns=["Payee", "Memo"]) for batch in batches], ignore_index=True)
+    payee_codes, payees = _concat_categorical([batch.frame["Payee"] for batch in batches])
+    memo_codes, memos = _concat_categorical([batch.memos for batch in batches])
+
+    days = frame["Date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    order = np.argsort(days, kind="stable")
+    # Memos that only differ in case or spacing share a key; missing memos keep code -1.
+    normalized_codes = pd.factorize(np.asarray(list(map(normalize_memo, memos.tolist())), dtype=object))[0]
+    memo_keys = np.where(memo_codes >= 0, normalized_codes[memo_codes], -1)
+    sources = np.repeat(np.arange(len(batches)), [len(batch) for batch in batches])
+
+    keys = pd.DataFrame(
+        {
+            "day": days[order],
+            "amount": (frame["Inflow"].to_numpy() - frame["Outflow"].to_numpy())[order],
+            "memo": memo_keys[order],
+            "source": sources[order],
+        },
+    )
+    keys["occurrence"] = keys.groupby(["source", "day", "amount", "memo"], sort=False).cumcount()
+    is_new = ~keys.duplicated(["day", "amount", "memo", "occurrence"]).to_numpy()
+
+    rows = order[is_new]
+    merged = frame.iloc[rows].reset_index(drop=True)
+    merged.insert(1, "Payee", pd.Categorical.from_codes(payee_codes[rows], pd.Index(payees)).remove_unused_categories())
+    merged.insert(2, "Memo", pd.Categorical.from_codes(memo_codes[rows], pd.Index(memos)).remove_unused_categories())
+    return TransactionBatch(merged)
+
+
+def _account_names(accounts: dict[tuple[str, str], str]) -> dict[tuple[str, str], str]:
+    """Name the account of every (parser name, account id) by its account, e.g. an IBAN or "main".
+
+    Where several share an account, as all single-account statements share "main", they are named
+    by their account id, e.g. the card number, or if that is the account too, by their parser.
+    Names are made file name safe and unique.
+    """
+    shared = Counter(accounts.values())
+    names: dict[tuple[str, str], str] = {}
+    for (parser_name, account_id), account in accounts.items():
+        name = account
+        if shared[account] > 1:
+            name = re.sub(r"[^\w.-]+", "_", account_id if account_id != account else parser_name).strip("_")
+        unique, n = name, 2
+        while unique in names.values():
+            unique, n = f"{name}_{n}", n + 1
+        names[parser_name, account_id] = unique
+    return names
+
+
+def merge_statements(statements: Sequence[ParserBase], metrics: Metrics | None = None) -> ParsedStatement:
+    """Parse statements and merge their transactions per account with merge_batches.
+
+    Accounts are told apart by the parser that read them and their account id, so two cards or a
+    card and a YNAB export stay apart even though each calls its account "main"; see
+    _account_names for how they are named then. Accounts are listed in the order they first
+    appear. The result carries the parser name and account id of each account, e.g. for the ledger.
+    """
+    metrics = Metrics() if metrics is None else metrics
+    by_account: dict[tuple[str, str], list[TransactionBatch]] = {}
+    accounts: dict[tuple[str, str], str] = {}
+    with metrics.stage("parse") as stage:
+        for statement in statements:
+            for account, batch in statement.get_batches().items():
+                if len(batch):
+                    key = (statement.parser_name(account), statement.account_id(account))
+                    by_account.setdefault(key, []).append(batch)
+                    accounts.setdefault(key, account)
+                    stage.add_rows(len(batch))
+    names = _account_names(accounts)
+    with metrics.stage("merge") as stage:
+        merged = {names[key]: merge_batches(batches) for key, batches in by_account.items()}
+        stage.add_rows(sum(len(batch) for batch in merged.values()))
+    name = statements[0].name if statements else "merged"
+    return ParsedStatement(
+        name,
+        merged or {"main": TransactionBatch.empty()},
+        {name: account_id for (_, account_id), name in names.items()},
+        {name: parser_name for (parser_name, _), name in names.items()},
+    )
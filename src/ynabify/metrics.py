@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, TypeVar
+
+if TYPE_CHECKING:
+    import cProfile
+    from collections.abc import Callable, Iterable, Iterator
+    from pathlib import Path
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StageMetrics:
+    seconds: float = 0.0
+    calls: int = 0
+    # Rows the stage handled, None for stages that do not work on rows (e.g. loading the mapping).
+    rows: int | None = None
+    # Peak of traced memory while the stage ran, None unless memory is traced.
+    peak_bytes: int | None = None
+
+    def add_rows(self, n: int) -> None:
+        self.rows = (self.rows or 0) + n
+
+    @property
+    def rows_per_second(self) -> float | None:
+        if self.rows is None or not self.seconds:
+            return None
+        return self.rows / self.seconds
+
+    def merge(self, other: StageMetrics) -> None:
+        self.seconds += other.seconds
+        self.calls += other.calls
+        if other.rows is not None:
+            self.add_rows(other.rows)
+        if other.peak_bytes is not None:
+            self.peak_bytes = max(self.peak_bytes or 0, other.peak_bytes)
+
+
+class Metrics:
+    """Wall time, rows and peak memory per stage of a conversion.
+
+    A stage that is entered several times, e.g. once per chunk, accumulates. Stages must not
+    nest. Memory is measured with tracemalloc, which slows Python code down considerably, so it
+    is only traced on request. With profile, every stage also gets its own cProfile profiler.
+    """
+
+    def __init__(self, *, trace_memory: bool = False, profile: bool = False) -> None:
+        self.trace_memory = trace_memory
+        self.profile = profile
+        self.stages: dict[str, StageMetrics] = {}
+        self._profilers: dict[str, cProfile.Profile] = {}
+        self._started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+        self._start = time.perf_counter()
+
+    def close(self) -> None:
+        """Stop tracing memory if this instance started it."""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageMetrics]:
+        """Measure the body as stage name. Report rows through the yielded record."""
+        record = self.stages.setdefault(name, StageMetrics())
+        profiler = self._profiler(name) if self.profile else None
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        if profiler is not None:
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds += time.perf_counter() - start
+            record.calls += 1
+            if profiler is not None:
+                profiler.disable()
+            if self.trace_memory:
+                record.peak_bytes = max(record.peak_bytes or 0, tracemalloc.get_traced_memory()[1])
+
+    def iterate(self, name: str, iterable: Iterable[T], count: Callable[[T], int] | None = None) -> Iterator[T]:
+        """Yield the items of iterable, measuring the time spent producing them as stage name.
+
+        count(item) is added to the rows of the stage.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as record:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    record.calls -= 1  # the final, empty call produced nothing
+                    return
+                if count is not None:
+                    record.add_rows(count(item))
+            yield item
+
+    def _profiler(self, name: str) -> cProfile.Profile:
+        import cProfile
+
+        return self._profilers.setdefault(name, cProfile.Profile())
+
+    def merge(self, stages: dict[str, StageMetrics]) -> None:
+        """Add stages measured elsewhere, e.g. in a worker process."""
+        for name, other in stages.items():
+            self.stages.setdefault(name, StageMetrics()).merge(other)
+
+    def hottest_stage(self) -> str | None:
+        return max(self.stages, key=lambda name: self.stages[name].seconds, default=None)
+
+    def dump_profile(self, path: Path) -> None:
+        """Write the cProfile statistics of the slowest stage to path, for pstats or snakeviz."""
+        name = self.hottest_stage()
+        if name is None or name not in self._profilers:
+            logger.warning(f"No profile recorded, not writing {path}")
+            return
+        self._profilers[name].dump_stats(path)
+        logger.info(f"Wrote profile of stage '{name}' to {path}")
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "wall_seconds": time.perf_counter() - self._start,
+            "stages": {
+                name: {
+                    "seconds": record.seconds,
+                    "calls": record.calls,
+                    "rows": record.rows,
+                    "rows_per_second": record.rows_per_second,
+                    "peak_bytes": record.peak_bytes,
+                }
+                for name, record in self.stages.items()
+            },
+        }
+
+    def summary(self) -> str:
+        lines = [f"{'stage':<10} {'time':>12} {'rows':>10} {'rows/s':>12} {'peak memory':>12}"]
+        for name, record in self.stages.items():
+            rows = "" if record.rows is None else f"{record.rows}"
+            rate = "" if record.rows_per_second is None else f"{record.rows_per_second:.0f}"
+            peak = "" if record.peak_bytes is None else f"{record.peak_bytes / 2**20:.1f} MiB"
+            lines.append(f"{name:<10} {record.seconds * 1000:>9.1f} ms {rows:>10} {rate:>12} {peak:>12}")
+        lines.append(f"{'total':<10} {(time.perf_counter() - self._start) * 1000:>9.1f} ms")
+        return "\n".join(lines)
+
+
+class Progress:
+    """Logs how many rows are done, at most every interval seconds.
+
+    Fed once per chunk rather than per row, so it costs nothing in the parsers' inner loops.
+    """
+
+    def __init__(self, label: str, interval: float = 1.0) -> None:
+        self.label = label
+        self.interval = interval
+        self.rows = 0
+        self._last_report = time.monotonic()
+
+    def update(self, rows: int) -> None:
+        self.rows += rows
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            logger.info(f"{self.label}: {self.rows} rows")
+            self._last_report = now
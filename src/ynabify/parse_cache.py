@@ -0,0 +1,316 @@
+"""Parsed statements cached by content, so that converting a statement again skips detection and parsing.
+
+Every entry is an uncompressed .npz file holding the transaction columns of each account, one set
+of arrays per parsed chunk, written as the chunks pass. Text columns are stored as utf-8 blobs
+with offsets, never pickled. Entries are keyed by the sha256 of
+the statement file and record the parser that produced them; they are only used while that
+parser's version is unchanged. Payees are not stored, they depend on the mapping and are always
+resolved again.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import zipfile
+from itertools import pairwise
+from typing import TYPE_CHECKING
+
+from ynabify.parser_base import ParsedStatement, ParserBase, TransactionBatch
+from ynabify.parser_registry import open_parser, registered_parsers
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from pathlib import Path
+
+    import numpy as np
+    import pandas as pd
+
+    from ynabify.metrics import Metrics
+    from ynabify.parser_base import TransactionFilter
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the layout of the cached files changes.
+PARSE_CACHE_VERSION = 3
+# Total size of the cached statements; the least recently used ones are removed beyond it.
+PARSE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Columns stored as they are; Memo is stored as text, Payee is not stored.
+_NUMERIC_COLUMNS = ("Date", "Inflow", "Outflow", "InflowDecimals", "OutflowDecimals")
+
+
+def file_digest(path: Path) -> str:
+    """The sha256 of the content of path."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while block := f.read(1 << 20):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _pack_texts(texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Store texts as one utf-8 blob and the end offset of every text in the decoded string."""
+    import numpy as np
+
+    blob = np.frombuffer("".join(texts).encode("utf_8"), dtype=np.uint8)
+    return blob, np.cumsum([len(text) for text in texts], dtype=np.int64)
+
+
+def _unpack_texts(blob: np.ndarray, ends: np.ndarray) -> list[str]:
+    joined = blob.tobytes().decode("utf_8")
+    bounds = [0, *ends.tolist()]
+    return [joined[start:end] for start, end in pairwise(bounds)]
+
+
+class _CacheEntry:
+    """A statement written to an uncompressed .npz file at path chunk by chunk, as numpy.savez would write it at once.
+
+    Errors are logged and end the writing; the statement is then not cached.
+    """
+
+    def __init__(self, cache_dir: Path, path: Path) -> None:
+        self._cache_dir = cache_dir
+        self._path = path
+        self._zip: zipfile.ZipFile | None = None
+        # The position of every account and the number of chunks written of it.
+        self._accounts: dict[str, int] = {}
+        self._n_chunks: list[int] = []
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True)
+        except OSError as e:
+            self._fail(e)
+
+    @staticmethod
+    def _write(zf: zipfile.ZipFile, name: str, array: np.ndarray) -> None:
+        import numpy as np
+
+        with zf.open(f"{name}.npy", "w", force_zip64=True) as f:
+            np.lib.format.write_array(f, np.asanyarray(array), allow_pickle=False)
+
+    def _write_texts(self, zf: zipfile.ZipFile, name: str, texts: list[str]) -> None:
+        blob, ends = _pack_texts(texts)
+        self._write(zf, name, blob)
+        self._write(zf, f"{name}_ends", ends)
+
+    def add(self, batches: dict[str, TransactionBatch]) -> None:
+        """Write one chunk of every account."""
+        zf = self._zip
+        if zf is None:
+            return
+        try:
+            for account, batch in batches.items():
+                i = self._accounts.setdefault(account, len(self._accounts))
+                if i == len(self._n_chunks):
+                    self._n_chunks.append(0)
+                prefix = f"{i}_{self._n_chunks[i]}"
+                memo_codes, memos = _factorize(batch.frame["Memo"])
+                self._write(zf, f"{prefix}_memo_codes", memo_codes)
+                self._write_texts(zf, f"{prefix}_memos", memos)
+                for column in _NUMERIC_COLUMNS:
+                    self._write(zf, f"{prefix}_{column}", batch.frame[column].to_numpy())
+                self._n_chunks[i] += 1
+        except OSError as e:
+            self._fail(e)
+
+    def finish(self, parser: ParserBase, cache_path: Path) -> bool:
+        """Write what parser tells about the accounts and move the file to cache_path. Returns whether it was."""
+        import numpy as np
+
+        zf = self._zip
+        if zf is None:
+            return False
+        try:
+            self._write(zf, "versions", np.asarray([PARSE_CACHE_VERSION, type(parser).version], dtype=np.int64))
+            self._write(zf, "parser", np.asarray(parser.name))
+            self._write(zf, "chunks", np.asarray(self._n_chunks, dtype=np.int64))
+            self._write_texts(zf, "accounts", list(self._accounts))
+            self._write_texts(zf, "account_ids", [parser.account_id(account) for account in self._accounts])
+            zf.close()
+            self._zip = None
+            self._path.replace(cache_path)
+        except OSError as e:
+            self._fail(e)
+            return False
+        return True
+
+    def discard(self) -> None:
+        """Remove the file unless it was finished."""
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+        self._path.unlink(missing_ok=True)
+
+    def _fail(self, e: OSError) -> None:
+        logger.warning(f"Cannot cache parsed statement in {self._cache_dir}: {e}")
+        self.discard()
+
+
+class CachedStatement(ParsedStatement):
+    """The accounts of a statement as an earlier parse of the same content left them."""
+
+
+class _StoringParser(ParserBase):
+    """Wraps a parser and stores its result in the cache once the statement was parsed completely."""
+
+    def __init__(self, parser: ParserBase, cache: ParseCache, digest: str) -> None:
+        self._parser = parser
+        self._cache = cache
+        self._digest = digest
+
+    @property
+    def name(self) -> str:
+        return self._parser.name
+
+    def account_id(self, account: str) -> str:
+        return self._parser.account_id(account)
+
+    def parser_name(self, account: str) -> str:
+        return self._parser.parser_name(account)
+
+    def get_batches(self) -> dict[str, TransactionBatch]:
+        batches = self._parser.get_batches()
+        self._cache.store(self._digest, self._parser, [batches])
+        return batches
+
+    def iter_batches(self, chunksize: int) -> Iterator[dict[str, TransactionBatch]]:
+        return self._cache.storing(self._digest, self._parser, self._parser.iter_batches(chunksize))
+
+
+class ParseCache:
+    """Parsed statements in cache_dir, at most max_bytes of them."""
+
+    def __init__(self, cache_dir: Path, max_bytes: int = PARSE_CACHE_MAX_BYTES) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _path(self, digest: str) -> Path:
+        return self.cache_dir / f"parse-{digest}.npz"
+
+    def open(
+        self,
+        path: Path,
+        metrics: Metrics | None = None,
+        selection: TransactionFilter | None = None,
+    ) -> ParserBase | None:
+        """Like open_parser, but a statement whose content was parsed before comes from the cache.
+
+        Other statements are stored in the cache once they have been parsed completely. With a
+        selection, cached statements are filtered by it; others are parsed with it and, being
+        incomplete, not stored.
+        """
+        digest = file_digest(path)
+        cached = self.load(digest)
+        if cached is not None:
+            logger.debug(f"Loaded {path} from parse cache {self._path(digest)}")
+            if selection is not None:
+                cached = CachedStatement(cached.name, selection.apply(cached.get_batches()), cached.account_ids)
+            return cached
+        parser = open_parser(path, metrics, selection)
+        if parser is None or selection is not None:
+            return parser
+        return _StoringParser(parser, self, digest)
+
+    def load(self, digest: str) -> CachedStatement | None:
+        """The statement stored under digest, or None if there is none or its parser has changed since."""
+        cache_path = self._path(digest)
+        if not cache_path.exists():
+            return None
+        import numpy as np
+        import pandas as pd
+        from pandas.api.types import union_categoricals
+
+        try:
+            with np.load(cache_path, allow_pickle=False) as stored:
+                version, parser_version = stored["versions"].tolist()
+                name = str(stored["parser"])
+                parser_versions = {parser_cls.__name__: parser_cls.version for parser_cls in registered_parsers()}
+                if version != PARSE_CACHE_VERSION or parser_versions.get(name) != parser_version:
+                    return None
+                accounts = _unpack_texts(stored["accounts"], stored["accounts_ends"])
+                account_ids = _unpack_texts(stored["account_ids"], stored["account_ids_ends"])
+                batches = {}
+                for i, (account, n_chunks) in enumerate(zip(accounts, stored["chunks"].tolist(), strict=True)):
+                    prefixes = [f"{i}_{k}" for k in range(n_chunks)]
+                    memos = union_categoricals(
+                        [
+                            pd.Categorical.from_codes(
+                                stored[f"{prefix}_memo_codes"],
+                                categories=pd.Index(
+                                    _unpack_texts(stored[f"{prefix}_memos"], stored[f"{prefix}_memos_ends"])
+                                ),
+                            )
+                            for prefix in prefixes
+                        ]
+                    )
+                    frame = pd.DataFrame(
+                        {
+                            "Date": np.concatenate([stored[f"{prefix}_Date"] for prefix in prefixes]),
+                            "Payee": pd.Categorical.from_codes(np.zeros(len(memos), dtype=np.int8), pd.Index([""])),
+                            "Memo": memos,
+                            **{
+                                column: np.concatenate([stored[f"{prefix}_{column}"] for prefix in prefixes])
+                                for column in _NUMERIC_COLUMNS[1:]
+                            },
+                        },
+                    )
+                    batches[account] = TransactionBatch(frame)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            logger.debug(f"Ignoring unreadable parse cache {cache_path}: {e}")
+            return None
+        os.utime(cache_path)
+        return CachedStatement(name, batches, dict(zip(accounts, account_ids, strict=True)))
+
+    def store(self, digest: str, parser: ParserBase, chunks: Iterable[dict[str, TransactionBatch]]) -> None:
+        """Store the chunks parser produced under digest, then evict beyond max_bytes."""
+        for _ in self.storing(digest, parser, chunks):
+            pass
+
+    def storing(
+        self,
+        digest: str,
+        parser: ParserBase,
+        chunks: Iterable[dict[str, TransactionBatch]],
+    ) -> Iterator[dict[str, TransactionBatch]]:
+        """Yield the chunks parser produced, writing each to the cache as it passes, like store.
+
+        No chunk is kept, so the cache takes no memory that grows with the statement. The entry
+        is put in place once the last chunk has passed; if the chunks are not used up, nothing is
+        stored.
+        """
+        cache_path = self._path(digest)
+        entry = _CacheEntry(self.cache_dir, cache_path.with_suffix(f".{os.getpid()}.tmp"))
+        try:
+            for batches in chunks:
+                entry.add(batches)
+                yield batches
+            if entry.finish(parser, cache_path):
+                self._evict()
+        finally:
+            entry.discard()
+
+    def _evict(self) -> None:
+        """Remove the least recently used statements until the rest fits into max_bytes."""
+        entries = []
+        for cache_path in self.cache_dir.glob("parse-*.npz"):
+            try:
+                stat = cache_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, cache_path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, cache_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            cache_path.unlink(missing_ok=True)
+            total -= size
+
+
+def _factorize(memos: pd.Series) -> tuple[np.ndarray, list[str]]:
+    """Codes and distinct texts of a Memo column; missing memos get code -1."""
+    import pandas as pd
+
+    codes, uniques = pd.factorize(memos, use_na_sentinel=True)
+    return codes, [str(memo) for memo in uniques]
@@ -0,0 +1,8 @@
+# SPDX-FileCopyrightText: 2025-present Stefan Rickli <git@stefanrickli.dev>
+#
+# SPDX-License-Identifier: MIT
+from ynabify.parser.raiffeisen_csv import RaiffeisenCsv
+from ynabify.parser.swisscard_xlsx import SwisscardXlsx
+from ynabify.parser.ynab_xlsx import YnabXlsx
+
+__all__ = ["RaiffeisenCsv", "SwisscardXlsx", "YnabXlsx"]
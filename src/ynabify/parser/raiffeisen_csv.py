@@ -1,82 +1,139 @@
+from __future__ import annotations
+
 import warnings
-from collections import defaultdict
-from decimal import Decimal
-from pathlib import Path
-from typing import Any
+from functools import cached_property
+from typing import TYPE_CHECKING
+
+from ynabify.parser_base import ParserBase, TransactionBatch, amounts_from_text
+from ynabify.parser_registry import register
+from ynabify.sniff import readable
 
-import pandas as pd
-from tqdm import tqdm
+if TYPE_CHECKING:
+    from collections.abc import Iterator
 
-from ynabify.exceptions import ParseError
-from ynabify.parser_base import ParserBase
+    import numpy as np
+    import pandas as pd
 
-pd.set_option("display.max_columns", 10)
-pd.set_option("display.max_colwidth", 30)
+    from ynabify.parser_base import TransactionFilter
+    from ynabify.sniff import FileHeader, Source
 
 
+@register
 class RaiffeisenCsv(ParserBase):
-    @staticmethod
-    def can_parse(path: Path) -> bool:
-        if path.suffix.lower() != ".csv":
-            return False
-        if not path.exists():
-            return False
+    suffixes = (".csv",)
+    required_columns = (("IBAN", "Booked At", "Text", "Credit/Debit Amount"),)
+
+    def __init__(
+        self,
+        path: Source,
+        header: FileHeader | None = None,
+        selection: TransactionFilter | None = None,
+    ) -> None:
+        self.path = path
+        self.selection = selection
+        RaiffeisenCsv.check_header(self.path, header)
+
+    @cached_property
+    def _df(self) -> pd.DataFrame:
+        import pandas as pd
+
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
-            try:
-                df = pd.read_csv(path, header=0, delimiter=";", encoding="ANSI", dtype=str)
-            except pd.errors.EmptyDataError:
-                return False
-        # Reject if we can't find these columns:
-        # IBAN, Booked At, Text, Credit/Debit Amount
-        return all(col in df.columns for col in ("IBAN", "Booked At", "Text", "Credit/Debit Amount"))
-
-    def __init__(self, path: Path) -> None:
-        self.path = path
-        if not RaiffeisenCsv.can_parse(self.path):
-            raise ParseError(str(self.path))
+            return pd.read_csv(readable(self.path), header=0, delimiter=";", encoding="ANSI", dtype=str)
+
+    def get_batches(self) -> dict[str, TransactionBatch]:
+        return self._fold(self._df) or {"main": TransactionBatch.empty()}
+
+    def iter_batches(self, chunksize: int) -> Iterator[dict[str, TransactionBatch]]:
+        """Read the file chunksize rows at a time; memory use does not depend on the file size.
+
+        The booked row that ends a chunk may still get continuation rows from the next chunk,
+        so it is carried over together with the continuation rows seen so far.
+        """
+        import pandas as pd
+
+        carry: pd.DataFrame | None = None
+        is_empty = True
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
-            self._df = pd.read_csv(self.path, header=0, delimiter=";", encoding="ANSI", dtype=str)
-
-    def get_transactions(self) -> dict[str, pd.DataFrame]:
-        if self._df.empty:
-            return {"main": pd.DataFrame(columns=ParserBase.target_columns)}
-
-        transactions = defaultdict(list)
-        new_row: dict[str, Any] = {}
-        for _, row in tqdm((self._df.iloc[::-1]).iterrows(), desc="Processing", total=len(self._df)):
-            if pd.isna(row["IBAN"]):
-                if "Memo" in new_row:
-                    new_row["Memo"] = row["Text"] + ", " + new_row.get("Memo", "")
-                else:
-                    new_row["Memo"] = row["Text"]
-            else:
-                new_row["Date"] = pd.to_datetime(row["Booked At"][:10], format="%Y-%m-%d")
-                new_row["Payee"] = ""
-                if "Memo" in new_row:
-                    new_row["Memo"] = row["Text"] + ", " + new_row.get("Memo", "")
-                else:
-                    new_row["Memo"] = row["Text"]
-                new_row["Payee"] = new_row["Memo"]  # TODO: use mapping/apply on all rows
-                amount = Decimal(row["Credit/Debit Amount"])
-                if amount >= 0:
-                    new_row["Inflow"] = amount
-                    new_row["Outflow"] = Decimal(0)
-                else:
-                    new_row["Inflow"] = Decimal(0)
-                    new_row["Outflow"] = -amount
-                transactions[row["IBAN"]].append(new_row)
-                new_row = {}
-
-        if not transactions:
-            return {"main": pd.DataFrame(columns=ParserBase.target_columns)}
-
-        result = {}
-        for iban, transaction_list in transactions.items():
-            result[iban] = pd.DataFrame(reversed(transaction_list), columns=ParserBase.target_columns)
-
-        return result
+            reader = pd.read_csv(
+                readable(self.path),
+                header=0,
+                delimiter=";",
+                encoding="ANSI",
+                dtype=str,
+                chunksize=chunksize,
+            )
+        with reader:
+            for chunk in reader:
+                rows = chunk if carry is None else pd.concat([carry, chunk])
+                booked_positions = rows["IBAN"].notna().to_numpy().nonzero()[0]
+                last_booked = booked_positions[-1] if len(booked_positions) else len(rows)
+                done, carry = rows.iloc[:last_booked], rows.iloc[last_booked:]
+                if transactions := self._fold(done):
+                    is_empty = False
+                    yield transactions
+        if carry is not None and (transactions := self._fold(carry)):
+            is_empty = False
+            yield transactions
+        if is_empty:
+            yield {"main": TransactionBatch.empty()}
+
+    def _fold(self, df: pd.DataFrame) -> dict[str, TransactionBatch]:
+        """Turn raw rows into one transaction batch per selected IBAN. Returns {} if df holds no selected booked row."""
+        import numpy as np
+        import pandas as pd
+
+        # A booked row (non-empty IBAN) opens a group, the continuation rows that follow it
+        # only carry additional memo text, so every group is a contiguous slice of rows. Rows
+        # before the first booked row belong to no group.
+        booked = df["IBAN"].notna()
+        rows = df.loc[booked]
+        starts = np.flatnonzero(booked.to_numpy())
+        ends = np.append(starts[1:], len(df))
+        if self.selection is not None:
+            # Groups that are not selected are dropped before their memos and amounts are parsed.
+            selected = self._selected(rows, self.selection)
+            rows, starts, ends = rows[selected], starts[selected], ends[selected]
+        if rows.empty:
+            return {}
+        texts = df["Text"].fillna("").tolist()
+        memos = [", ".join(texts[start:end]) for start, end in zip(starts.tolist(), ends.tolist(), strict=True)]
+
+        cents, decimals = amounts_from_text(rows["Credit/Debit Amount"])
+        is_inflow = cents >= 0
+        no_decimals = np.zeros_like(decimals)
+        batch = TransactionBatch.from_columns(
+            dates=pd.to_datetime(rows["Booked At"].str[:10], format="%Y-%m-%d"),
+            memos=memos,
+            inflow=(np.where(is_inflow, cents, 0), np.where(is_inflow, decimals, no_decimals)),
+            outflow=(np.where(is_inflow, 0, -cents), np.where(is_inflow, no_decimals, decimals)),
+            payees=memos,  # TODO: use mapping/apply on all rows
+        )
+
+        # Accounts are listed in order of their last booking, as the former bottom-up scan did.
+        ibans = rows["IBAN"].to_numpy()
+        by_iban = dict(iter(batch.frame.groupby(ibans, sort=False)))
+        return {
+            iban: TransactionBatch(by_iban[iban].reset_index(drop=True)) for iban in rows["IBAN"].iloc[::-1].unique()
+        }
+
+    @staticmethod
+    def _selected(rows: pd.DataFrame, selection: TransactionFilter) -> np.ndarray:
+        """Which booked rows selection selects."""
+        import numpy as np
+
+        keep = np.ones(len(rows), dtype=bool)
+        if selection.accounts is not None:
+            ibans = [iban for iban in rows["IBAN"].unique() if selection.selects_account(iban)]
+            keep &= rows["IBAN"].isin(ibans).to_numpy()
+        # Booked At starts with the ISO date, so the range is checked on the text, before dates are parsed.
+        days = rows["Booked At"].str[:10]
+        if selection.since is not None:
+            keep &= (days >= selection.since.isoformat()).to_numpy(dtype=bool, na_value=False)
+        if selection.until is not None:
+            keep &= (days <= selection.until.isoformat()).to_numpy(dtype=bool, na_value=False)
+        return keep
 
 
 if __name__ == "__main__":
@@ -1,40 +1,39 @@
-import warnings
-from decimal import Decimal
-from pathlib import Path
+from __future__ import annotations
 
-import pandas as pd
-from tqdm import tqdm
+from functools import cached_property
+from typing import TYPE_CHECKING
 
-from ynabify.exceptions import LanguageError, ParseError
-from ynabify.parser_base import ParserBase
+from ynabify.exceptions import LanguageError
+from ynabify.parser_base import ParserBase, TransactionBatch, amounts_from_text
+from ynabify.parser_registry import register
+from ynabify.xlsx_reader import date_range_skip, iter_xlsx
 
-pd.set_option("display.max_columns", 10)
-pd.set_option("display.max_colwidth", 30)
+if TYPE_CHECKING:
+    from collections.abc import Iterator
 
+    import pandas as pd
 
+    from ynabify.parser_base import TransactionFilter
+    from ynabify.sniff import FileHeader, Source
+
+
+@register
 class SwisscardXlsx(ParserBase):
-    @staticmethod
-    def can_parse(path: Path) -> bool:
-        if path.suffix.lower() != ".xlsx":
-            return False
-        if not path.exists():
-            return False
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            df = pd.read_excel(path, dtype=str)
-        # Reject if we can't find these columns:
-        # Transaktionsdatum, Beschreibung, Betrag, Status
-        return all(col in df.columns for col in ("Transaktionsdatum", "Beschreibung", "Betrag", "Status")) or all(
-            col in df.columns for col in ("Transaction date", "Description", "Amount", "Status")
-        )
+    suffixes = (".xlsx",)
+    required_columns = (
+        ("Transaktionsdatum", "Beschreibung", "Betrag", "Status"),
+        ("Transaction date", "Description", "Amount", "Status"),
+    )
 
-    def __init__(self, path: Path) -> None:
+    def __init__(
+        self,
+        path: Source,
+        header: FileHeader | None = None,
+        selection: TransactionFilter | None = None,
+    ) -> None:
         self.path = path
-        if not SwisscardXlsx.can_parse(self.path):
-            raise ParseError(str(self.path))
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            self._df = pd.read_excel(self.path, dtype=str)
+        self.selection = selection
+        self._header = SwisscardXlsx.check_header(self.path, header)
         self._lang = self.determine_language()
         self._t = {
             "de": {
@@ -43,6 +42,7 @@ class SwisscardXlsx(ParserBase):
                 "Amount": "Betrag",
                 "Status": "Status",
                 "Posted": "Gebucht",
+                "Card number": "Kartennummer",
             },
             "en": {
                 "Transaction date": "Transaction date",
@@ -50,39 +50,79 @@ class SwisscardXlsx(ParserBase):
                 "Amount": "Amount",
                 "Status": "Status",
                 "Posted": "Posted",
+                "Card number": "Card number",
             },
         }[self._lang]
+        self._columns = [self._t[column] for column in ("Transaction date", "Description", "Amount", "Status")]
+        if self._t["Card number"] in self._header.columns:
+            self._columns.append(self._t["Card number"])
+        self._card_number: str | None = None
+
+    def _frames(self, chunksize: int | None) -> Iterator[pd.DataFrame]:
+        if self.selection is not None and not self.selection.selects_account("main"):
+            import pandas as pd
+
+            yield pd.DataFrame(columns=self._columns)
+            return
+        yield from iter_xlsx(
+            self.path,
+            self._columns,
+            chunksize,
+            as_text=True,
+            skip=date_range_skip(self.selection),
+            header=self._header,
+        )
+
+    @cached_property
+    def _df(self) -> pd.DataFrame:
+        return next(self._frames(None))
 
     def determine_language(self) -> str:
-        if "Transaktionsdatum" in self._df.columns:
+        if "Transaktionsdatum" in self._header.columns:
             return "de"
-        if "Transaction date" in self._df.columns:
+        if "Transaction date" in self._header.columns:
             return "en"
-        raise LanguageError(self.path)
-
-    def get_transactions(self) -> dict[str, pd.DataFrame]:
-        if self._df.empty:
-            return {"main": pd.DataFrame(columns=("Date", "Payee", "Memo", "Inflow", "Outflow"))}
-
-        transactions = []
-        for _, row in tqdm(self._df.iterrows(), desc="Processing", total=len(self._df)):
-            if row[self._t["Status"]] != self._t["Posted"]:
-                continue
-            amount = Decimal(row[self._t["Amount"]])
-            transactions.append(
-                {
-                    "Date": pd.to_datetime(row[self._t["Transaction date"]], format="%Y-%m-%d 00:00:00"),
-                    "Payee": "",
-                    "Memo": row[self._t["Description"]],
-                    "Inflow": -amount if amount < 0 else Decimal(0),
-                    "Outflow": amount if amount > 0 else Decimal(0),
-                },
-            )
-
-        if not transactions:
-            return {"main": pd.DataFrame(columns=("Date", "Payee", "Memo", "Inflow", "Outflow"))}
-
-        return {"main": pd.DataFrame(transactions)}
+        raise LanguageError(str(self.path))
+
+    def account_id(self, account: str) -> str:
+        """The card number of the first transaction, as the statement masks it, e.g. "1234 56**** *7890".
+
+        Known once the first rows have been read.
+        """
+        return self._card_number or account
+
+    def get_batches(self) -> dict[str, TransactionBatch]:
+        return self._batches(self._df)
+
+    def iter_batches(self, chunksize: int) -> Iterator[dict[str, TransactionBatch]]:
+        """Read the sheet chunksize rows at a time, see iter_xlsx."""
+        for df in self._frames(chunksize):
+            yield self._batches(df)
+
+    def _batches(self, df: pd.DataFrame) -> dict[str, TransactionBatch]:
+        import numpy as np
+        import pandas as pd
+
+        card_column = self._t["Card number"]
+        if self._card_number is None and card_column in df.columns:
+            card_numbers = df[card_column].dropna()
+            if len(card_numbers):
+                self._card_number = str(card_numbers.iloc[0])
+
+        posted = df[df[self._t["Status"]] == self._t["Posted"]]
+        if posted.empty:
+            return {"main": TransactionBatch.empty()}
+
+        # Card statements show charges as positive amounts and refunds and payments as negative ones.
+        cents, decimals = amounts_from_text(posted[self._t["Amount"]])
+        no_decimals = np.zeros_like(decimals)
+        batch = TransactionBatch.from_columns(
+            dates=pd.to_datetime(posted[self._t["Transaction date"]], format="%Y-%m-%d 00:00:00"),
+            memos=posted[self._t["Description"]],
+            inflow=(np.where(cents < 0, -cents, 0), np.where(cents < 0, decimals, no_decimals)),
+            outflow=(np.where(cents > 0, cents, 0), np.where(cents > 0, decimals, no_decimals)),
+        )
+        return {"main": batch} if self.selection is None else self.selection.apply({"main": batch})
 
 
 if __name__ == "__main__":
@@ -1,55 +1,79 @@
-import warnings
-from decimal import Decimal
-from pathlib import Path
+from __future__ import annotations
 
-import pandas as pd
+from functools import cached_property
+from typing import TYPE_CHECKING
 
-from ynabify.exceptions import ParseError
-from ynabify.parser_base import ParserBase
+from ynabify.parser_base import ParserBase, TransactionBatch, amounts_from_float, amounts_from_text
+from ynabify.parser_registry import register
+from ynabify.xlsx_reader import date_range_skip, iter_xlsx
 
-pd.set_option("display.max_columns", 10)
-pd.set_option("display.max_colwidth", 30)
+if TYPE_CHECKING:
+    from collections.abc import Iterator
 
+    import pandas as pd
 
+    from ynabify.parser_base import Amounts, TransactionFilter
+    from ynabify.sniff import FileHeader, Source
+
+
+@register
 class YnabXlsx(ParserBase):
-    @staticmethod
-    def can_parse(path: Path) -> bool:
-        if path.suffix.lower() != ".xlsx":
-            return False
-        if not path.exists():
-            return False
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            df = pd.read_excel(path)
-        return all(col in df.columns for col in ("Date", "Memo", "Outflow", "Inflow"))
-
-    def __init__(self, path: Path) -> None:
+    suffixes = (".xlsx",)
+    required_columns = (("Date", "Memo", "Outflow", "Inflow"),)
+
+    def __init__(
+        self,
+        path: Source,
+        header: FileHeader | None = None,
+        selection: TransactionFilter | None = None,
+    ) -> None:
         self.path = path
-        if not YnabXlsx.can_parse(self.path):
-            raise ParseError(str(self.path))
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            self._df = pd.read_excel(self.path)
-
-    def get_transactions(self) -> dict[str, pd.DataFrame]:
-        # if self._df.empty:
-        #     return {'main': pd.DataFrame(columns=('Date', 'Payee', 'Memo', 'Inflow', 'Outflow'))}
-
-        transactions = [
-            {
-                "Date": pd.to_datetime(row["Date"], format="%d.%m.%Y"),
-                "Payee": "",
-                "Memo": row["Memo"],
-                "Inflow": Decimal(row["Inflow"]) if not pd.isna(row["Inflow"]) else Decimal(0),
-                "Outflow": Decimal(row["Outflow"]) if not pd.isna(row["Outflow"]) else Decimal(0),
-            }
-            for _, row in self._df.iterrows()
-        ]
-
-        if not transactions:
-            return {"main": pd.DataFrame(columns=("Date", "Payee", "Memo", "Inflow", "Outflow"))}
-
-        return {"main": pd.DataFrame(transactions)}
+        self.selection = selection
+        self._header = YnabXlsx.check_header(self.path, header)
+
+    def _frames(self, chunksize: int | None) -> Iterator[pd.DataFrame]:
+        columns = YnabXlsx.required_columns[0]
+        if self.selection is not None and not self.selection.selects_account("main"):
+            import pandas as pd
+
+            yield pd.DataFrame(columns=list(columns))
+            return
+        yield from iter_xlsx(self.path, columns, chunksize, skip=date_range_skip(self.selection), header=self._header)
+
+    @cached_property
+    def _df(self) -> pd.DataFrame:
+        return next(self._frames(None))
+
+    def get_batches(self) -> dict[str, TransactionBatch]:
+        return self._batches(self._df)
+
+    def iter_batches(self, chunksize: int) -> Iterator[dict[str, TransactionBatch]]:
+        """Read the sheet chunksize rows at a time, see iter_xlsx."""
+        for df in self._frames(chunksize):
+            yield self._batches(df)
+
+    def _batches(self, df: pd.DataFrame) -> dict[str, TransactionBatch]:
+        import pandas as pd
+
+        if df.empty:
+            return {"main": TransactionBatch.empty()}
+
+        batch = TransactionBatch.from_columns(
+            dates=pd.to_datetime(df["Date"], format="%d.%m.%Y"),
+            memos=df["Memo"],
+            inflow=self._to_amounts(df["Inflow"]),
+            outflow=self._to_amounts(df["Outflow"]),
+        )
+        return {"main": batch} if self.selection is None else self.selection.apply({"main": batch})
+
+    @staticmethod
+    def _to_amounts(column: pd.Series) -> Amounts:
+        """Convert a numeric column, treating empty cells as 0. Cells typed in as text are read as such."""
+        import pandas as pd
+
+        if pd.api.types.is_numeric_dtype(column):
+            return amounts_from_float(column)
+        return amounts_from_text(column.where(column.notna(), "0").astype(str))
 
 
 if __name__ == "__main__":
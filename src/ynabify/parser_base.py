@@ -1,21 +1,414 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
-from pathlib import Path
+from dataclasses import dataclass
+from decimal import ROUND_HALF_EVEN, Decimal
+from typing import TYPE_CHECKING, ClassVar
+
+from ynabify.exceptions import ParseError
+from ynabify.sniff import FileHeader, sniff_header
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator, Sequence
+    from datetime import date
+
+    import numpy as np
+    import pandas as pd
+
+    from ynabify.sniff import Source
+
+    # Amounts in minor units and the number of decimals the statement showed for each of them.
+    Amounts = tuple[np.ndarray, np.ndarray]
+
+# Amounts are stored as integers in minor units (Rappen, cents).
+MINOR_UNITS = 100
+MAX_DECIMALS = 2
+_CENT = Decimal("0.01")
+# Rows per chunk when statements are streamed; bounds memory use independent of the statement size.
+DEFAULT_CHUNKSIZE = 50_000
+
+
+def amounts_from_text(text: pd.Series) -> Amounts:
+    """Parse amounts written as decimal text, e.g. "-15.5" or "122.10", keeping their number of decimals.
+
+    Amounts with more than two decimals are rounded to cents. Raises decimal.InvalidOperation for
+    missing or malformed amounts.
+    """
+    import numpy as np
+    import pandas as pd
+
+    text = text.str.strip()
+    values = pd.to_numeric(text, errors="coerce").to_numpy(dtype=float)
+    dot = text.str.find(".").to_numpy()
+    decimals = np.where(dot >= 0, text.str.len().to_numpy() - dot - 1, 0)
+    exact = ~np.isnan(values) & (decimals <= MAX_DECIMALS) & (np.abs(values) < 2**53 / MINOR_UNITS)
+
+    cents = np.zeros(len(text), dtype=np.int64)
+    cents[exact] = np.rint(values[exact] * MINOR_UNITS)
+    for i in np.flatnonzero(~exact):
+        cents[i], decimals[i] = _decimal_amount(Decimal(text.iloc[i]))
+    return cents, decimals.astype(np.int8)
+
+
+def amounts_from_float(values: pd.Series) -> Amounts:
+    """Convert numbers read from a workbook, treating empty cells as 0. Decimals are the fewest that show the amount."""
+    import numpy as np
+
+    floats = values.to_numpy(dtype=float, na_value=0.0)
+    cents = np.rint(floats * MINOR_UNITS).astype(np.int64)
+    decimals = np.where(cents % MINOR_UNITS == 0, 0, np.where(cents % 10 == 0, 1, 2))
+    return cents, decimals.astype(np.int8)
+
+
+def _decimal_amount(amount: Decimal) -> tuple[int, int]:
+    exponent = amount.as_tuple().exponent
+    decimals = min(max(-exponent, 0), MAX_DECIMALS) if isinstance(exponent, int) else MAX_DECIMALS
+    return int(amount.quantize(_CENT, rounding=ROUND_HALF_EVEN).scaleb(2)), decimals
+
+
+def format_amounts(cents: np.ndarray, decimals: np.ndarray | int) -> np.ndarray:
+    """Render amounts in minor units as decimal text with the given number of decimals (0 to 2)."""
+    import numpy as np
+
+    # Statements repeat the same amounts a lot, so only the distinct ones are rendered.
+    keys = cents.astype(np.int64) * 4 + decimals
+    distinct, inverse = np.unique(keys, return_inverse=True)
+    cents, decimals = distinct // 4, distinct % 4
+
+    magnitude = np.abs(cents)
+    whole = (magnitude // MINOR_UNITS).astype(str)
+    tenths = (magnitude // 10 % 10).astype(str)
+    fraction = np.where(decimals == 1, tenths, np.char.add(tenths, (magnitude % 10).astype(str)))
+    text = np.where(decimals == 0, whole, np.char.add(np.char.add(whole, "."), fraction))
+    return np.char.add(np.where(cents < 0, "-", ""), text)[inverse]
+
+
+@dataclass(frozen=True, slots=True)
+class Transaction:
+    """One transaction, as yielded by ParserBase.iter_transactions."""
+
+    date: date
+    payee: str
+    memo: str
+    inflow: Decimal
+    outflow: Decimal
+
+
+def _account_key(account: str) -> str:
+    return "".join(account.split()).casefold()
+
+
+@dataclass(frozen=True)
+class TransactionFilter:
+    """Which transactions to convert: those booked from since to until, both inclusive, in accounts.
+
+    accounts are account numbers as the statements give them, e.g. IBANs, compared ignoring case
+    and spaces; statements of a single account call it "main". None selects every date or account.
+    Parsers apply the filter while reading where they can, see ParserBase.
+    """
+
+    since: date | None = None
+    until: date | None = None
+    accounts: frozenset[str] | None = None
+
+    @property
+    def has_dates(self) -> bool:
+        return self.since is not None or self.until is not None
+
+    def selects_account(self, account: str) -> bool:
+        return self.accounts is None or _account_key(account) in {_account_key(a) for a in self.accounts}
+
+    def date_mask(self, dates: pd.Series) -> np.ndarray:
+        """Which of the datetimes are in the date range."""
+        import numpy as np
+
+        days = dates.to_numpy().astype("datetime64[D]")
+        mask = np.ones(len(days), dtype=bool)
+        if self.since is not None:
+            mask &= days >= np.datetime64(self.since, "D")
+        if self.until is not None:
+            mask &= days <= np.datetime64(self.until, "D")
+        return mask
+
+    def apply(self, batches: dict[str, TransactionBatch]) -> dict[str, TransactionBatch]:
+        """The selected transactions of the batches of a statement, in the format of ParserBase.get_batches."""
+        selected = {}
+        for account, batch in batches.items():
+            if self.selects_account(account):
+                selected[account] = batch.filter(self.date_mask(batch.frame["Date"])) if self.has_dates else batch
+        return selected or {"main": TransactionBatch.empty()}
+
+
+class RangeEnd:
+    """Tells which rows of a statement sorted by date lie past the end of the date range.
+
+    Called with the date of every row in turn, None for rows without one. The rows count as sorted
+    while all dates so far are in one order, ascending or descending; once the order breaks, the
+    end is never reported. A row reported is out of range by its date, whatever follows it, but
+    the rows after it need not be: a later row may break the order and fall in range again.
+    """
+
+    def __init__(self, selection: TransactionFilter) -> None:
+        self.selection = selection
+        self._last: date | None = None
+        # 1 ascending, -1 descending, 0 not known yet, None unsorted
+        self._order: int | None = 0
+
+    def __call__(self, day: date | None) -> bool:
+        if day is None or self._order is None:
+            return False
+        if self._last is not None and day != self._last:
+            order = 1 if day > self._last else -1
+            if self._order == 0:
+                self._order = order
+            elif order != self._order:
+                self._order = None
+                return False
+        self._last = day
+        if self._order == 1:
+            return self.selection.until is not None and day > self.selection.until
+        if self._order == -1:
+            return self.selection.since is not None and day < self.selection.since
+        return False
+
+
+@dataclass
+class TransactionBatch:
+    """Transactions of one account in compact columns.
+
+    frame holds Date (datetime64[s]), Payee and Memo (categorical), Inflow and Outflow (int64 minor
+    units) and InflowDecimals and OutflowDecimals (int8). The decimals keep how the statement wrote
+    each amount, so the csv shows "2000", "15.5" or "122.10" exactly as before. Decimal values or
+    text are only produced on the way out, by to_frame and the csv writer.
+    """
 
-import pandas as pd
+    frame: pd.DataFrame
+
+    @classmethod
+    def from_columns(
+        cls,
+        dates: Iterable,
+        memos: Iterable,
+        inflow: Amounts,
+        outflow: Amounts,
+        payees: Iterable | None = None,
+    ) -> TransactionBatch:
+        """dates are datetimes, inflow and outflow non-negative amounts. Payees default to empty."""
+        import numpy as np
+        import pandas as pd
+
+        memo_values = np.asarray(memos, dtype=object)
+        payee_values = (
+            np.full(len(memo_values), "", dtype=object) if payees is None else np.asarray(payees, dtype=object)
+        )
+        frame = pd.DataFrame(
+            {
+                "Date": np.asarray(dates, dtype="datetime64[s]"),
+                "Payee": pd.Categorical(payee_values),
+                "Memo": pd.Categorical(memo_values),
+                "Inflow": inflow[0],
+                "Outflow": outflow[0],
+                "InflowDecimals": inflow[1],
+                "OutflowDecimals": outflow[1],
+            },
+        )
+        return cls(frame)
+
+    @classmethod
+    def empty(cls) -> TransactionBatch:
+        import numpy as np
+
+        no_amounts = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int8))
+        return cls.from_columns([], [], no_amounts, no_amounts)
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    @property
+    def memos(self) -> pd.Series:
+        return self.frame["Memo"]
+
+    def set_payees(self, payees: Sequence[str] | np.ndarray) -> None:
+        import numpy as np
+        import pandas as pd
+
+        self.frame["Payee"] = pd.Categorical(np.asarray(payees, dtype=object))
+
+    def resolve_payees(self, resolve: Callable[[list[str]], list[str]]) -> None:
+        """Set the payees to resolve(memos), calling it once with the distinct memos only.
+
+        Rows without a memo get an empty payee.
+        """
+        import numpy as np
+
+        memos = self.frame["Memo"]
+        payees = resolve([str(category) for category in memos.cat.categories])
+        # code -1 marks missing memos and picks the trailing ""
+        self.set_payees(np.asarray([*payees, ""], dtype=object)[memos.cat.codes.to_numpy()])
+
+    def filter(self, mask: pd.Series | np.ndarray) -> TransactionBatch:
+        import numpy as np
+
+        return TransactionBatch(self.frame[np.asarray(mask)].reset_index(drop=True))
+
+    def by_month(self) -> dict[str, TransactionBatch]:
+        """The transactions of every month, keyed by "YYYY-MM", earliest month first."""
+        import numpy as np
+
+        months = self.frame["Date"].to_numpy().astype("datetime64[M]")
+        return {str(month): self.filter(months == month) for month in np.unique(months)}
+
+    def amount_text(self, column: str) -> np.ndarray:
+        """Inflow or Outflow as text, exactly as the statement wrote it."""
+        return format_amounts(self.frame[column].to_numpy(), self.frame[f"{column}Decimals"].to_numpy())
+
+    def texts(self, column: str) -> list[str]:
+        """Payee or Memo as a list of strings, with missing values as ""."""
+        import numpy as np
+
+        values = self.frame[column]
+        # code -1 marks missing values and picks the trailing ""
+        categories = np.asarray([*(str(category) for category in values.cat.categories), ""], dtype=object)
+        return categories[values.cat.codes.to_numpy()].tolist()
+
+    def records(self) -> Iterator[Transaction]:
+        """The transactions one by one."""
+        dates = self.frame["Date"].to_numpy().astype("datetime64[D]").tolist()
+        inflows = map(Decimal, self.amount_text("Inflow").tolist())
+        outflows = map(Decimal, self.amount_text("Outflow").tolist())
+        return map(Transaction, dates, self.texts("Payee"), self.texts("Memo"), inflows, outflows)
+
+    def to_frame(self) -> pd.DataFrame:
+        """The transactions in ParserBase.target_columns with Decimal amounts."""
+        import pandas as pd
+
+        return pd.DataFrame(
+            {
+                "Date": self.frame["Date"],
+                "Payee": self.frame["Payee"].astype(object),
+                "Memo": self.frame["Memo"].astype(object),
+                "Inflow": pd.Series([Decimal(x) for x in self.amount_text("Inflow")], dtype=object),
+                "Outflow": pd.Series([Decimal(x) for x in self.amount_text("Outflow")], dtype=object),
+            },
+            columns=ParserBase.target_columns,
+        )
 
 
 class ParserBase(ABC):
     target_columns = ("Date", "Payee", "Memo", "Inflow", "Outflow")
 
-    @staticmethod
-    @abstractmethod
-    def can_parse(path: Path) -> bool:
-        pass
+    # File suffixes this parser handles. Checked before any byte of the file is read.
+    suffixes: ClassVar[tuple[str, ...]] = ()
+    # Alternative sets of header columns; a file is accepted if it contains all columns of one set.
+    required_columns: ClassVar[tuple[tuple[str, ...], ...]] = ()
+    # Bump whenever the parser produces different transactions for the same file; this invalidates
+    # the statements it parsed before in the parse cache.
+    version: ClassVar[int] = 1
+
+    @classmethod
+    def accepts(cls, header: FileHeader) -> bool:
+        if header.suffix not in cls.suffixes:
+            return False
+        return any(all(col in header.columns for col in columns) for columns in cls.required_columns)
+
+    @classmethod
+    def can_parse(cls, path: Source) -> bool:
+        if path.suffix.lower() not in cls.suffixes:
+            return False
+        header = sniff_header(path)
+        return header is not None and cls.accepts(header)
+
+    @classmethod
+    def check_header(cls, path: Source, header: FileHeader | None) -> FileHeader:
+        """Return the header of path, sniffing it unless the caller already did, or raise ParseError."""
+        if header is None:
+            header = sniff_header(path) if path.suffix.lower() in cls.suffixes else None
+        if header is None or not cls.accepts(header):
+            raise ParseError(str(path))
+        return header
 
     @abstractmethod
-    def __init__(self, path: str) -> None:
-        pass
+    def __init__(
+        self,
+        path: Source,
+        header: FileHeader | None = None,
+        selection: TransactionFilter | None = None,
+    ) -> None:
+        """selection limits the transactions get_batches and iter_batches return; see TransactionFilter."""
+
+    @property
+    def name(self) -> str:
+        """The name of the parser that read the statement, e.g. "RaiffeisenCsv"."""
+        return type(self).__name__
+
+    def account_id(self, account: str) -> str:
+        """What tells account apart from the accounts of other statements, e.g. in the ledger.
+
+        Accounts are named by their number where the statement has one per row. Parsers of
+        statements about a single account, named "main", return its number if the file names it.
+        """
+        return account
+
+    def parser_name(self, account: str) -> str:  # noqa: ARG002 - merged statements tell by account
+        """The name of the parser that read account; it keys the account in the ledger with account_id."""
+        return self.name
 
     @abstractmethod
+    def get_batches(self) -> dict[str, TransactionBatch]:
+        """Return the transactions of every account in the file."""
+
+    def iter_batches(self, chunksize: int) -> Iterator[dict[str, TransactionBatch]]:  # noqa: ARG002
+        """Yield the transactions in chunks of about chunksize rows, in the same format as get_batches.
+
+        Parsers that can read their file incrementally override this; by default everything is one chunk.
+        """
+        yield self.get_batches()
+
+    def iter_transactions(self, chunksize: int = DEFAULT_CHUNKSIZE) -> Iterator[tuple[str, Transaction]]:
+        """Yield (account, transaction) pairs, reading the file in chunks as iter_batches does."""
+        for batches in self.iter_batches(chunksize):
+            for account, batch in batches.items():
+                for transaction in batch.records():
+                    yield account, transaction
+
     def get_transactions(self) -> dict[str, pd.DataFrame]:
-        pass
+        """Like get_batches, as frames in target_columns with Decimal amounts."""
+        return {account: batch.to_frame() for account, batch in self.get_batches().items()}
+
+    def iter_chunks(self, chunksize: int) -> Iterator[dict[str, pd.DataFrame]]:
+        """Like iter_batches, as frames in target_columns with Decimal amounts."""
+        for batches in self.iter_batches(chunksize):
+            yield {account: batch.to_frame() for account, batch in batches.items()}
+
+
+class ParsedStatement(ParserBase):
+    """Transactions that were parsed before, e.g. loaded from the parse cache or merged from several statements.
+
+    name is the name of the parser that read them, account_ids what its account_id returned.
+    parser_names gives the parser of accounts that were read by another parser than name.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batches: dict[str, TransactionBatch],
+        account_ids: dict[str, str] | None = None,
+        parser_names: dict[str, str] | None = None,
+    ) -> None:
+        self._name = name
+        self._batches = batches
+        self.account_ids = account_ids or {}
+        self.parser_names = parser_names or {}
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def account_id(self, account: str) -> str:
+        return self.account_ids.get(account, account)
+
+    def parser_name(self, account: str) -> str:
+        return self.parser_names.get(account, self._name)
+
+    def get_batches(self) -> dict[str, TransactionBatch]:
+        return self._batches
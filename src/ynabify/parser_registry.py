@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING, TypeVar
+
+from ynabify.metrics import Metrics
+from ynabify.parser_base import ParserBase
+from ynabify.sniff import sniff_header
+
+if TYPE_CHECKING:
+    from ynabify.parser_base import TransactionFilter
+    from ynabify.sniff import FileHeader, Source
+
+logger = logging.getLogger(__name__)
+
+_parsers: list[type[ParserBase]] = []
+
+P = TypeVar("P", bound=type[ParserBase])
+
+
+def register(parser_cls: P) -> P:
+    """Class decorator that makes a parser available to open_parser. Parsers are tried in registration order."""
+    _parsers.append(parser_cls)
+    return parser_cls
+
+
+def registered_parsers() -> tuple[type[ParserBase], ...]:
+    import ynabify.parser  # noqa: F401, PLC0415 - the parser modules register themselves on import
+
+    return tuple(_parsers)
+
+
+def open_parser(
+    path: Source,
+    metrics: Metrics | None = None,
+    selection: TransactionFilter | None = None,
+) -> ParserBase | None:
+    """Return a parser for path, or None if no registered parser can handle it.
+
+    Parsers are first filtered by file suffix. Only if one of them is interested, the header
+    row is read, exactly once, and handed to the first parser that accepts it, together with
+    selection.
+    """
+    metrics = Metrics() if metrics is None else metrics
+    with metrics.stage("detect"):
+        detected = _detect(path)
+    if detected is None:
+        return None
+    parser_cls, header = detected
+    with metrics.stage("read"):
+        return parser_cls(path, header=header, selection=selection)
+
+
+def _detect(path: Source) -> tuple[type[ParserBase], FileHeader] | None:
+    suffix = path.suffix.lower()
+    candidates = [parser_cls for parser_cls in registered_parsers() if suffix in parser_cls.suffixes]
+    if not candidates:
+        return None
+    header = sniff_header(path)
+    if header is None:
+        return None
+    for parser_cls in candidates:
+        if parser_cls.accepts(header):
+            logger.debug(f"Detected {parser_cls.__name__} for {path}")
+            return parser_cls, header
+    return None
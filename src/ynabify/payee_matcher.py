@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from collections import deque
+from functools import cached_property
+from itertools import islice
+from typing import TYPE_CHECKING
+
+from ynabify.xlsx_reader import read_xlsx
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+    from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the layout of the cached pattern table changes.
+MAPPING_CACHE_VERSION = 1
+# Number of compiled mappings kept in the cache directory.
+MAPPING_CACHE_ENTRIES = 8
+# Bump whenever the matching rules change, so that payees resolved by older versions are dropped.
+MEMO_CACHE_VERSION = 1
+# Most memos whose payee a matcher remembers, in memory and in its memo cache file.
+MEMO_CACHE_ENTRIES = 100_000
+
+
+class PayeeMatcher:
+    """Case-insensitive longest-substring matcher over a `from` -> `to` mapping.
+
+    The patterns are compiled once into an Aho-Corasick automaton, so matching a memo
+    costs one pass over its characters regardless of the number of patterns. Among all
+    patterns contained in a memo the longest one wins; ties go to the pattern listed first.
+
+    resolve remembers the payees of the MEMO_CACHE_ENTRIES most recently resolved memos. With a
+    memo_cache_path, see load_memo_cache, they are also kept across runs.
+    """
+
+    def __init__(self, text_from: Sequence[str], text_to: Sequence[str]) -> None:
+        self.text_from = list(text_from)
+        self.text_to = list(text_to)
+        self._lengths = [len(pattern) for pattern in self.text_from]
+        self.memo_cache_path: Path | None = None
+        # memo -> payee, least recently used first
+        self._resolved: dict[str, str] = {}
+        self._unsaved = False
+
+        # Node 0 is the root. Every node keeps its outgoing edges, its failure link and
+        # the index of the best pattern that ends at this node or any of its suffixes.
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._best: list[int] = [-1]
+
+        for i, pattern in enumerate(self.text_from):
+            node = 0
+            for char in pattern.lower():
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(-1)
+                node = next_node
+            self._best[node] = self._better(self._best[node], i)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._best[child] = self._better(self._best[child], self._best[self._fail[child]])
+                queue.append(child)
+
+    def _better(self, a: int, b: int) -> int:
+        """Return the index of the preferred pattern: the longer one, then the earlier one."""
+        if a == -1:
+            return b
+        if b == -1:
+            return a
+        len_a, len_b = self._lengths[a], self._lengths[b]
+        if len_a != len_b:
+            return a if len_a > len_b else b
+        return min(a, b)
+
+    def match(self, string: str) -> str:
+        """Return the `to` value of the longest pattern contained in string, or "" if none matches."""
+        goto, fail, best = self._goto, self._fail, self._best
+        node = 0
+        found = best[0]
+        for char in string.lower():
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if best[node] != -1:
+                found = self._better(found, best[node])
+        if found == -1:
+            return ""
+        return self.text_to[found]
+
+    def match_many(self, strings: Iterable[str]) -> list[str]:
+        """Match every string of a column, e.g. a whole Memo column, in one pass."""
+        return [self.match(string) for string in strings]
+
+    def resolve(self, memos: Iterable[str]) -> list[str]:
+        """Like match_many, but only matches memos that were not resolved before."""
+        resolved = self._resolved
+        payees = []
+        for memo in memos:
+            payee = resolved.pop(memo, None)
+            if payee is None:
+                payee = self.match(memo)
+                self._unsaved = True
+            resolved[memo] = payee
+            payees.append(payee)
+        excess = len(resolved) - MEMO_CACHE_ENTRIES
+        if excess > 0:
+            for memo in list(islice(resolved, excess)):
+                del resolved[memo]
+        return payees
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """Content hash of the patterns; matchers with the same fingerprint resolve every memo alike."""
+        table = json.dumps([MEMO_CACHE_VERSION, self.text_from, self.text_to])
+        return hashlib.sha256(table.encode("utf_8")).hexdigest()
+
+    def load_memo_cache(self, cache_dir: Path) -> None:
+        """Remember the payees stored in cache_dir by earlier runs with the same patterns.
+
+        save_memo_cache writes newly resolved payees back there. A changed mapping has another
+        fingerprint and therefore its own file, so stale payees are never used.
+        """
+        self.memo_cache_path = cache_dir / f"memos-{self.fingerprint}.json"
+        stored = _read_memo_cache(self.memo_cache_path)
+        if stored:
+            logger.debug(f"Loaded {len(stored)} resolved memos from cache {self.memo_cache_path}")
+            os.utime(self.memo_cache_path)
+        self._resolved = {**stored, **self._resolved}
+
+    def save_memo_cache(self) -> None:
+        """Write the payees resolved since the last save to the memo cache, if there is one.
+
+        Entries other processes stored in the meantime are kept, up to MEMO_CACHE_ENTRIES in total.
+        """
+        if self.memo_cache_path is None or not self._unsaved:
+            return
+        cache_path = self.memo_cache_path
+        stored = _read_memo_cache(cache_path)
+        merged = {memo: payee for memo, payee in stored.items() if memo not in self._resolved}
+        merged.update(self._resolved)
+        merged = dict(islice(merged.items(), max(len(merged) - MEMO_CACHE_ENTRIES, 0), None))
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps({"version": MEMO_CACHE_VERSION, "payees": merged}), encoding="utf_8")
+            tmp_path.replace(cache_path)
+            _prune_cache(cache_path.parent, "memos-*.json")
+        except OSError as e:
+            logger.warning(f"Cannot cache resolved memos in {cache_path.parent}: {e}")
+            return
+        self._unsaved = False
+
+
+def _read_memo_cache(cache_path: Path) -> dict[str, str]:
+    try:
+        table = json.loads(cache_path.read_text(encoding="utf_8"))
+        if table["version"] == MEMO_CACHE_VERSION and isinstance(table["payees"], dict):
+            return table["payees"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return {}
+
+
+def read_mapping(mapping_path: Path) -> tuple[list[str], list[str]]:
+    """Read the `from` and `to` columns of a mapping workbook. Rows without a `from` pattern are skipped."""
+    replacements_raw = read_xlsx(mapping_path, ["from", "to"])
+    replacements_raw = replacements_raw.dropna(subset=["from"])
+    return [str(x) for x in replacements_raw["from"]], [str(x) for x in replacements_raw["to"].fillna("")]
+
+
+def _prune_cache(cache_dir: Path, pattern: str) -> None:
+    """Remove all but the MAPPING_CACHE_ENTRIES most recently used cache files matching pattern."""
+    entries = sorted(cache_dir.glob(pattern), key=lambda p: p.stat().st_mtime, reverse=True)
+    for stale_path in entries[MAPPING_CACHE_ENTRIES:]:
+        stale_path.unlink(missing_ok=True)
+
+
+def load_matcher(mapping_path: Path, cache_dir: Path | None = None) -> PayeeMatcher:
+    """Build the matcher for a mapping workbook.
+
+    With a cache_dir, the pattern table is stored there as json, keyed by the content hash of
+    the workbook, so later runs skip reading the workbook entirely until it changes. The matcher
+    also keeps its memo cache there, see PayeeMatcher.load_memo_cache.
+    """
+    if cache_dir is None:
+        return PayeeMatcher(*read_mapping(mapping_path))
+    matcher = _load_patterns(mapping_path, cache_dir)
+    matcher.load_memo_cache(cache_dir)
+    return matcher
+
+
+def _load_patterns(mapping_path: Path, cache_dir: Path) -> PayeeMatcher:
+    digest = hashlib.sha256(mapping_path.read_bytes()).hexdigest()
+    cache_path = cache_dir / f"mapping-{digest}.json"
+    try:
+        table = json.loads(cache_path.read_text(encoding="utf_8"))
+        if table["version"] == MAPPING_CACHE_VERSION:
+            logger.debug(f"Loaded mapping from cache {cache_path}")
+            os.utime(cache_path)
+            return PayeeMatcher(table["from"], table["to"])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    text_from, text_to = read_mapping(mapping_path)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(
+            json.dumps({"version": MAPPING_CACHE_VERSION, "from": text_from, "to": text_to}),
+            encoding="utf_8",
+        )
+        tmp_path.replace(cache_path)
+        _prune_cache(cache_dir, "mapping-*.json")
+    except OSError as e:
+        logger.warning(f"Cannot cache mapping in {cache_dir}: {e}")
+    return PayeeMatcher(text_from, text_to)
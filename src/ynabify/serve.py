@@ -0,0 +1,415 @@
+"""ynabify serve: convert uploaded statements over HTTP in a pool of warm worker processes.
+
+POST /convert takes a statement as the request body (?name=statement.csv labels it) and returns
+a zip with the YNAB csv of every account, named as the command line names its files. GET
+/metrics reports requests, latencies and conversion stages in the Prometheus text format, GET
+/health answers "ok".
+
+Every worker imports pandas and the parsers and compiles the mapping once, when the server
+starts, and recompiles it only after the mapping workbook has changed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import logging
+import os
+import time
+import zipfile
+from collections import Counter
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from pathlib import Path
+from typing import TYPE_CHECKING
+from urllib.parse import parse_qs, urlsplit
+
+from ynabify.exceptions import ParseError
+from ynabify.metrics import Metrics, StageMetrics
+from ynabify.user_dirs import user_cache_dir
+from ynabify.ynabify import OUTPUT_MARKER
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from concurrent.futures import ProcessPoolExecutor
+
+    from ynabify.payee_matcher import PayeeMatcher
+
+logger = logging.getLogger(__name__)
+
+# (size, mtime_ns) of the mapping workbook; workers recompile the mapping when it changes.
+Signature = tuple[int, int]
+
+DEFAULT_PORT = 8765
+MAX_UPLOAD_BYTES = 64 * 2**20
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Paths reported on their own in the metrics; requests for any other path count as "other".
+ROUTES = ("/convert", "/metrics", "/health")
+
+# Per-process state of the workers, filled by _init_worker and _matcher.
+_worker_state: dict[str, object] = {}
+
+
+@dataclass
+class UploadResult:
+    # zip with one YNAB csv per account, None if the statement was rejected
+    archive: bytes | None = None
+    parser: str | None = None
+    error: str | None = None
+    stages: dict[str, StageMetrics] = field(default_factory=dict)
+
+
+def _init_worker(mapping_path: Path, cache_dir: Path | None, signature: Signature) -> None:
+    logging.basicConfig(level=logging.INFO)
+    import pandas as pd  # noqa: F401 - imported once here instead of by the first request
+
+    from ynabify.parser_registry import registered_parsers
+
+    registered_parsers()
+    _matcher(mapping_path, cache_dir, signature)
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+def _matcher(mapping_path: Path, cache_dir: Path | None, signature: Signature) -> PayeeMatcher:
+    from ynabify.payee_matcher import PayeeMatcher, load_matcher
+
+    matcher = _worker_state.get("matcher")
+    if not isinstance(matcher, PayeeMatcher) or _worker_state.get("signature") != signature:
+        matcher = load_matcher(mapping_path, cache_dir)
+        _worker_state["matcher"], _worker_state["signature"] = matcher, signature
+    return matcher
+
+
+def file_names(stem: str, names: dict[str, str]) -> dict[str, str]:
+    """The csv file name of every account, as AccountCsvWriter names the files of a statement called stem."""
+    base = stem + OUTPUT_MARKER
+    if len(names) == 1:
+        return {account: f"{base}.csv" for account in names}
+    return {account: f"{base}_{name}.csv" for account, name in names.items()}
+
+
+def convert_upload(
+    data: bytes,
+    name: str,
+    mapping_path: Path,
+    cache_dir: Path | None,
+    signature: Signature,
+) -> UploadResult:
+    """Convert one uploaded statement in a worker process."""
+    from ynabify.api import convert
+
+    metrics = Metrics()
+    with metrics.stage("mapping"):
+        matcher = _matcher(mapping_path, cache_dir, signature)
+    try:
+        conversion = convert(data, matcher, name=name, metrics=metrics)
+    except ParseError as e:
+        return UploadResult(error=str(e), stages=metrics.stages)
+    with metrics.stage("write") as stage:
+        buffer = io.BytesIO()
+        # Statements are converted while the client waits; fast compression beats small archives.
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+            targets = file_names(Path(name).stem, conversion.names)
+            for account, csv in conversion.to_csv().items():
+                archive.writestr(targets[account], csv)
+        stage.add_rows(sum(len(batch) for batch in conversion.batches.values()))
+    return UploadResult(buffer.getvalue(), conversion.parser, stages=metrics.stages)
+
+
+class ServerMetrics:
+    """Requests by path and status, a latency histogram per path and the stages of all conversions."""
+
+    def __init__(self) -> None:
+        self.requests: Counter[tuple[str, int]] = Counter()
+        self.buckets: dict[str, list[int]] = {}
+        self.latency_sum: dict[str, float] = {}
+        self.in_flight = 0
+        self.conversion = Metrics()
+
+    def observe(self, path: str, status: int, seconds: float) -> None:
+        path = path if path in ROUTES else "other"
+        self.requests[path, status] += 1
+        buckets = self.buckets.setdefault(path, [0] * len(LATENCY_BUCKETS))
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                buckets[i] += 1
+        self.latency_sum[path] = self.latency_sum.get(path, 0.0) + seconds
+
+    def render(self, workers: int) -> str:
+        lines = [
+            "# TYPE ynabify_requests_total counter",
+            *(
+                f'ynabify_requests_total{{path="{path}",status="{status}"}} {n}'
+                for (path, status), n in sorted(self.requests.items())
+            ),
+            "# TYPE ynabify_request_seconds histogram",
+        ]
+        for path, buckets in sorted(self.buckets.items()):
+            count = sum(n for (p, _), n in self.requests.items() if p == path)
+            lines.extend(
+                f'ynabify_request_seconds_bucket{{path="{path}",le="{bound}"}} {n}'
+                for bound, n in zip(LATENCY_BUCKETS, buckets, strict=True)
+            )
+            lines.append(f'ynabify_request_seconds_bucket{{path="{path}",le="+Inf"}} {count}')
+            lines.append(f'ynabify_request_seconds_sum{{path="{path}"}} {self.latency_sum[path]}')
+            lines.append(f'ynabify_request_seconds_count{{path="{path}"}} {count}')
+        lines.extend(
+            [
+                "# TYPE ynabify_requests_in_flight gauge",
+                f"ynabify_requests_in_flight {self.in_flight}",
+                "# TYPE ynabify_workers gauge",
+                f"ynabify_workers {workers}",
+                "# TYPE ynabify_stage_seconds_total counter",
+            ],
+        )
+        stages = self.conversion.stages
+        lines.extend(f'ynabify_stage_seconds_total{{stage="{name}"}} {s.seconds}' for name, s in stages.items())
+        lines.append("# TYPE ynabify_stage_rows_total counter")
+        lines.extend(
+            f'ynabify_stage_rows_total{{stage="{name}"}} {s.rows}' for name, s in stages.items() if s.rows is not None
+        )
+        return "\n".join(lines) + "\n"
+
+
+@dataclass
+class _Response:
+    status: int
+    body: bytes
+    content_type: str = "text/plain; charset=utf-8"
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+class _BadRequest(Exception):  # noqa: N818 - carries the response, not an error of the server
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class ConversionServer:
+    """HTTP front end of the worker pool. See the module docstring for the endpoints."""
+
+    def __init__(
+        self,
+        mapping_path: Path,
+        cache_dir: Path | None = None,
+        workers: int | None = None,
+        max_upload_bytes: int = MAX_UPLOAD_BYTES,
+    ) -> None:
+        self.mapping_path = mapping_path
+        self.cache_dir = cache_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.max_upload_bytes = max_upload_bytes
+        self.metrics = ServerMetrics()
+        self._pool: ProcessPoolExecutor | None = None
+        self._stopping: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _signature(self) -> Signature:
+        stat = self.mapping_path.stat()
+        return (stat.st_size, stat.st_mtime_ns)
+
+    async def serve(self, host: str, port: int, ready: Callable[[int], None] | None = None) -> None:
+        """Start the workers, then serve until stop() is called. ready(port) is called once requests are accepted."""
+        from concurrent.futures import ProcessPoolExecutor
+
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        initargs = (self.mapping_path, self.cache_dir, self._signature())
+        self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=initargs)
+        try:
+            # One task per worker starts all of them, so the first requests find them warm.
+            await asyncio.gather(*(self._loop.run_in_executor(self._pool, _warm_up) for _ in range(self.workers)))
+            server = await asyncio.start_server(self._handle, host, port, limit=2**16)
+            async with server:
+                bound_port = server.sockets[0].getsockname()[1]
+                logger.info(f"Serving on http://{host}:{bound_port} with {self.workers} workers")
+                if ready is not None:
+                    ready(bound_port)
+                await self._stopping.wait()
+        finally:
+            self._pool.shutdown(cancel_futures=True)
+
+    def stop(self) -> None:
+        """Stop serving; may be called from any thread."""
+        if self._loop is not None and self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve the requests of one connection, which stays open unless the client closes it."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    writer.write(
+                        self._encode(_Response(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, b""), keep_alive=False)
+                    )
+                    await writer.drain()
+                    return
+                start = time.perf_counter()
+                self.metrics.in_flight += 1
+                path = "other"
+                try:
+                    method, target, version, headers = _parse_head(head)
+                    path = urlsplit(target).path
+                    keep_alive = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+                    body = await self._read_body(reader, headers)
+                    response = await self._route(method, target, body)
+                except _BadRequest as e:
+                    keep_alive = False
+                    response = _Response(e.status, f"{e}\n".encode())
+                finally:
+                    self.metrics.in_flight -= 1
+                writer.write(self._encode(response, keep_alive=keep_alive))
+                await writer.drain()
+                self.metrics.observe(path, response.status, time.perf_counter() - start)
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            return
+        finally:
+            writer.close()
+
+    async def _read_body(self, reader: asyncio.StreamReader, headers: dict[str, str]) -> bytes:
+        if "transfer-encoding" in headers:
+            raise _BadRequest(HTTPStatus.LENGTH_REQUIRED, "Send the statement with a Content-Length")
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST, "Invalid Content-Length") from None
+        if length > self.max_upload_bytes:
+            raise _BadRequest(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Statements are limited to {self.max_upload_bytes} bytes"
+            )
+        try:
+            return await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST, "Incomplete request body") from None
+
+    async def _route(self, method: str, target: str, body: bytes) -> _Response:
+        url = urlsplit(target)
+        allowed = {"/convert": "POST", "/metrics": "GET", "/health": "GET"}.get(url.path)
+        if allowed is None:
+            return _Response(HTTPStatus.NOT_FOUND, b"Not found\n")
+        if method != allowed:
+            return _Response(HTTPStatus.METHOD_NOT_ALLOWED, b"", headers={"Allow": allowed})
+        if url.path == "/health":
+            return _Response(HTTPStatus.OK, b"ok\n")
+        if url.path == "/metrics":
+            return _Response(
+                HTTPStatus.OK,
+                self.metrics.render(self.workers).encode(),
+                "text/plain; version=0.0.4; charset=utf-8",
+            )
+        name = parse_qs(url.query).get("name", ["statement"])[0]
+        return await self._convert(body, Path(name).name or "statement")
+
+    async def _convert(self, data: bytes, name: str) -> _Response:
+        assert self._loop is not None  # noqa: S101 - serve() sets it before accepting connections
+        assert self._pool is not None  # noqa: S101
+        try:
+            signature = self._signature()
+            result = await self._loop.run_in_executor(
+                self._pool,
+                convert_upload,
+                data,
+                name,
+                self.mapping_path,
+                self.cache_dir,
+                signature,
+            )
+        except Exception as e:
+            logger.exception(f"FAILED {name}")
+            return _Response(HTTPStatus.INTERNAL_SERVER_ERROR, f"{type(e).__name__}: {e}\n".encode())
+        self.metrics.conversion.merge(result.stages)
+        if result.archive is None:
+            return _Response(HTTPStatus.UNPROCESSABLE_ENTITY, f"{result.error}\n".encode())
+        return _Response(
+            HTTPStatus.OK,
+            result.archive,
+            "application/zip",
+            {
+                "Content-Disposition": f'attachment; filename="{Path(name).stem}{OUTPUT_MARKER}.zip"',
+                "X-Ynabify-Parser": result.parser or "",
+            },
+        )
+
+    @staticmethod
+    def _encode(response: _Response, *, keep_alive: bool) -> bytes:
+        status = HTTPStatus(response.status)
+        headers = {
+            "Content-Type": response.content_type,
+            "Content-Length": str(len(response.body)),
+            "Connection": "keep-alive" if keep_alive else "close",
+            **response.headers,
+        }
+        head = f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        head += "".join(f"{key}: {value}\r\n" for key, value in headers.items())
+        return (head + "\r\n").encode("latin_1") + response.body
+
+
+def _parse_head(head: bytes) -> tuple[str, str, str, dict[str, str]]:
+    """Method, target, HTTP version and lower-cased headers of a request head."""
+    request_line, *header_lines = head.decode("latin_1").rstrip("\r\n").split("\r\n")
+    try:
+        method, target, version = request_line.split(" ")
+    except ValueError:
+        raise _BadRequest(HTTPStatus.BAD_REQUEST, "Malformed request line") from None
+    headers = {}
+    for line in header_lines:
+        key, sep, value = line.partition(":")
+        if not sep:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST, "Malformed header")
+        headers[key.strip().lower()] = value.strip()
+    return method, target, version, headers
+
+
+def serve_main(argv: list[str]) -> None:
+    arg_parser = argparse.ArgumentParser(
+        prog="ynabify serve",
+        description="Convert uploaded statements over HTTP. POST a statement to /convert to get a zip of YNAB csvs.",
+    )
+    arg_parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    arg_parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on (default: %(default)s)")
+    arg_parser.add_argument("-m", "--mapping", default="./mapping.xlsx")
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="number of worker processes (default: number of CPUs)",
+    )
+    arg_parser.add_argument(
+        "--max-upload",
+        type=int,
+        default=MAX_UPLOAD_BYTES,
+        help="largest statement accepted, in bytes (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="do not use the user cache directory: always read the mapping workbook",
+    )
+    args = arg_parser.parse_args(argv)
+
+    mapping_path = Path(args.mapping)
+    if not mapping_path.exists():
+        logger.error(f"Mapping {mapping_path} not found")
+        raise SystemExit(1)
+    server = ConversionServer(
+        mapping_path,
+        None if args.no_cache else user_cache_dir(),
+        args.jobs,
+        args.max_upload,
+    )
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        logger.info("Stopped serving")
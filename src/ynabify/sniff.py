@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import csv
+import zipfile
+from dataclasses import dataclass, field
+from io import BytesIO
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+# Enough to hold the header line of any statement export we know of.
+CSV_HEADER_BYTES = 64 * 1024
+# xlsx workbooks are zip archives, which start with a local file header.
+ZIP_MAGIC = b"PK\x03\x04"
+
+
+@dataclass(frozen=True)
+class StatementBytes:
+    """A statement held in memory, e.g. an upload body. Parsers accept it wherever they accept a Path.
+
+    There is no file name to trust, so the format is told from the content: zip archives are
+    read as .xlsx, everything else as .csv. name only shows up in messages.
+    """
+
+    data: bytes = field(repr=False)
+    name: str = "<statement>"
+
+    @property
+    def suffix(self) -> str:
+        return ".xlsx" if self.data.startswith(ZIP_MAGIC) else ".csv"
+
+    def open(self, mode: str = "rb") -> BytesIO:  # noqa: ARG002 - mirrors Path.open, content is always binary
+        return BytesIO(self.data)
+
+    def __str__(self) -> str:
+        return self.name
+
+
+if TYPE_CHECKING:
+    # What parsers read from: a file, or the content of one.
+    Source = Path | StatementBytes
+
+
+def readable(path: Source) -> Path | BytesIO:
+    """What pandas and openpyxl can read: the path itself, or a fresh stream over content in memory."""
+    return path.open() if isinstance(path, StatementBytes) else path
+
+
+@dataclass(frozen=True)
+class FileHeader:
+    """The column names of a statement file, read once from its first row."""
+
+    path: Source
+    suffix: str
+    columns: tuple[str, ...]
+    # The first sheet of an xlsx workbook, if calamine loaded it to read the header; see xlsx_reader.load_sheet.
+    sheet: Any = field(default=None, repr=False, compare=False)
+
+    def take_sheet(self) -> Any:  # noqa: ANN401 - a python_calamine.CalamineSheet
+        """Return sheet and forget it, so that it is freed as soon as its rows have been read."""
+        sheet = self.sheet
+        object.__setattr__(self, "sheet", None)  # the sheet is not part of the header's value
+        return sheet
+
+
+def _read_csv_header(path: Source) -> tuple[tuple[str, ...], Any]:
+    with path.open("rb") as f:
+        first_line = f.read(CSV_HEADER_BYTES).splitlines()[:1]
+    if not first_line:
+        return (), None
+    try:
+        line = first_line[0].decode("utf_8_sig")
+    except UnicodeDecodeError:
+        line = first_line[0].decode("cp1252", errors="replace")
+    try:
+        dialect: type[csv.Dialect] = csv.Sniffer().sniff(line, delimiters=";,\t")
+    except csv.Error:
+        dialect = csv.excel
+    return tuple(next(csv.reader([line], dialect), [])), None
+
+
+def _read_xlsx_header(path: Source) -> tuple[tuple[str, ...], Any]:
+    from ynabify.xlsx_reader import first_row, load_sheet
+
+    sheet = load_sheet(path)
+    return first_row(path, sheet), sheet
+
+
+_header_readers = {
+    ".csv": _read_csv_header,
+    ".xlsx": _read_xlsx_header,
+}
+
+
+def sniff_header(path: Source) -> FileHeader | None:
+    """Read only the first row of path. Returns None if the file cannot be read as a table."""
+    suffix = path.suffix.lower()
+    reader = _header_readers.get(suffix)
+    if reader is None or (isinstance(path, Path) and not path.is_file()):
+        return None
+    try:
+        columns, sheet = reader(path)
+    except (OSError, zipfile.BadZipFile, KeyError):
+        return None
+    return FileHeader(path, suffix, columns, sheet)
@@ -0,0 +1,250 @@
+"""ynabify unmapped: report the memos no mapping entry matches, with suggestions for new entries.
+
+Unmatched memos that only differ in numbers (dates, card and reference numbers) or in case and
+spacing are grouped. Groups are ranked by how often they occur and by the total amount they move.
+For every reported group, the closest existing `from` patterns are looked up in a trigram index
+over the mapping, so the cost grows with the trigrams of the memo instead of the size of the
+mapping.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import logging
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from decimal import Decimal
+from itertools import islice
+from os.path import commonprefix
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from ynabify.merge import normalize_memo
+from ynabify.parser_base import DEFAULT_CHUNKSIZE, MAX_DECIMALS
+from ynabify.payee_matcher import load_matcher
+from ynabify.user_dirs import user_cache_dir
+from ynabify.ynabify import ConvertOptions, expand_sources, open_statement
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+
+    from ynabify.parser_base import ParserBase, TransactionBatch
+    from ynabify.payee_matcher import PayeeMatcher
+
+logger = logging.getLogger(__name__)
+
+# Words containing a digit, e.g. dates, amounts, card and reference numbers.
+_VARIABLE_WORD = re.compile(r"\S*\d\S*")
+# Characters stripped from the end of a suggested pattern.
+_PATTERN_END = " ,.;:*-/#"
+# Least share of a pattern's trigrams a memo must contain for the pattern to be suggested.
+MIN_SIMILARITY = 0.5
+DEFAULT_TOP = 50
+DEFAULT_SUGGESTIONS = 3
+
+
+def trigrams(text: str) -> set[str]:
+    """The trigrams of the normalized text, padded so that word beginnings and endings count."""
+    padded = f"  {normalize_memo(text)} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Inverted index from trigrams to the texts that contain them."""
+
+    def __init__(self, texts: Sequence[str]) -> None:
+        self._sizes: list[int] = []
+        self._postings: dict[str, list[int]] = {}
+        for i, text in enumerate(texts):
+            grams = trigrams(text)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(i)
+
+    def closest(
+        self,
+        text: str,
+        n: int = DEFAULT_SUGGESTIONS,
+        min_similarity: float = MIN_SIMILARITY,
+    ) -> list[tuple[int, float]]:
+        """The n indexed texts most of whose trigrams text contains, as (index, share of trigrams found).
+
+        Only texts sharing a trigram with text are looked at. Ties go to the longer text.
+        """
+        shared: Counter[int] = Counter()
+        for gram in trigrams(text):
+            shared.update(self._postings.get(gram, ()))
+        scored = [(count / self._sizes[i], self._sizes[i], -i) for i, count in shared.items()]
+        best = sorted((s for s in scored if s[0] >= min_similarity), reverse=True)[:n]
+        return [(-negative_index, similarity) for similarity, _, negative_index in best]
+
+
+@dataclass
+class UnmappedGroup:
+    # most frequent memo of the group
+    memo: str
+    count: int = 0
+    # sum of the absolute amounts, in minor units
+    amount: int = 0
+    variants: Counter[str] = field(default_factory=Counter)
+    # text the memos of the group share, a candidate `from` pattern
+    pattern: str = ""
+    # closest existing mapping entries as (from, to, similarity)
+    suggestions: list[tuple[str, str, float]] = field(default_factory=list)
+
+
+def group_key(memo: str) -> str:
+    """Memos with the same key are reported as one group."""
+    return normalize_memo(_VARIABLE_WORD.sub("#", memo))
+
+
+def suggested_pattern(memos: Iterable[str]) -> str:
+    """The words all memos begin with, up to the first word containing a digit."""
+    memos = list(memos)
+    n_shared = len(commonprefix([memo.lower().split() for memo in memos]))
+    end = 0
+    for word in islice(re.finditer(r"\S+", memos[0]), n_shared):
+        if _VARIABLE_WORD.fullmatch(word.group()):
+            break
+        end = word.end()
+    return memos[0][:end].rstrip(_PATTERN_END) or memos[0]
+
+
+def collect_unmapped(batches: Iterable[TransactionBatch], matcher: PayeeMatcher) -> dict[str, list[int]]:
+    """Count and total absolute amount of every distinct memo that matcher leaves without payee."""
+    import numpy as np
+
+    unmapped: dict[str, list[int]] = {}
+    for batch in batches:
+        memos = batch.memos
+        categories = [str(category) for category in memos.cat.categories]
+        codes = memos.cat.codes.to_numpy()
+        present = codes >= 0
+        amounts = np.abs(batch.frame["Inflow"].to_numpy() - batch.frame["Outflow"].to_numpy())
+        counts = np.bincount(codes[present], minlength=len(categories))
+        totals = np.bincount(codes[present], weights=amounts[present], minlength=len(categories))
+        for i, payee in enumerate(matcher.resolve(categories)):
+            if not payee and counts[i]:
+                totals_so_far = unmapped.setdefault(categories[i], [0, 0])
+                totals_so_far[0] += int(counts[i])
+                totals_so_far[1] += int(totals[i])
+    return unmapped
+
+
+def unmapped_report(
+    statements: Iterable[ParserBase],
+    matcher: PayeeMatcher,
+    top: int | None = DEFAULT_TOP,
+    n_suggestions: int = DEFAULT_SUGGESTIONS,
+) -> list[UnmappedGroup]:
+    """The top groups of unmatched memos in statements, most frequent first, then largest total amount."""
+    unmapped = collect_unmapped(
+        (
+            batch
+            for statement in statements
+            for chunk in statement.iter_batches(DEFAULT_CHUNKSIZE)
+            for batch in chunk.values()
+        ),
+        matcher,
+    )
+    groups: dict[str, UnmappedGroup] = {}
+    for memo, (count, amount) in unmapped.items():
+        group = groups.setdefault(group_key(memo), UnmappedGroup(memo))
+        group.count += count
+        group.amount += amount
+        group.variants[memo] += count
+    ranked = sorted(groups.values(), key=lambda group: (-group.count, -group.amount, group.memo))[:top]
+
+    index = TrigramIndex(matcher.text_from)
+    for group in ranked:
+        group.memo = group.variants.most_common(1)[0][0]
+        group.pattern = suggested_pattern(group.variants)
+        group.suggestions = [
+            (matcher.text_from[i], matcher.text_to[i], similarity)
+            for i, similarity in index.closest(group.memo, n_suggestions)
+        ]
+    return ranked
+
+
+def _amount_text(amount: int) -> str:
+    return str(Decimal(amount).scaleb(-MAX_DECIMALS))
+
+
+def _suggestions_text(group: UnmappedGroup) -> str:
+    return "; ".join(
+        f"{text_from} -> {text_to} ({similarity:.2f})" for text_from, text_to, similarity in group.suggestions
+    )
+
+
+def write_report(groups: list[UnmappedGroup], path: Path) -> None:
+    with path.open("w", encoding="utf_8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Count", "Amount", "Memo", "Variants", "Pattern", "Closest mapping entries"])
+        for group in groups:
+            writer.writerow(
+                [
+                    group.count,
+                    _amount_text(group.amount),
+                    group.memo,
+                    len(group.variants),
+                    group.pattern,
+                    _suggestions_text(group),
+                ],
+            )
+
+
+def log_report(groups: list[UnmappedGroup]) -> None:
+    for group in groups:
+        variants = f" ({len(group.variants)} variants)" if len(group.variants) > 1 else ""
+        logger.info(f"{group.count:>6} {_amount_text(group.amount):>12}  {group.memo}{variants}")
+        logger.info(f"{'':>20}pattern: {group.pattern}")
+        if group.suggestions:
+            logger.info(f"{'':>20}closest: {_suggestions_text(group)}")
+
+
+def unmapped_main(argv: list[str]) -> None:
+    arg_parser = argparse.ArgumentParser(
+        prog="ynabify unmapped",
+        description="List the memos no mapping entry matches, grouped and ranked, with suggested entries.",
+    )
+    arg_parser.add_argument("src", nargs="+", help="statement files, glob patterns or directories")
+    arg_parser.add_argument("-m", "--mapping", default="./mapping.xlsx")
+    arg_parser.add_argument(
+        "--top",
+        type=int,
+        default=DEFAULT_TOP,
+        help="number of groups to report (default: %(default)s)",
+    )
+    arg_parser.add_argument("-o", "--output", type=Path, default=None, help="write the report to this csv file")
+    arg_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="do not use the user cache directory: always read the mapping workbook and parse every statement",
+    )
+    args = arg_parser.parse_args(argv)
+
+    src_paths = expand_sources(args.src)
+    if not src_paths:
+        logger.error(f"No statement files found in {', '.join(args.src)}")
+        raise SystemExit(1)
+    cache_dir = None if args.no_cache else user_cache_dir()
+    options = ConvertOptions(parse_cache_dir=cache_dir)
+    matcher = load_matcher(Path(args.mapping), cache_dir)
+
+    statements = []
+    for src_path in src_paths:
+        statement = open_statement(src_path, options)
+        if statement is None:
+            logger.error(f"Cannot handle file: {src_path}")
+            raise SystemExit(1)
+        statements.append(statement)
+    groups = unmapped_report(statements, matcher, args.top)
+    matcher.save_memo_cache()
+
+    if args.output is None:
+        log_report(groups)
+    else:
+        write_report(groups, args.output)
+        logger.info(f"Wrote {len(groups)} groups of unmapped memos to {args.output}")
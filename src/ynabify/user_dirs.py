@@ -0,0 +1,27 @@
+import os
+import sys
+from pathlib import Path
+
+APP_NAME = "ynabify"
+
+
+def user_cache_dir() -> Path:
+    """Directory for data ynabify can rebuild at any time. Overridden by YNABIFY_CACHE_DIR."""
+    if override := os.environ.get("YNABIFY_CACHE_DIR"):
+        return Path(override)
+    if sys.platform == "win32":
+        return Path(os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local") / APP_NAME / "Cache"
+    if sys.platform == "darwin":
+        return Path.home() / "Library" / "Caches" / APP_NAME
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / APP_NAME
+
+
+def user_data_dir() -> Path:
+    """Directory for data ynabify cannot rebuild, such as the ledger. Overridden by YNABIFY_DATA_DIR."""
+    if override := os.environ.get("YNABIFY_DATA_DIR"):
+        return Path(override)
+    if sys.platform == "win32":
+        return Path(os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local") / APP_NAME
+    if sys.platform == "darwin":
+        return Path.home() / "Library" / "Application Support" / APP_NAME
+    return Path(os.environ.get("XDG_DATA_HOME") or Path.home() / ".local" / "share") / APP_NAME
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from ynabify.ledger import Ledger
+from ynabify.parser_registry import registered_parsers
+from ynabify.payee_matcher import PayeeMatcher, load_matcher
+from ynabify.user_dirs import user_cache_dir
+from ynabify.ynabify import (
+    OUTPUT_MARKER,
+    ConvertOptions,
+    FileResult,
+    add_conversion_arguments,
+    conversion_options,
+    convert_file,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+logger = logging.getLogger(__name__)
+
+# Sleep between scans when the file system notifies us about changes anyway. Bounds how long stopping takes.
+IDLE_TIMEOUT = 1.0
+
+# Size and modification time of a file. A download is complete once this stops changing.
+Signature = tuple[int, int]
+
+
+@dataclass
+class _Candidate:
+    signature: Signature
+    stable_since: float
+
+
+class Watcher:
+    """Converts statements that appear in a directory, keeping parsers and mapping in memory.
+
+    A file is converted once its size and modification time have not changed for settle
+    seconds, so partially written downloads are left alone. Files that are already present
+    when watching starts are not converted. Outputs that cannot be written because the
+    destination is locked are queued and retried on every scan without holding up other files.
+    With a ledger, their transactions are only recorded once the file is in place.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        mapping_path: Path,
+        options: ConvertOptions,
+        destination: Path | None = None,
+        cache_dir: Path | None = None,
+        settle: float = 0.3,
+        interval: float = 0.25,
+    ) -> None:
+        self.directory = directory
+        self.mapping_path = mapping_path
+        self.options = options
+        self.destination = destination
+        self.cache_dir = cache_dir
+        self.settle = settle
+        self.interval = interval
+
+        self._suffixes = {suffix for parser_cls in registered_parsers() for suffix in parser_cls.suffixes}
+        self._candidates: dict[Path, _Candidate] = {}
+        self._blocked: dict[Path, Path] = {}  # out_file_path -> finished .part file
+        self._matcher: PayeeMatcher | None = None
+        self._mapping_signature: Signature | None = None
+        self._done: dict[Path, Signature] = dict(self._scan())
+
+    @property
+    def matcher(self) -> PayeeMatcher:
+        """The compiled mapping, reloaded only when the mapping workbook changes."""
+        stat = self.mapping_path.stat()
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if self._matcher is None or signature != self._mapping_signature:
+            self._matcher = load_matcher(self.mapping_path, self.cache_dir)
+            self._mapping_signature = signature
+        return self._matcher
+
+    @property
+    def is_idle(self) -> bool:
+        return not self._candidates and not self._blocked
+
+    def _scan(self) -> Iterator[tuple[Path, Signature]]:
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                path = Path(entry.path)
+                if path.suffix.lower() not in self._suffixes or OUTPUT_MARKER in path.stem:
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield path, (stat.st_size, stat.st_mtime_ns)
+
+    def poll_once(self, now: float | None = None) -> list[FileResult]:
+        """Scan the directory once and convert every statement that has become stable."""
+        now = time.monotonic() if now is None else now
+        self._retry_blocked()
+
+        results = []
+        present = set()
+        for path, signature in self._scan():
+            present.add(path)
+            if self._done.get(path) == signature:
+                continue
+            candidate = self._candidates.get(path)
+            if candidate is None or candidate.signature != signature:
+                candidate = self._candidates[path] = _Candidate(signature, now)
+            if now - candidate.stable_since < self.settle:
+                continue
+            del self._candidates[path]
+            self._done[path] = signature
+            results.append(self._convert(path))
+
+        for path in self._candidates.keys() - present:
+            del self._candidates[path]
+        for path in self._done.keys() - present:
+            del self._done[path]
+        return results
+
+    def _convert(self, src_path: Path) -> FileResult:
+        out_file_base = (self.destination or src_path.parent) / (src_path.stem + OUTPUT_MARKER + src_path.suffix)
+        try:
+            outputs = convert_file(src_path, out_file_base, self.matcher, self.options, self._queue_blocked)
+        except Exception as e:  # noqa: BLE001 - one broken download must not stop the watcher
+            logger.error(f"FAILED {src_path}: {type(e).__name__}: {e}")  # noqa: TRY400
+            return FileResult(src_path, error=f"{type(e).__name__}: {e}")
+        for out_file_path in outputs:
+            self._drop_blocked(out_file_path)
+        logger.info(f"OK     {src_path} -> {', '.join(str(p) for p in outputs)}")
+        return FileResult(src_path, outputs)
+
+    def _queue_blocked(self, part_path: Path, out_file_path: Path) -> None:
+        logger.warning(f"{out_file_path} is locked, will retry")
+        self._drop_blocked(out_file_path)
+        self._blocked[out_file_path] = part_path
+
+    def _drop_blocked(self, out_file_path: Path) -> None:
+        """Forget the .part file waiting for out_file_path, which a newer conversion replaces."""
+        superseded = self._blocked.pop(out_file_path, None)
+        if superseded is not None:
+            superseded.unlink(missing_ok=True)
+            self._settle_ledger(superseded, written=False)
+
+    def _retry_blocked(self) -> None:
+        for out_file_path, part_path in list(self._blocked.items()):
+            try:
+                part_path.replace(out_file_path)
+            except PermissionError:
+                continue
+            except FileNotFoundError:
+                self._settle_ledger(part_path, written=False)
+            else:
+                logger.info(f"Wrote to {out_file_path}")
+                self._settle_ledger(part_path, written=True)
+            del self._blocked[out_file_path]
+
+    def _settle_ledger(self, part_path: Path, *, written: bool) -> None:
+        """Record the transactions held back for part_path once it is in place, or forget them."""
+        if self.options.ledger_path is None:
+            return
+        with Ledger(self.options.ledger_path) as ledger:
+            if written:
+                ledger.release(str(part_path))
+            else:
+                ledger.discard(str(part_path))
+
+    def run(self, stop: threading.Event | None = None) -> None:
+        """Watch until stop is set. Uses file system notifications if watchdog is installed, else polling."""
+        stop = stop or threading.Event()
+        wakeup = threading.Event()
+        observer = _start_observer(self.directory, wakeup)
+        try:
+            while not stop.is_set():
+                wakeup.clear()
+                self.poll_once()
+                wakeup.wait(IDLE_TIMEOUT if observer is not None and self.is_idle else self.interval)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+
+def _start_observer(directory: Path, wakeup: threading.Event) -> Any:
+    """Start a watchdog observer (inotify on Linux) that sets wakeup on every change in directory."""
+    try:
+        from watchdog.events import FileSystemEvent, FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        logger.info("watchdog is not installed, falling back to polling")
+        return None
+
+    class WakeupHandler(FileSystemEventHandler):
+        def on_any_event(self, event: FileSystemEvent) -> None:  # noqa: ARG002
+            wakeup.set()
+
+    observer = Observer()
+    observer.schedule(WakeupHandler(), str(directory))
+    observer.start()
+    return observer
+
+
+def watch_main(argv: list[str]) -> None:
+    arg_parser = argparse.ArgumentParser(
+        prog="ynabify watch",
+        description="Convert statements as soon as they appear in a directory.",
+    )
+    arg_parser.add_argument("directory")
+    arg_parser.add_argument("-d", "--destination", default=None, help="output directory (default: the watched one)")
+    add_conversion_arguments(arg_parser)
+    arg_parser.add_argument(
+        "--settle",
+        type=float,
+        default=0.3,
+        help="seconds a file must stay unchanged before it is converted",
+    )
+    arg_parser.add_argument("--interval", type=float, default=0.25, help="seconds between scans while polling")
+    args = arg_parser.parse_args(argv)
+
+    options = conversion_options(args)
+    destination = None if args.destination is None else Path(args.destination)
+    if destination is not None:
+        destination.mkdir(parents=True, exist_ok=True)
+    watcher = Watcher(
+        Path(args.directory),
+        Path(args.mapping),
+        options,
+        destination,
+        None if args.no_cache else user_cache_dir(),
+        args.settle,
+        args.interval,
+    )
+    watcher.matcher  # noqa: B018 - compile the mapping before the first download arrives
+    logger.info(f"Watching {args.directory}")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from functools import partial
+from typing import TYPE_CHECKING, TextIO
+from uuid import uuid4
+
+from ynabify.exceptions import WriteError
+from ynabify.parser_base import ParserBase, format_amounts
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+    from pathlib import Path
+
+    import numpy as np
+    import pandas as pd
+
+    from ynabify.parser_base import TransactionBatch
+
+logger = logging.getLogger(__name__)
+
+# Rows formatted and written at a time, so the text in memory stays small for large statements.
+BLOCK_ROWS = 10_000
+# pandas.DataFrame.to_csv, which wrote these files before, ends lines with os.linesep.
+LINE_END = os.linesep
+HEADER = ",".join(ParserBase.target_columns) + LINE_END
+# Accounts written at the same time. Formatting holds the GIL; the threads overlap the file I/O,
+# fsync and the retries on locked destinations with each other and with parsing.
+WRITER_THREADS = 4
+# Batches queued for writing before AccountCsvWriter.write waits for the oldest one.
+MAX_QUEUED_BATCHES = 2 * WRITER_THREADS
+
+
+def quote(text: str) -> str:
+    """Quote a field as csv.QUOTE_MINIMAL does."""
+    if "," in text or '"' in text or "\n" in text or "\r" in text:
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def _quoted_categories(column: pd.Series) -> np.ndarray:
+    """The quoted text of every category of column, followed by "" for missing values (code -1)."""
+    import numpy as np
+
+    return np.asarray([*(quote(str(category)) for category in column.cat.categories), ""], dtype=object)
+
+
+def _format_dates(dates: np.ndarray) -> np.ndarray:
+    """Render datetime64 values as YYYY-MM-DD, rendering every distinct day once."""
+    import numpy as np
+
+    days, inverse = np.unique(dates.astype("datetime64[D]"), return_inverse=True)
+    return np.where(np.isnat(days), "", np.datetime_as_string(days, unit="D"))[inverse]
+
+
+def csv_blocks(batch: TransactionBatch, block_rows: int = BLOCK_ROWS) -> Iterator[str]:
+    """Yield the csv rows of batch, without header, as text of at most block_rows rows each.
+
+    Text is built straight from the columns of the batch: payees and memos are quoted once per
+    category, dates and amounts once per distinct value within a block.
+    """
+    frame = batch.frame
+    payees, payee_codes = _quoted_categories(frame["Payee"]), frame["Payee"].cat.codes.to_numpy()
+    memos, memo_codes = _quoted_categories(frame["Memo"]), frame["Memo"].cat.codes.to_numpy()
+    dates = frame["Date"].to_numpy()
+    inflow, inflow_decimals = frame["Inflow"].to_numpy(), frame["InflowDecimals"].to_numpy()
+    outflow, outflow_decimals = frame["Outflow"].to_numpy(), frame["OutflowDecimals"].to_numpy()
+
+    for start in range(0, len(frame), block_rows):
+        rows = slice(start, start + block_rows)
+        columns = (
+            _format_dates(dates[rows]).tolist(),
+            payees[payee_codes[rows]].tolist(),
+            memos[memo_codes[rows]].tolist(),
+            format_amounts(inflow[rows], inflow_decimals[rows]).tolist(),
+            format_amounts(outflow[rows], outflow_decimals[rows]).tolist(),
+        )
+        yield LINE_END.join(map(",".join, zip(*columns, strict=True))) + LINE_END
+
+
+def csv_bytes(batch: TransactionBatch) -> bytes:
+    """The complete YNAB csv of batch, byte for byte as AccountCsvWriter writes it to disk."""
+    return "".join([HEADER, *csv_blocks(batch)]).encode("utf_8_sig")
+
+
+def retry_on_permission_error(action: Callable[[], None], path: Path, n_tries: int = 60) -> bool:
+    """Run action until it stops failing with PermissionError, e.g. because path is open in Excel."""
+    while n_tries:
+        try:
+            n_tries -= 1
+            action()
+        except PermissionError:
+            logger.error(f"Cannot write to {path}. Please close the file.")  # noqa: TRY400
+            if n_tries:
+                time.sleep(1)
+        else:
+            return True
+    return False
+
+
+@dataclass
+class _Part:
+    """The .part file of one account and the last write queued for it."""
+
+    path: Path
+    handle: TextIO
+    name: str
+    # "YYYY-MM" when the account is written to one file per month
+    month: str | None = None
+    pending: Future[None] | None = None
+    error: Exception | None = None
+
+
+class AccountCsvWriter:
+    """Appends transaction chunks to one YNAB csv per account.
+
+    Rows are written to temporary .part files next to the destination. close() syncs them to disk
+    and renames them into place, so a crash never leaves a truncated csv behind; only then is it
+    known whether the statement held one account (out_file_base.csv) or several
+    (out_file_base_<account name>.csv). Accounts written by month get the month appended, e.g.
+    out_file_base_2024-11.csv.
+
+    Accounts are written on up to WRITER_THREADS threads while the caller goes on parsing, and
+    closed concurrently, so an account whose file is locked only delays its own output. Chunks of
+    one account are written in order. Errors are collected per account, see close. After close,
+    written lists the (account, month) of every file that was moved into place, and blocked the
+    .part file handed to on_blocked for each (account, month) whose destination was locked.
+    """
+
+    def __init__(self, out_file_base: Path, on_blocked: Callable[[Path, Path], None] | None = None) -> None:
+        """If on_blocked is given, a destination that is locked is not retried but handed to
+        on_blocked(part_path, out_file_path) together with its finished .part file.
+        """
+        self.out_file_base = out_file_base
+        self.on_blocked = on_blocked
+        self._parts: dict[tuple[str, str | None], _Part] = {}
+        self._pool = ThreadPoolExecutor(WRITER_THREADS, thread_name_prefix="ynabify-writer")
+        self._in_flight: deque[Future[None]] = deque()
+        self.written: list[tuple[str, str | None]] = []
+        self.blocked: dict[tuple[str, str | None], Path] = {}
+
+    def write(self, account: str, name: str, batch: TransactionBatch, month: str | None = None) -> None:
+        """Queue batch, with resolved payees, to be appended to the file of account, or of its month."""
+        part = self._parts.get((account, month))
+        if part is None:
+            # Unique, so that a .part file still waiting for its locked destination is never reused.
+            part_path = self.out_file_base.with_name(f"{self.out_file_base.stem}.{uuid4().hex}.csv.part")
+            part = _Part(part_path, part_path.open("x", encoding="utf_8_sig", newline=""), name, month)
+            part.handle.write(HEADER)
+            self._parts[account, month] = part
+        part.pending = self._pool.submit(self._append, part, part.pending, batch)
+        self._in_flight.append(part.pending)
+        # Bound the number of batches held in memory when writing falls behind parsing.
+        while len(self._in_flight) > MAX_QUEUED_BATCHES:
+            self._in_flight.popleft().result()
+
+    @staticmethod
+    def _append(part: _Part, previous: Future[None] | None, batch: TransactionBatch) -> None:
+        # The previous write of the account was queued earlier, so it is running or done by now.
+        if previous is not None:
+            previous.result()
+        if part.error is not None:
+            return
+        try:
+            for block in csv_blocks(batch):
+                part.handle.write(block)
+        except Exception as e:  # noqa: BLE001 - reported per account by close
+            part.error = e
+
+    def _finish(self, part: _Part, out_file_path: Path) -> bool:
+        """Sync and rename the file of one account; False if the destination stayed locked."""
+        if part.pending is not None:
+            part.pending.result()
+        if part.error is not None:
+            raise part.error
+        part.handle.flush()
+        os.fsync(part.handle.fileno())
+        part.handle.close()
+        n_tries = 1 if self.on_blocked is not None else 60
+        return retry_on_permission_error(partial(os.replace, part.path, out_file_path), out_file_path, n_tries)
+
+    def _out_file_path(self, part: _Part, n_accounts: int) -> Path:
+        suffix = f"_{part.name}" if n_accounts > 1 else ""
+        if part.month is not None:
+            suffix += f"_{part.month}"
+        if suffix:
+            return self.out_file_base.with_name(self.out_file_base.stem + suffix).with_suffix(".csv")
+        return self.out_file_base.with_suffix(".csv")
+
+    def close(self) -> list[Path]:
+        """Move the finished files into place and return their paths.
+
+        Raises WriteError once every account is done if the file of any account cannot be written,
+        including a destination that stays locked when there is no on_blocked.
+        """
+        n_accounts = len({account for account, _ in self._parts})
+        targets = {key: self._out_file_path(part, n_accounts) for key, part in self._parts.items()}
+        finishing = {key: self._pool.submit(self._finish, part, targets[key]) for key, part in self._parts.items()}
+        outputs = []
+        errors: dict[str, Exception] = {}
+        for (account, month), future in finishing.items():
+            part, out_file_path = self._parts[account, month], targets[account, month]
+            try:
+                replaced = future.result()
+            except Exception as e:  # noqa: BLE001 - collected and raised together below
+                part.handle.close()
+                part.path.unlink(missing_ok=True)
+                errors[account if month is None else f"{account} {month}"] = e
+                continue
+            if replaced:
+                logger.info(f"Wrote to {out_file_path}")
+                outputs.append(out_file_path)
+                self.written.append((account, month))
+            elif self.on_blocked is not None:
+                self.blocked[account, month] = part.path
+                self.on_blocked(part.path, out_file_path)
+            else:
+                part.path.unlink(missing_ok=True)
+                errors[account if month is None else f"{account} {month}"] = PermissionError(
+                    f"{out_file_path} stayed locked"
+                )
+        self._shutdown()
+        if errors:
+            raise WriteError(errors, outputs)
+        return outputs
+
+    def abort(self) -> None:
+        """Discard everything written so far."""
+        for part in self._parts.values():
+            if part.pending is not None:
+                wait([part.pending])
+            part.handle.close()
+            part.path.unlink(missing_ok=True)
+        self._shutdown()
+
+    def _shutdown(self) -> None:
+        self._parts.clear()
+        self._in_flight.clear()
+        self._pool.shutdown()
@@ -0,0 +1,238 @@
+"""Reading the first sheet of xlsx workbooks.
+
+Rows come from python-calamine if it is installed, which parses workbooks in Rust, and from
+openpyxl in read-only mode otherwise, or whenever calamine cannot read a workbook. Setting the
+environment variable YNABIFY_XLSX_BACKEND to "openpyxl" skips calamine.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import warnings
+from contextlib import closing
+from datetime import date, datetime, time
+from functools import cache
+from itertools import filterfalse, islice
+from operator import itemgetter
+from typing import TYPE_CHECKING, Any
+
+from ynabify.parser_base import RangeEnd
+from ynabify.sniff import StatementBytes, readable
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Generator, Iterator, Sequence
+    from types import ModuleType
+
+    import pandas as pd
+
+    from ynabify.parser_base import TransactionFilter
+    from ynabify.sniff import FileHeader, Source
+
+logger = logging.getLogger(__name__)
+
+BACKEND_ENV_VAR = "YNABIFY_XLSX_BACKEND"
+
+
+@cache
+def _calamine() -> ModuleType | None:
+    try:
+        import python_calamine
+    except ImportError:
+        return None
+    return python_calamine
+
+
+def load_sheet(path: Source) -> Any:  # noqa: ANN401 - a python_calamine.CalamineSheet
+    """The first sheet of path as loaded by calamine, or None if calamine is not used or cannot read it.
+
+    Pass it to the readers below to read the rows again without loading the workbook again.
+    """
+    calamine = None if os.environ.get(BACKEND_ENV_VAR) == "openpyxl" else _calamine()
+    if calamine is None:
+        return None
+    try:
+        if isinstance(path, StatementBytes):
+            workbook = calamine.CalamineWorkbook.from_filelike(path.open())
+        else:
+            workbook = calamine.CalamineWorkbook.from_path(str(path))
+        try:
+            return workbook.get_sheet_by_index(0) if workbook.sheet_names else None
+        finally:
+            workbook.close()
+    except calamine.CalamineError as e:
+        logger.debug(f"calamine cannot read {path}, falling back to openpyxl: {e}")
+        return None
+
+
+def _openpyxl_rows(path: Source) -> Iterator[tuple[Any, ...]]:
+    import openpyxl
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        workbook = openpyxl.load_workbook(readable(path), read_only=True, data_only=True)
+    try:
+        if workbook.worksheets:
+            yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def sheet_rows(path: Source, sheet: Any = None) -> Generator[Sequence[Any], None, None]:  # noqa: ANN401
+    """Yield the rows of the first sheet of path as raw cell values, header row first.
+
+    sheet is what load_sheet returned for path, if it was called before. Empty cells are None or
+    "", calamine reports whole numbers as float and dates as date; cell_value evens this out.
+    """
+    if sheet is None:
+        sheet = load_sheet(path)
+    if sheet is None:
+        yield from _openpyxl_rows(path)
+    else:
+        # The rows share the cells of the sheet; without the sheet they are freed once read.
+        rows = sheet.iter_rows()
+        del sheet
+        yield from rows
+
+
+def first_row(path: Source, sheet: Any = None) -> tuple[str, ...]:  # noqa: ANN401
+    """The header row of the first sheet, with empty cells as ""."""
+    with closing(sheet_rows(path, sheet)) as rows:
+        header = next(rows, ())
+    return tuple(cell_text(value) or "" for value in header)
+
+
+def cell_value(value: Any) -> Any:  # noqa: ANN401 - cells hold whatever the workbook holds
+    """A cell value as pandas.read_excel reports it: empty cells as None, whole numbers as int, dates as datetime."""
+    if isinstance(value, str):
+        return value or None
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime.combine(value, time())
+    return value
+
+
+def cell_text(value: Any) -> str | None:  # noqa: ANN401 - cells hold whatever the workbook holds
+    """A cell value as pandas.read_excel(dtype=str) reports it, e.g. "12.5" or "2024-11-23 00:00:00"."""
+    if isinstance(value, str):
+        return value or None
+    value = cell_value(value)
+    return None if value is None else str(value)
+
+
+def cell_date(value: Any) -> date | None:  # noqa: ANN401 - cells hold whatever the workbook holds
+    """The date in a cell: a date cell, or text starting with an ISO date or in the form 23.11.2024."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        try:
+            return date.fromisoformat(value[:10])
+        except ValueError:
+            pass
+        try:
+            return datetime.strptime(value, "%d.%m.%Y").date()  # noqa: DTZ007 - a calendar date, no time
+        except ValueError:
+            return None
+    return None
+
+
+def date_range_skip(selection: TransactionFilter | None, column: int = 0) -> Callable[[tuple[Any, ...]], bool] | None:
+    """A skip for read_xlsx that leaves out the rows past the end of the date range while the dates in column are sorted.
+
+    The rows are left out before their cells are converted. Reading does not stop there, since a
+    later row may break the order and be in range after all.
+    """
+    if selection is None or not selection.has_dates:
+        return None
+    range_end = RangeEnd(selection)
+    return lambda row: range_end(cell_date(row[column]))
+
+
+def _picker(indices: list[int]) -> Callable[[Sequence[Any]], tuple[Any, ...]]:
+    """Like itemgetter(*indices), but returns a tuple for a single index too."""
+    if len(indices) == 1:
+        index = indices[0]
+        return lambda row: (row[index],)
+    return itemgetter(*indices)
+
+
+def read_xlsx(
+    path: Source,
+    columns: Sequence[str],
+    *,
+    as_text: bool = False,
+    skip: Callable[[tuple[Any, ...]], bool] | None = None,
+    header: FileHeader | None = None,
+) -> pd.DataFrame:
+    """Read the given columns of the first sheet, like pandas.read_excel(path, usecols=columns).
+
+    Only the cells of those columns are converted. With as_text, every value is read as text, like
+    dtype=str. Blank rows at the end of the sheet are dropped. Rows for which skip, called with
+    the raw cells of the columns, returns True are left out unconverted. header is what
+    sniff_header returned for path, if it was called before; its sheet is taken and read.
+    Raises KeyError for missing columns.
+    """
+    return next(iter_xlsx(path, columns, None, as_text=as_text, skip=skip, header=header))
+
+
+def iter_xlsx(
+    path: Source,
+    columns: Sequence[str],
+    chunksize: int | None,
+    *,
+    as_text: bool = False,
+    skip: Callable[[tuple[Any, ...]], bool] | None = None,
+    header: FileHeader | None = None,
+) -> Iterator[pd.DataFrame]:
+    """Like read_xlsx, but yield frames of about chunksize rows, converted as they are needed.
+
+    openpyxl reads the rows from the file chunk by chunk. calamine has loaded the whole sheet
+    already; its cells are picked at once, so that the sheet is freed before they are converted.
+    Blank rows at the end of a frame are held back for the next one, so that they can be dropped
+    if the sheet ends with them. At least one frame is yielded, if need be an empty one;
+    chunksize None yields everything as one frame.
+    """
+    import pandas as pd
+
+    convert: Callable[[Any], Any] = cell_text if as_text else cell_value
+    sheet = header.take_sheet() if header is not None else None
+    if sheet is None:
+        sheet = load_sheet(path)
+    in_memory = sheet is not None
+    with closing(sheet_rows(path, sheet)) as rows:
+        del sheet
+        names = [cell_text(value) for value in next(rows, ())]
+        missing = [column for column in columns if column not in names]
+        if missing:
+            raise KeyError(missing[0])
+        indices = [names.index(column) for column in columns]
+        width = max(indices) + 1
+        pick = _picker(indices)
+        padded = (row if len(row) >= width else (*row, *[None] * (width - len(row))) for row in rows)
+        picked: Iterator[tuple[Any, ...]] = map(pick, padded) if skip is None else filterfalse(skip, map(pick, padded))
+        if in_memory:
+            picked = iter(list(picked))
+            rows.close()
+
+        held: list[tuple[Any, ...]] = []
+        n_yielded = 0
+        while True:
+            read = list(picked if chunksize is None else islice(picked, chunksize))
+            chunk = held + read if held else read
+            values = [[convert(value) for value in column] for column in zip(*chunk, strict=True)]
+            values = values or [[] for _ in columns]
+            n_rows = len(chunk)
+            while n_rows and all(column[n_rows - 1] is None for column in values):
+                n_rows -= 1
+            is_last = chunksize is None or len(read) < chunksize
+            if n_rows or (is_last and not n_yielded):
+                yield pd.DataFrame({column: v[:n_rows] for column, v in zip(columns, values, strict=True)})
+                n_yielded += 1
+            if is_last:
+                return
+            held = chunk[n_rows:]
@@ -0,0 +1,216 @@
+"""Export transactions through the YNAB API, or a service speaking its format, instead of csv files.
+
+Transactions are posted in batches to {base_url}/budgets/{budget_id}/transactions, over one
+keep-alive connection per process. Amounts are sent in milliunits. Every transaction carries an
+import_id derived from its ledger fingerprint, so YNAB ignores it when it is sent again, e.g. by a
+retry after a lost response or a second run over the same statement.
+"""
+
+from __future__ import annotations
+
+import http.client
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+
+from ynabify.exceptions import ExportError
+from ynabify.parser_base import MINOR_UNITS
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from ynabify.parser_base import TransactionBatch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://api.ynab.com/v1"
+TOKEN_ENV_VAR = "YNAB_ACCESS_TOKEN"  # noqa: S105 - name of the variable, not the token
+DEFAULT_BATCH_SIZE = 500
+MAX_RETRIES = 5
+# Seconds before the first retry; doubles with every further one.
+RETRY_BACKOFF = 0.5
+# Longest wait a Retry-After header may ask for, in seconds.
+MAX_RETRY_AFTER = 60.0
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+MILLIUNITS = 1000
+# Field limits of the YNAB API.
+IMPORT_ID_PREFIX = "ynabify:"
+IMPORT_ID_LENGTH = 36
+PAYEE_NAME_LENGTH = 200
+MEMO_LENGTH = 500
+
+
+@dataclass(frozen=True)
+class ExportOptions:
+    budget_id: str
+    base_url: str = DEFAULT_BASE_URL
+    # Personal access token, sent as bearer token; None sends no Authorization header.
+    token: str | None = None
+    # YNAB account id by account name (as the mapping names it) or account number; unlisted accounts use their name.
+    account_ids: dict[str, str] = field(default_factory=dict)
+    batch_size: int = DEFAULT_BATCH_SIZE
+
+
+def import_id(fingerprint: str) -> str:
+    return (IMPORT_ID_PREFIX + fingerprint)[:IMPORT_ID_LENGTH]
+
+
+def transactions(account_id: str, batch: TransactionBatch, fingerprints: list[str]) -> list[dict[str, object]]:
+    """The transactions of batch as YNAB API transactions; fingerprints are their ledger fingerprints."""
+    import numpy as np
+
+    frame = batch.frame
+    dates = np.datetime_as_string(frame["Date"].to_numpy().astype("datetime64[D]")).tolist()
+    cents = frame["Inflow"].to_numpy() - frame["Outflow"].to_numpy()
+    amounts = (cents * (MILLIUNITS // MINOR_UNITS)).tolist()
+    return [
+        {
+            "account_id": account_id,
+            "date": date,
+            "amount": amount,
+            "payee_name": payee[:PAYEE_NAME_LENGTH] or None,
+            "memo": memo[:MEMO_LENGTH] or None,
+            "cleared": "cleared",
+            "approved": False,
+            "import_id": import_id(fingerprint),
+        }
+        for date, amount, payee, memo, fingerprint in zip(
+            dates,
+            amounts,
+            batch.texts("Payee"),
+            batch.texts("Memo"),
+            fingerprints,
+            strict=True,
+        )
+    ]
+
+
+class YnabClient:
+    """JSON requests to base_url over one keep-alive connection, retried with exponential backoff.
+
+    Connection errors, 429 and 5xx responses are retried up to max_retries times; other error
+    responses raise ExportError at once.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        token: str | None = None,
+        max_retries: int = MAX_RETRIES,
+        backoff: float = RETRY_BACKOFF,
+        timeout: float = 60.0,
+    ) -> None:
+        url = urlsplit(base_url)
+        if url.scheme not in ("http", "https"):
+            msg = f"Unsupported API url {base_url}"
+            raise ValueError(msg)
+        self._connection_cls = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self._host = url.netloc
+        self._path = url.path.rstrip("/")
+        self._headers = {"Content-Type": "application/json", "Accept": "application/json"}
+        if token is not None:
+            self._headers["Authorization"] = f"Bearer {token}"
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._connection: http.client.HTTPConnection | None = None
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def post(self, path: str, payload: object) -> dict:
+        """Post payload as JSON to path below the base url and return the decoded response."""
+        body = json.dumps(payload, ensure_ascii=False).encode("utf_8")
+        for attempt in range(self.max_retries + 1):
+            delay = self.backoff * 2**attempt
+            try:
+                status, retry_after, data = self._request("POST", self._path + path, body)
+            except (OSError, http.client.HTTPException) as e:
+                self.close()
+                error = f"{type(e).__name__}: {e}"
+            else:
+                if status < 300:  # noqa: PLR2004 - any success status
+                    return json.loads(data) if data else {}
+                error = f"HTTP {status}: {data[:500].decode('utf_8', errors='replace')}"
+                if status not in RETRY_STATUSES:
+                    raise ExportError(error)
+                if retry_after is not None:
+                    delay = max(delay, min(retry_after, MAX_RETRY_AFTER))
+            if attempt < self.max_retries:
+                logger.warning(f"POST {path} failed with {error}, retrying in {delay:.1f} s")
+                time.sleep(delay)
+        msg = f"POST {path} failed {self.max_retries + 1} times, last with {error}"
+        raise ExportError(msg)
+
+    def _request(self, method: str, path: str, body: bytes) -> tuple[int, float | None, bytes]:
+        if self._connection is None:
+            self._connection = self._connection_cls(self._host, timeout=self.timeout)
+        self._connection.request(method, path, body, self._headers)
+        response = self._connection.getresponse()
+        data = response.read()
+        if response.will_close:
+            self.close()
+        retry_after = response.getheader("Retry-After")
+        return response.status, float(retry_after) if retry_after and retry_after.isdigit() else None, data
+
+
+# One client per base url and token and process, so all statements of a run share its connection.
+_clients: dict[tuple[str, str | None], YnabClient] = {}
+
+
+def shared_client(options: ExportOptions) -> YnabClient:
+    key = (options.base_url, options.token)
+    if key not in _clients:
+        _clients[key] = YnabClient(options.base_url, options.token)
+    return _clients[key]
+
+
+class YnabApiWriter:
+    """Sends the transactions of a statement to a budget in batches of options.batch_size.
+
+    Used in place of AccountCsvWriter; write also takes the ledger fingerprints of the
+    transactions, from which their import ids are derived.
+    """
+
+    def __init__(self, options: ExportOptions, client: YnabClient | None = None) -> None:
+        self.options = options
+        self._client = shared_client(options) if client is None else client
+        self._pending: list[dict[str, object]] = []
+        self.sent = 0
+        self.duplicates = 0
+        self._accounts: dict[str, None] = {}
+        # (account, None) of every account once close has sent all of its transactions, like AccountCsvWriter.written
+        self.written: list[tuple[str, str | None]] = []
+
+    def write(self, account: str, name: str, batch: TransactionBatch, fingerprints: list[str]) -> None:
+        account_id = self.options.account_ids.get(name) or self.options.account_ids.get(account, name)
+        self._accounts.setdefault(account, None)
+        self._pending.extend(transactions(account_id, batch, fingerprints))
+        while len(self._pending) >= self.options.batch_size:
+            self._send(self._pending[: self.options.batch_size])
+            del self._pending[: self.options.batch_size]
+
+    def _send(self, batch: list[dict[str, object]]) -> None:
+        response = self._client.post(f"/budgets/{self.options.budget_id}/transactions", {"transactions": batch})
+        self.sent += len(batch)
+        self.duplicates += len(response.get("data", {}).get("duplicate_import_ids", []))
+
+    def close(self) -> list[Path]:
+        """Send the remaining transactions. Nothing is written to disk, so there are no output files."""
+        if self._pending:
+            self._send(self._pending)
+            self._pending = []
+        self.written = [(account, None) for account in self._accounts]
+        logger.info(
+            f"Sent {self.sent} transactions to budget {self.options.budget_id}, "
+            f"{self.duplicates} of them were imported before"
+        )
+        return []
+
+    def abort(self) -> None:
+        self._pending = []
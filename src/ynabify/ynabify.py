@@ -1,23 +1,71 @@
+from __future__ import annotations
+
 import argparse
+import glob
+import json
 import logging
 import operator
+import os
 import shutil
-import time
-import warnings
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date
+from itertools import compress
 from pathlib import Path
 from typing import TYPE_CHECKING
 
-import pandas as pd
+from ynabify.exceptions import ParseError, WriteError
+from ynabify.ledger import Ledger, fingerprints
+from ynabify.merge import merge_statements
+from ynabify.metrics import Metrics, Progress, StageMetrics
+from ynabify.parse_cache import ParseCache
+from ynabify.parser_base import DEFAULT_CHUNKSIZE, TransactionFilter
+from ynabify.parser_registry import open_parser, registered_parsers
+from ynabify.payee_matcher import PayeeMatcher, load_matcher
+from ynabify.user_dirs import user_cache_dir, user_data_dir
+from ynabify.writer import AccountCsvWriter
+from ynabify.ynab_api import DEFAULT_BASE_URL, DEFAULT_BATCH_SIZE, TOKEN_ENV_VAR, ExportOptions, YnabApiWriter
 
 if TYPE_CHECKING:
-    from ynabify.parser_base import ParserBase
+    from collections.abc import Callable, Iterator
 
-from ynabify.parser.raiffeisen_csv import RaiffeisenCsv
-from ynabify.parser.swisscard_xlsx import SwisscardXlsx
-from ynabify.parser.ynab_xlsx import YnabXlsx
+    from ynabify.parser_base import ParserBase, TransactionBatch
 
 logger = logging.getLogger(__name__)
 
+# Output files carry this marker in their name, directory mode skips them.
+OUTPUT_MARKER = "_ynab"
+
+# Per-process state of the batch workers, filled once by _init_worker.
+_worker_state: dict[str, PayeeMatcher] = {}
+
+
+@dataclass(frozen=True)
+class ConvertOptions:
+    # Stream the statement in chunks of this many rows; None reads it at once.
+    chunksize: int | None = DEFAULT_CHUNKSIZE
+    # SQLite ledger of exported transactions, see ynabify.ledger.
+    ledger_path: Path | None = None
+    # Only write transactions that are not in the ledger yet.
+    incremental: bool = False
+    # Keep parsed statements in this directory, so converting them again skips parsing; see ynabify.parse_cache.
+    parse_cache_dir: Path | None = None
+    # Send the transactions to a budget through the YNAB API instead of writing csv files; see ynabify.ynab_api.
+    export: ExportOptions | None = None
+    # Only convert the transactions of these dates and accounts; parsers apply it while reading.
+    selection: TransactionFilter | None = None
+    # Write one csv per account and month.
+    split_months: bool = False
+
+
+@dataclass
+class FileResult:
+    src_path: Path
+    outputs: list[Path] = field(default_factory=list)
+    error: str | None = None
+    stages: dict[str, StageMetrics] = field(default_factory=dict)
+
 
 def replace_text(string: str, text_from: list[str], text_to: list[str]) -> str:
     """If string contains one or more substrings from text_from, return the
@@ -34,62 +82,528 @@ def replace_text(string: str, text_from: list[str], text_to: list[str]) -> str:
     return sorted(candidates, reverse=True, key=operator.itemgetter(0))[0][1]
 
 
-def main(argv: list[str] | None = None) -> None:
-    logging.basicConfig(level=logging.DEBUG)
+def expand_sources(sources: list[str]) -> list[Path]:
+    """Resolve files, glob patterns and directories into the list of statement files to convert."""
+    suffixes = {suffix for parser_cls in registered_parsers() for suffix in parser_cls.suffixes}
+    paths: list[Path] = []
+    for source in sources:
+        path = Path(source)
+        if path.is_dir():
+            paths.extend(
+                sorted(
+                    p
+                    for p in path.iterdir()
+                    if p.is_file() and p.suffix.lower() in suffixes and OUTPUT_MARKER not in p.stem
+                ),
+            )
+        elif not path.exists() and glob.has_magic(source):
+            paths.extend(sorted(Path(p) for p in glob.glob(source, recursive=True) if Path(p).is_file()))
+        else:
+            paths.append(path)
 
-    arg_parser = argparse.ArgumentParser()
-    arg_parser.add_argument("src")
-    arg_parser.add_argument("-m", "--mapping", nargs="?", default="./mapping.xlsx")
-    arg_parser.add_argument("-d", "--destination", nargs="?", default=None)
-    args = arg_parser.parse_args() if argv is None else arg_parser.parse_args(argv)
-    src_path = Path(args.src).resolve()
-
-    file_parser: ParserBase | None = None
-    if SwisscardXlsx.can_parse(src_path):
-        file_parser = SwisscardXlsx(src_path)
-    elif RaiffeisenCsv.can_parse(src_path):
-        file_parser = RaiffeisenCsv(src_path)
-    elif YnabXlsx.can_parse(src_path):
-        file_parser = YnabXlsx(src_path)
+    unique_paths: dict[Path, None] = {}
+    for path in paths:
+        unique_paths.setdefault(path.resolve(), None)
+    return list(unique_paths)
+
+
+def convert_file(
+    src_path: Path,
+    out_file_base: Path,
+    matcher: PayeeMatcher,
+    options: ConvertOptions,
+    on_blocked: Callable[[Path, Path], None] | None = None,
+    metrics: Metrics | None = None,
+) -> list[Path]:
+    """Convert one statement file into one YNAB csv per account and return the written paths."""
+    file_parser = open_statement(src_path, options, metrics)
+    if file_parser is None:
+        raise ParseError(str(src_path))
+    return write_transactions(file_parser, out_file_base, matcher, options, on_blocked, metrics)
+
+
+def open_statement(src_path: Path, options: ConvertOptions, metrics: Metrics | None = None) -> ParserBase | None:
+    """Like open_parser, but through the parse cache if options has one."""
+    if options.parse_cache_dir is None:
+        return open_parser(src_path, metrics, options.selection)
+    return ParseCache(options.parse_cache_dir).open(src_path, metrics, options.selection)
+
+
+def _chunks(file_parser: ParserBase, chunksize: int | None) -> Iterator[dict[str, TransactionBatch]]:
+    if chunksize is None:
+        yield file_parser.get_batches()
     else:
-        logger.error(f"Cannot handle file: {src_path}")
-        raise SystemExit(1)
+        yield from file_parser.iter_batches(chunksize)
+
+
+def _row_count(batches: dict[str, TransactionBatch]) -> int:
+    return sum(len(batch) for batch in batches.values())
+
+
+def write_transactions(
+    file_parser: ParserBase,
+    out_file_base: Path,
+    matcher: PayeeMatcher,
+    options: ConvertOptions,
+    on_blocked: Callable[[Path, Path], None] | None = None,
+    metrics: Metrics | None = None,
+) -> list[Path]:
+    """Resolve payees and write the transactions of file_parser.
+
+    With a ledger, every written transaction is recorded, and in incremental mode the ones
+    already recorded by an earlier run are left out. Only the transactions of files that were
+    moved into place are recorded; those of files handed to on_blocked are held back in the
+    ledger under the path of their .part file, see Ledger.release. See AccountCsvWriter for
+    on_blocked.
+    """
+    metrics = Metrics() if metrics is None else metrics
+    chunks = metrics.iterate("parse", _chunks(file_parser, options.chunksize), _row_count)
+    progress = Progress(f"Writing {out_file_base.name}")
+    ledger = None if options.ledger_path is None else Ledger(options.ledger_path)
+    occurrences: Counter[str] = Counter()
+    ledger_accounts: dict[str, str] = {}
+    writer: AccountCsvWriter | YnabApiWriter = (
+        AccountCsvWriter(out_file_base, on_blocked) if options.export is None else YnabApiWriter(options.export)
+    )
+    try:
+        for batches in chunks:
+            for account, batch in batches.items():
+                ids: list[str] = []
+                # The API export derives import ids from the fingerprints, counted before incremental filtering.
+                if ledger is not None or options.export is not None:
+                    with metrics.stage("ledger") as stage:
+                        ledger_account = ledger_accounts.setdefault(
+                            account, f"{file_parser.parser_name(account)}/{file_parser.account_id(account)}"
+                        )
+                        ids = fingerprints(ledger_account, batch, occurrences)
+                        if ledger is not None and options.incremental:
+                            is_new = ~ledger.known(ledger_account, batch, ids)
+                            batch = batch.filter(is_new)  # noqa: PLW2901
+                            ids = list(compress(ids, is_new))
+                        if ledger is not None:
+                            ledger.record(ledger_account, batch, ids)
+                        stage.add_rows(len(ids))
+                with metrics.stage("payees") as stage:
+                    batch.resolve_payees(matcher.resolve)
+                    name = matcher.match(account) or account
+                    stage.add_rows(len(batch))
+                with metrics.stage("write") as stage:
+                    if isinstance(writer, YnabApiWriter):
+                        writer.write(account, name, batch, ids)
+                    elif options.split_months:
+                        for month, month_batch in batch.by_month().items():
+                            writer.write(account, name, month_batch, month)
+                    else:
+                        writer.write(account, name, batch)
+                    stage.add_rows(len(batch))
+                progress.update(len(batch))
+        with metrics.stage("write"):
+            try:
+                outputs = writer.close()
+            finally:
+                # Also when other accounts failed: the files in place are exported either way.
+                if ledger is not None:
+                    blocked = writer.blocked if isinstance(writer, AccountCsvWriter) else {}
+                    ledger.commit(
+                        ((ledger_accounts[account], month) for account, month in writer.written),
+                        ((ledger_accounts[account], month, str(part)) for (account, month), part in blocked.items()),
+                    )
+        with metrics.stage("payees"):
+            matcher.save_memo_cache()
+    except BaseException:
+        writer.abort()
+        if ledger is not None:
+            ledger.rollback()
+        raise
+    finally:
+        if ledger is not None:
+            ledger.close()
+    return outputs
+
+
+def merge_files(
+    src_paths: list[Path],
+    out_file_base: Path,
+    matcher: PayeeMatcher,
+    options: ConvertOptions,
+    metrics: Metrics | None = None,
+) -> list[Path]:
+    """Convert overlapping statements into one csv per account, leaving out the transactions they share.
+
+    See ynabify.merge.merge_batches. Raises ParseError for a file no parser accepts.
+    """
+    statements = []
+    for src_path in src_paths:
+        file_parser = open_statement(src_path, options, metrics)
+        if file_parser is None:
+            raise ParseError(str(src_path))
+        statements.append(file_parser)
+    return write_transactions(merge_statements(statements, metrics), out_file_base, matcher, options, metrics=metrics)
+
+
+def _init_worker(mapping_path: Path, cache_dir: Path | None) -> None:
+    logging.basicConfig(level=logging.INFO)
+    _worker_state["matcher"] = load_matcher(mapping_path, cache_dir)
+
+
+def _convert_in_worker(
+    src_path: Path,
+    out_file_base: Path,
+    options: ConvertOptions,
+    *,
+    trace_memory: bool = False,
+) -> FileResult:
+    metrics = Metrics(trace_memory=trace_memory)
+    try:
+        outputs = convert_file(src_path, out_file_base, _worker_state["matcher"], options, metrics=metrics)
+    except Exception as e:  # noqa: BLE001 - reported per file in the summary
+        return FileResult(src_path, error=f"{type(e).__name__}: {e}", stages=metrics.stages)
+    finally:
+        metrics.close()
+    return FileResult(src_path, outputs, stages=metrics.stages)
+
+
+def convert_files(
+    src_paths: list[Path],
+    destination: Path | None,
+    mapping_path: Path,
+    options: ConvertOptions,
+    jobs: int | None = None,
+    cache_dir: Path | None = None,
+    *,
+    trace_memory: bool = False,
+) -> list[FileResult]:
+    """Convert several statement files in a process pool. Every worker loads the mapping once.
+
+    Every result carries the metrics of its file; with trace_memory they include peak memory.
+    Raises ValueError before converting anything if several files would be written to the same output.
+    """
+    tasks = {
+        src_path: (destination or src_path.parent) / (src_path.stem + OUTPUT_MARKER + src_path.suffix)
+        for src_path in src_paths
+    }
+    sources_by_output: dict[Path, list[Path]] = {}
+    for src_path, out_file_base in tasks.items():
+        sources_by_output.setdefault(out_file_base, []).append(src_path)
+    collisions = [
+        f"{', '.join(map(str, sources))} -> {out_file_base.name}"
+        for out_file_base, sources in sources_by_output.items()
+        if len(sources) > 1
+    ]
+    if collisions:
+        msg = f"Several statements would be written to the same output: {'; '.join(collisions)}"
+        raise ValueError(msg)
+    if destination is not None:
+        destination.mkdir(parents=True, exist_ok=True)
+    max_workers = min(jobs or os.cpu_count() or 1, len(tasks))
 
+    if max_workers <= 1:
+        _init_worker(mapping_path, cache_dir)
+        return [_convert_in_worker(*task, options, trace_memory=trace_memory) for task in tasks.items()]
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    results = {}
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(mapping_path, cache_dir)) as executor:
+        futures = [
+            executor.submit(_convert_in_worker, *task, options, trace_memory=trace_memory) for task in tasks.items()
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result.src_path] = result
+    return [results[src_path] for src_path in tasks]
+
+
+def log_summary(results: list[FileResult]) -> None:
+    for result in results:
+        if result.error is None:
+            logger.info(f"OK     {result.src_path} -> {', '.join(str(p) for p in result.outputs)}")
+        else:
+            logger.error(f"FAILED {result.src_path}: {result.error}")
+    n_ok = sum(result.error is None for result in results)
+    logger.info(f"Converted {n_ok} of {len(results)} files")
+
+
+def add_conversion_arguments(arg_parser: argparse.ArgumentParser) -> None:
+    """Options shared by the one-shot conversion and the watch mode."""
+    arg_parser.add_argument("-m", "--mapping", nargs="?", default="./mapping.xlsx")
+    arg_parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=DEFAULT_CHUNKSIZE,
+        help="stream statements in chunks of this many rows to bound memory use (Raiffeisen csv, default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--ledger",
+        nargs="?",
+        const=user_data_dir() / "ledger.sqlite3",
+        default=None,
+        type=Path,
+        help="record exported transactions in this SQLite file (default: ledger.sqlite3 in the user data directory)",
+    )
+    arg_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only write transactions that are not in the ledger yet; implies --ledger",
+    )
+    arg_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="do not use the user cache directory: always read the mapping workbook and parse every statement",
+    )
+    arg_parser.add_argument(
+        "--since",
+        type=date.fromisoformat,
+        default=None,
+        metavar="YYYY-MM-DD",
+        help="only convert transactions booked on or after this date",
+    )
+    arg_parser.add_argument(
+        "--until",
+        type=date.fromisoformat,
+        default=None,
+        metavar="YYYY-MM-DD",
+        help="only convert transactions booked on or before this date",
+    )
+    arg_parser.add_argument(
+        "--account",
+        action="append",
+        default=[],
+        help="only convert this account, given by its number in the statement (e.g. an IBAN, spaces and case "
+        "ignored, 'main' for single-account statements); may be repeated",
+    )
+    arg_parser.add_argument(
+        "--split-months",
+        action="store_true",
+        help="write one csv per account and month, named e.g. statement_ynab_2024-11.csv",
+    )
+    arg_parser.add_argument(
+        "--ynab-budget",
+        default=None,
+        metavar="BUDGET_ID",
+        help=f"send the transactions to this budget through the YNAB API instead of writing csv files; "
+        f"the access token is read from ${TOKEN_ENV_VAR}",
+    )
+    arg_parser.add_argument(
+        "--ynab-account",
+        action="append",
+        default=[],
+        metavar="ACCOUNT=ID",
+        help="YNAB account id of an account, by its name in the mapping or its number; may be repeated "
+        "(default: the account name)",
+    )
+    arg_parser.add_argument("--ynab-url", default=DEFAULT_BASE_URL, help="base url of the API (default: %(default)s)")
+    arg_parser.add_argument(
+        "--ynab-batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="transactions per request (default: %(default)s)",
+    )
+
+
+def conversion_options(args: argparse.Namespace) -> ConvertOptions:
     if not Path(args.mapping).exists():
         shutil.copyfile("./tests/data/mapping_example.xlsx", args.mapping)
+    if args.incremental and args.ledger is None:
+        args.ledger = user_data_dir() / "ledger.sqlite3"
+    return ConvertOptions(
+        chunksize=args.chunksize,
+        ledger_path=args.ledger,
+        incremental=args.incremental,
+        parse_cache_dir=None if args.no_cache else user_cache_dir(),
+        export=export_options(args),
+        selection=selection(args),
+        split_months=args.split_months,
+    )
 
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        replacements_raw = pd.read_excel(args.mapping, header=0)
-    text_from = list(replacements_raw["from"])
-    text_to = list(replacements_raw["to"])
+
+def selection(args: argparse.Namespace) -> TransactionFilter | None:
+    if args.since is None and args.until is None and not args.account:
+        return None
+    return TransactionFilter(args.since, args.until, frozenset(args.account) if args.account else None)
+
+
+def export_options(args: argparse.Namespace) -> ExportOptions | None:
+    if args.ynab_budget is None:
+        return None
+    account_ids = {}
+    for assignment in args.ynab_account:
+        account, sep, account_id = assignment.partition("=")
+        if not sep:
+            logger.error(f"--ynab-account expects ACCOUNT=ID, got {assignment}")
+            raise SystemExit(1)
+        account_ids[account] = account_id
+    return ExportOptions(
+        args.ynab_budget,
+        args.ynab_url,
+        os.environ.get(TOKEN_ENV_VAR),
+        account_ids,
+        args.ynab_batch_size,
+    )
+
+
+def add_metrics_arguments(arg_parser: argparse.ArgumentParser) -> None:
+    arg_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="log wall time, rows per second and peak memory of every stage (traces memory, which slows it down)",
+    )
+    arg_parser.add_argument(
+        "--profile-dump",
+        type=Path,
+        default=None,
+        help="write cProfile statistics of the slowest stage to this file (single statement only)",
+    )
+    arg_parser.add_argument(
+        "--metrics-json",
+        default=None,
+        help="write the stage metrics as JSON to this file, or to stdout if '-'",
+    )
+
+
+def report_metrics(args: argparse.Namespace, metrics: Metrics) -> None:
+    if args.profile:
+        logger.info(f"Stage metrics:\n{metrics.summary()}")
+    if args.profile_dump is not None:
+        metrics.dump_profile(args.profile_dump)
+    if args.metrics_json == "-":
+        sys.stdout.write(json.dumps(metrics.to_json(), indent=2) + "\n")
+    elif args.metrics_json is not None:
+        Path(args.metrics_json).write_text(json.dumps(metrics.to_json(), indent=2) + "\n", encoding="utf-8")
+
+
+def main(argv: list[str] | None = None) -> None:
+    logging.basicConfig(level=logging.DEBUG)
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["watch"]:
+        from ynabify.watch import watch_main
+
+        watch_main(argv[1:])
+        return
+    if argv[:1] == ["serve"]:
+        from ynabify.serve import serve_main
+
+        serve_main(argv[1:])
+        return
+    if argv[:1] == ["unmapped"]:
+        from ynabify.unmapped import unmapped_main
+
+        unmapped_main(argv[1:])
+        return
+
+    arg_parser = argparse.ArgumentParser(
+        epilog="Run 'ynabify watch --help' to convert statements as they are downloaded, "
+        "'ynabify serve --help' to convert them over HTTP, "
+        "'ynabify unmapped --help' to find the memos the mapping misses."
+    )
+    arg_parser.add_argument("src", nargs="+", help="statement files, glob patterns or directories")
+    arg_parser.add_argument(
+        "-d",
+        "--destination",
+        nargs="?",
+        default=None,
+        help="output file, or output directory when converting several files without --merge",
+    )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="number of worker processes for several files (default: number of CPUs)",
+    )
+    arg_parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="merge overlapping statements into one csv per account, leaving out duplicate transactions",
+    )
+    add_conversion_arguments(arg_parser)
+    add_metrics_arguments(arg_parser)
+    args = arg_parser.parse_args(argv)
+
+    options = conversion_options(args)
+    trace_memory = args.profile or args.metrics_json is not None
+    metrics = Metrics(trace_memory=trace_memory, profile=args.profile_dump is not None)
+    try:
+        _convert_sources(args, options, metrics)
+    finally:
+        metrics.close()
+        report_metrics(args, metrics)
+
+
+def _convert_sources(args: argparse.Namespace, options: ConvertOptions, metrics: Metrics) -> None:
+    cache_dir = None if args.no_cache else user_cache_dir()
+    src_paths = expand_sources(args.src)
+    if not src_paths:
+        logger.error(f"No statement files found in {', '.join(args.src)}")
+        raise SystemExit(1)
+    if args.merge:
+        _merge_sources(args, src_paths, options, cache_dir, metrics)
+        return
+    if len(src_paths) != 1 or Path(args.src[0]).is_dir():
+        if args.profile_dump is not None:
+            logger.warning("--profile-dump only profiles single statements, ignoring it")
+        destination = None if args.destination is None else Path(args.destination)
+        try:
+            results = convert_files(
+                src_paths,
+                destination,
+                Path(args.mapping),
+                options,
+                args.jobs,
+                cache_dir,
+                trace_memory=metrics.trace_memory,
+            )
+        except ValueError as e:
+            logger.error(e)  # noqa: TRY400 - the files are named, a traceback adds nothing
+            raise SystemExit(1) from e
+        for result in results:
+            metrics.merge(result.stages)
+        log_summary(results)
+        if any(result.error is not None for result in results):
+            raise SystemExit(1)
+        return
+
+    src_path = src_paths[0]
+    file_parser = open_statement(src_path, options, metrics)
+    if file_parser is None:
+        logger.error(f"Cannot handle file: {src_path}")
+        raise SystemExit(1)
 
     if args.destination is None:
-        out_file_base = src_path.with_stem(Path(src_path).stem + "_ynab")
+        out_file_base = src_path.with_stem(Path(src_path).stem + OUTPUT_MARKER)
     else:
         out_file_base = Path(args.destination)
 
-    dfs = file_parser.get_transactions()
-    for account, df in dfs.items():
-        name = replace_text(account, text_from, text_to) or account
-        if len(dfs) > 1:
-            out_file_path = str(out_file_base.with_name(out_file_base.stem + f"_{name}").with_suffix(".csv"))
-        else:
-            out_file_path = str(out_file_base.with_suffix(".csv"))
+    with metrics.stage("mapping"):
+        matcher = load_matcher(Path(args.mapping), cache_dir)
+    try:
+        write_transactions(file_parser, out_file_base, matcher, options, metrics=metrics)
+    except WriteError as e:
+        logger.error(e)  # noqa: TRY400 - the accounts are named, a traceback adds nothing
+        raise SystemExit(1) from e
 
-        df = df.set_index("Date")  # noqa: PLW2901
-        df["Payee"] = df.apply(lambda row: replace_text(row["Memo"], text_from, text_to), axis=1)
 
-        n_tries = 60
-        while n_tries:
-            try:
-                n_tries -= 1
-                df.to_csv(out_file_path, sep=",", encoding="utf_8_sig")
-                logger.info(f"Wrote to {out_file_path}")
-                break
-            except PermissionError:
-                logger.error(f"Cannot write to {out_file_path}. Please close the file.")  # noqa: TRY400
-                time.sleep(1)
+def _merge_sources(
+    args: argparse.Namespace,
+    src_paths: list[Path],
+    options: ConvertOptions,
+    cache_dir: Path | None,
+    metrics: Metrics,
+) -> None:
+    destination = None if args.destination is None else Path(args.destination)
+    if destination is None or destination.is_dir():
+        out_file_base = (destination or src_paths[0].parent) / f"merged{OUTPUT_MARKER}.csv"
+    else:
+        out_file_base = destination
+
+    with metrics.stage("mapping"):
+        matcher = load_matcher(Path(args.mapping), cache_dir)
+    try:
+        merge_files(src_paths, out_file_base, matcher, options, metrics)
+    except ParseError as e:
+        logger.error(e)  # noqa: TRY400 - the file is named, a traceback adds nothing
+        raise SystemExit(1) from e
 
 
 if __name__ == "__main__":
@@ -0,0 +1,12 @@
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def user_cache_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Keep the tests away from the real user cache and data directories."""
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("YNABIFY_CACHE_DIR", str(cache_dir))
+    monkeypatch.setenv("YNABIFY_DATA_DIR", str(tmp_path / "data"))
+    return cache_dir
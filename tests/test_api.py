@@ -0,0 +1,51 @@
+from pathlib import Path
+
+import pytest
+
+import ynabify
+from ynabify.payee_matcher import PayeeMatcher
+from ynabify.ynabify import main
+
+mapping_path = Path("tests/data/mapping_example.xlsx")
+swisscard_xlsx_example_path = Path("tests/data/swisscard_xlsx/example_bill_de.xlsx")
+ynab_xlsx_example_path = Path("tests/data/ynab_xlsx/example_bill.xlsx")
+raiffeisen_csv_example_path = Path("tests/data/raiffeisen_csv/example_bill.csv")
+
+
+@pytest.fixture(scope="module")
+def matcher() -> PayeeMatcher:
+    return ynabify.load_matcher(mapping_path)
+
+
+class TestConvert:
+    @pytest.mark.parametrize(
+        "src_path",
+        [swisscard_xlsx_example_path, ynab_xlsx_example_path, raiffeisen_csv_example_path],
+    )
+    def test_should_match_command_line_output(self, tmp_path: Path, matcher: PayeeMatcher, src_path: Path) -> None:
+        main([str(src_path), "-d", str(tmp_path / "out.csv"), "-m", str(mapping_path), "--no-cache"])
+        written = sorted(path.read_bytes() for path in tmp_path.glob("out*.csv"))
+        result = ynabify.convert(src_path.read_bytes(), matcher)
+        assert sorted(result.to_csv().values()) == written
+
+    def test_should_accept_paths_bytes_and_file_objects(self, matcher: PayeeMatcher) -> None:
+        from_path = ynabify.convert(str(swisscard_xlsx_example_path), matcher).to_csv()
+        from_bytes = ynabify.convert(swisscard_xlsx_example_path.read_bytes(), matcher).to_csv()
+        with swisscard_xlsx_example_path.open("rb") as f:
+            from_file = ynabify.convert(f, matcher).to_csv()
+        assert from_path == from_bytes == from_file
+
+    def test_should_resolve_payees_and_account_names(self) -> None:
+        matcher = PayeeMatcher(["rissv", "CH1234567890123456789"], ["Rissv", "Savings"])
+        result = ynabify.convert(raiffeisen_csv_example_path.read_bytes(), matcher)
+        assert result.parser == "RaiffeisenCsv"
+        assert result.names["CH1234567890123456789"] == "Savings"
+        assert "Rissv" in set(result.batches["CH1234567890123456789"].frame["Payee"])
+
+    def test_should_leave_payees_empty_without_mapping(self) -> None:
+        result = ynabify.convert(swisscard_xlsx_example_path.read_bytes())
+        assert set(result.batches["main"].frame["Payee"]) == {""}
+
+    def test_should_name_rejected_content_in_error(self) -> None:
+        with pytest.raises(ynabify.ParseError, match="upload.bin"):
+            ynabify.convert(b"no statement", name="upload.bin")
@@ -0,0 +1,62 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from benchmarks import generators
+from benchmarks.run import compare, main
+from ynabify.parser.raiffeisen_csv import RaiffeisenCsv
+from ynabify.parser.swisscard_xlsx import SwisscardXlsx
+from ynabify.parser.ynab_xlsx import YnabXlsx
+from ynabify.parser_registry import open_parser
+from ynabify.payee_matcher import read_mapping
+
+
+class TestGenerators:
+    def test_should_generate_raiffeisen_csv_with_continuation_rows(self, tmp_path: Path) -> None:
+        path = generators.raiffeisen_csv(tmp_path / "statement.csv", 200, n_ibans=3)
+        assert len(path.read_text(encoding="cp1252").splitlines()) > 201
+        cut = open_parser(path)
+        assert isinstance(cut, RaiffeisenCsv)
+        dfs = cut.get_transactions()
+        assert len(dfs) == 3
+        assert sum(len(df) for df in dfs.values()) == 200
+
+    @pytest.mark.parametrize("language", ["de", "en"])
+    def test_should_generate_swisscard_xlsx(self, tmp_path: Path, language: str) -> None:
+        path = generators.swisscard_xlsx(tmp_path / "bill.xlsx", 100, language, posted_share=1)
+        cut = open_parser(path)
+        assert isinstance(cut, SwisscardXlsx)
+        assert len(cut.get_transactions()["main"]) == 100
+
+    def test_should_generate_ynab_xlsx(self, tmp_path: Path) -> None:
+        cut = open_parser(generators.ynab_xlsx(tmp_path / "bill.xlsx", 100))
+        assert isinstance(cut, YnabXlsx)
+        assert len(cut.get_transactions()["main"]) == 100
+
+    def test_should_generate_mapping(self, tmp_path: Path) -> None:
+        text_from, text_to = read_mapping(generators.mapping_xlsx(tmp_path / "mapping.xlsx", 100))
+        assert len(set(text_from)) == 100
+        assert len(text_to) == 100
+
+
+class TestCompare:
+    def test_should_report_stages_slower_than_allowed(self) -> None:
+        results = {"a/1/parse": 1.3, "a/1/write": 1.1, "a/1/map": 5.0}
+        baseline = {"a/1/parse": 1.0, "a/1/write": 1.0}
+        assert compare(results, baseline, 1.25) == ["a/1/parse"]
+
+
+class TestMain:
+    def test_should_save_results_and_fail_on_regression(self, tmp_path: Path) -> None:
+        output = tmp_path / "results.json"
+        args = ["--sizes", "50", "--mapping-entries", "20", "--repeat", "1", "--data-dir", str(tmp_path)]
+        main([*args, "-o", str(output)])
+        report = json.loads(output.read_text())
+        assert "raiffeisen_csv/50/parse" in report["results"]
+        assert "mapping/20/compile" in report["results"]
+
+        report["results"] = {key: seconds / 1000 for key, seconds in report["results"].items()}
+        output.write_text(json.dumps(report))
+        with pytest.raises(SystemExit):
+            main([*args, "-o", str(tmp_path / "after.json"), "--baseline", str(output)])
@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+
+# Cumulative microseconds `import ynabify.ynabify` may take. Roughly 5x what it takes on a laptop, so
+# only pulling in a heavy dependency (pandas alone takes several hundred milliseconds) trips it.
+IMPORT_BUDGET_US = 300_000
+
+HEAVY_MODULES = ("pandas", "numpy", "openpyxl")
+
+
+def import_times(code: str) -> dict[str, int]:
+    """Run code in a fresh interpreter and return the cumulative import time of every module it loaded."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=False,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def heavy_modules(times: dict[str, int]) -> list[str]:
+    return [name for name in times if name.split(".")[0] in HEAVY_MODULES]
+
+
+class TestImportTime:
+    def test_should_stay_within_budget(self) -> None:
+        times = import_times("import ynabify.ynabify")
+        assert times["ynabify.ynabify"] < IMPORT_BUDGET_US
+
+    def test_should_not_import_heavy_modules_for_registry(self) -> None:
+        times = import_times("from ynabify.parser_registry import registered_parsers; registered_parsers()")
+        assert "ynabify.parser.raiffeisen_csv" in times
+        assert heavy_modules(times) == []
+
+    def test_should_not_import_heavy_modules_for_help(self) -> None:
+        times = import_times(
+            "from ynabify.ynabify import main\ntry:\n    main(['--help'])\nexcept SystemExit:\n    pass"
+        )
+        assert heavy_modules(times) == []
+
+    def test_should_not_import_pandas_for_rejected_file(self) -> None:
+        times = import_times("from ynabify.ynabify import main\nmain(['tests/data/empty_textfile.txt'])")
+        assert "ynabify.ynabify" in times
+        assert "pandas" not in times
+
+    def test_should_not_import_pandas_for_sniffing(self) -> None:
+        times = import_times(
+            "from pathlib import Path\n"
+            "from ynabify.sniff import sniff_header\n"
+            "sniff_header(Path('tests/data/ynab_xlsx/example_bill.xlsx'))",
+        )
+        assert "openpyxl" in times or "python_calamine" in times
+        assert "pandas" not in times
@@ -0,0 +1,138 @@
+import multiprocessing
+from collections import Counter
+from collections.abc import Iterator
+from multiprocessing.synchronize import Barrier
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from ynabify.ledger import Ledger, fingerprints
+from ynabify.parser_base import TransactionBatch, amounts_from_text
+
+
+def make_batch(memos: list[str], inflows: list[str] | None = None) -> TransactionBatch:
+    return TransactionBatch.from_columns(
+        dates=pd.to_datetime(["2024-11-23"] * len(memos)),
+        memos=memos,
+        inflow=amounts_from_text(pd.Series(inflows or ["0"] * len(memos))),
+        outflow=amounts_from_text(pd.Series(["1.5"] * len(memos))),
+    )
+
+
+def convert_in_process(path: Path, account: str, barrier: Barrier) -> None:
+    """Record and commit like a worker of ynabify -j converting one statement; all workers commit at once."""
+    with Ledger(path) as ledger:
+        for memos in (["foo"], ["bar"]):
+            batch = make_batch(memos)
+            ids = fingerprints(account, batch)
+            ledger.known(account, batch, ids)
+            ledger.record(account, batch, ids)
+        barrier.wait()
+        ledger.commit()
+
+
+@pytest.fixture
+def ledger(tmp_path: Path) -> Iterator[Ledger]:
+    with Ledger(tmp_path / "ledger.sqlite3") as ledger:
+        yield ledger
+
+
+class TestFingerprints:
+    def test_should_be_stable(self) -> None:
+        batch = make_batch(["foo", "bar"])
+        assert fingerprints("CH1", batch) == fingerprints("CH1", batch)
+
+    def test_should_depend_on_account(self) -> None:
+        batch = make_batch(["foo"])
+        assert fingerprints("CH1", batch) != fingerprints("CH2", batch)
+
+    def test_should_tell_identical_transactions_apart(self) -> None:
+        ids = fingerprints("CH1", make_batch(["coffee", "coffee"]))
+        assert len(set(ids)) == 2
+
+    def test_should_count_occurrences_across_chunks(self) -> None:
+        occurrences: Counter[str] = Counter()
+        ids = fingerprints("CH1", make_batch(["coffee"]), occurrences) + fingerprints(
+            "CH1",
+            make_batch(["coffee"]),
+            occurrences,
+        )
+        assert ids == fingerprints("CH1", make_batch(["coffee", "coffee"]))
+
+    def test_should_ignore_exported_precision(self) -> None:
+        assert fingerprints("CH1", make_batch(["foo"], ["2000"])) == fingerprints(
+            "CH1", make_batch(["foo"], ["2000.00"])
+        )
+
+
+class TestLedger:
+    def test_should_not_know_new_transactions(self, ledger: Ledger) -> None:
+        batch = make_batch(["foo", "bar"])
+        assert not ledger.known("CH1", batch, fingerprints("CH1", batch)).any()
+
+    def test_should_know_recorded_transactions(self, ledger: Ledger) -> None:
+        batch = make_batch(["foo"])
+        ledger.record("CH1", batch, fingerprints("CH1", batch))
+        ledger.commit()
+        batch = make_batch(["foo", "bar"])
+        assert list(ledger.known("CH1", batch, fingerprints("CH1", batch))) == [True, False]
+
+    def test_should_forget_rolled_back_transactions(self, ledger: Ledger) -> None:
+        batch = make_batch(["foo"])
+        ledger.record("CH1", batch, fingerprints("CH1", batch))
+        ledger.rollback()
+        assert not ledger.known("CH1", batch, fingerprints("CH1", batch)).any()
+
+    def test_should_only_add_transactions_of_written_accounts_and_months(self, ledger: Ledger) -> None:
+        november, december = make_batch(["foo"]), make_batch(["bar"])
+        december.frame["Date"] = pd.to_datetime(["2024-12-01"]).as_unit("s")
+        for account in ("CH1", "CH2"):
+            for batch in (november, december):
+                ledger.record(account, batch, fingerprints(account, batch))
+        ledger.commit([("CH1", None), ("CH2", "2024-12")])
+        known = {
+            (account, month): ledger.known(account, batch, fingerprints(account, batch)).all()
+            for account in ("CH1", "CH2")
+            for month, batch in (("2024-11", november), ("2024-12", december))
+        }
+        assert known == {
+            ("CH1", "2024-11"): True,
+            ("CH1", "2024-12"): True,
+            ("CH2", "2024-11"): False,
+            ("CH2", "2024-12"): True,
+        }
+
+    def test_should_hold_back_transactions_until_released(self, ledger: Ledger) -> None:
+        batch = make_batch(["foo"])
+        ids = fingerprints("CH1", batch)
+        ledger.record("CH1", batch, ids)
+        ledger.commit([], [("CH1", None, "out.0.csv.part")])
+        assert not ledger.known("CH1", batch, ids).any()
+        ledger.release("out.0.csv.part")
+        assert ledger.known("CH1", batch, ids).all()
+
+    def test_should_forget_discarded_transactions(self, ledger: Ledger) -> None:
+        batch = make_batch(["foo"])
+        ids = fingerprints("CH1", batch)
+        ledger.record("CH1", batch, ids)
+        ledger.commit([], [("CH1", None, "out.0.csv.part")])
+        ledger.discard("out.0.csv.part")
+        ledger.release("out.0.csv.part")
+        assert not ledger.known("CH1", batch, ids).any()
+
+    def test_should_let_processes_share_ledger(self, tmp_path: Path) -> None:
+        path = tmp_path / "ledger.sqlite3"
+        Ledger(path).close()
+        accounts = [f"CH{i}" for i in range(4)]
+        context = multiprocessing.get_context("spawn")
+        barrier = context.Barrier(len(accounts))
+        processes = [context.Process(target=convert_in_process, args=(path, account, barrier)) for account in accounts]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+        assert [process.exitcode for process in processes] == [0] * len(accounts)
+        with Ledger(path) as ledger:
+            batch = make_batch(["foo"])
+            assert all(ledger.known(account, batch, fingerprints(account, batch)).all() for account in accounts)
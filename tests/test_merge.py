@@ -0,0 +1,113 @@
+from pathlib import Path
+
+import pandas as pd
+
+from ynabify.merge import merge_batches, merge_statements, normalize_memo
+from ynabify.parser.raiffeisen_csv import RaiffeisenCsv
+from ynabify.parser.swisscard_xlsx import SwisscardXlsx
+from ynabify.parser.ynab_xlsx import YnabXlsx
+from ynabify.parser_base import ParsedStatement, TransactionBatch, amounts_from_text
+
+raiffeisen_csv_example_path = Path("tests/data/raiffeisen_csv/example_bill.csv")
+swisscard_xlsx_example_path = Path("tests/data/swisscard_xlsx/example_bill_de.xlsx")
+ynab_xlsx_example_path = Path("tests/data/ynab_xlsx/example_bill.xlsx")
+
+
+def make_batch(rows: list[tuple[str, str, str]]) -> TransactionBatch:
+    """A batch of (date, memo, amount) rows; negative amounts are outflows."""
+    amounts = pd.Series([amount for _, _, amount in rows], dtype=object)
+    is_inflow = ~amounts.str.startswith("-")
+    return TransactionBatch.from_columns(
+        dates=pd.to_datetime([date for date, _, _ in rows]),
+        memos=[memo for _, memo, _ in rows],
+        inflow=amounts_from_text(amounts.where(is_inflow, "0")),
+        outflow=amounts_from_text(amounts.str.lstrip("-").where(~is_inflow, "0")),
+    )
+
+
+def rows(batch: TransactionBatch) -> list[tuple[str, str, str, str]]:
+    dates = [f"{date:%Y-%m-%d}" for date in batch.frame["Date"]]
+    inflow, outflow = batch.amount_text("Inflow").tolist(), batch.amount_text("Outflow").tolist()
+    return list(zip(dates, batch.texts("Memo"), inflow, outflow, strict=True))
+
+
+class TestNormalizeMemo:
+    def test_should_ignore_case_and_spacing(self) -> None:
+        assert normalize_memo("  Einkauf  RISSV,\tFOO ") == normalize_memo("einkauf rissv, foo")
+
+
+class TestMergeBatches:
+    def test_should_merge_sorted_by_date_without_duplicates(self) -> None:
+        quarter = make_batch([("2024-10-03", "rent", "-1500"), ("2024-11-02", "coffee", "-4.5")])
+        month = make_batch([("2024-11-02", "coffee", "-4.5"), ("2024-11-20", "salary", "5000")])
+        assert rows(merge_batches([month, quarter])) == [
+            ("2024-10-03", "rent", "0", "1500"),
+            ("2024-11-02", "coffee", "0", "4.5"),
+            ("2024-11-20", "salary", "5000", "0"),
+        ]
+
+    def test_should_merge_statements_sorted_newest_first(self) -> None:
+        quarter = make_batch([("2024-11-02", "coffee", "-4.5"), ("2024-10-03", "rent", "-1500")])
+        month = make_batch([("2024-11-20", "salary", "5000"), ("2024-11-02", "coffee", "-4.5")])
+        assert [memo for _, memo, _, _ in rows(merge_batches([quarter, month]))] == ["rent", "coffee", "salary"]
+
+    def test_should_keep_identical_transactions_of_one_statement(self) -> None:
+        two_coffees = make_batch([("2024-11-02", "coffee", "-4.5"), ("2024-11-02", "coffee", "-4.5")])
+        one_coffee = make_batch([("2024-11-02", "coffee", "-4.5")])
+        assert len(merge_batches([one_coffee, two_coffees])) == 2
+        assert len(merge_batches([two_coffees, one_coffee])) == 2
+
+    def test_should_compare_normalized_memos(self) -> None:
+        first = make_batch([("2024-11-02", "Einkauf RISSV, FOO", "-1")])
+        second = make_batch([("2024-11-02", "einkauf  rissv, foo", "-1")])
+        assert rows(merge_batches([first, second])) == [("2024-11-02", "Einkauf RISSV, FOO", "0", "1")]
+
+    def test_should_keep_transactions_differing_in_amount_or_day(self) -> None:
+        first = make_batch([("2024-11-02", "coffee", "-4.5")])
+        second = make_batch([("2024-11-02", "coffee", "-5"), ("2024-11-03", "coffee", "-4.5")])
+        assert len(merge_batches([first, second])) == 3
+
+    def test_should_handle_missing_memos_and_single_batches(self) -> None:
+        batch = make_batch([("2024-11-02", "coffee", "-4.5")])
+        assert merge_batches([batch]) is batch
+        assert len(merge_batches([])) == 0
+        no_memo = TransactionBatch.from_columns(
+            dates=pd.to_datetime(["2024-11-02"]),
+            memos=[None],
+            inflow=amounts_from_text(pd.Series(["0"])),
+            outflow=amounts_from_text(pd.Series(["4.5"])),
+        )
+        assert len(merge_batches([no_memo, no_memo, batch])) == 2
+
+
+class TestMergeStatements:
+    def test_should_group_accounts_of_all_statements(self) -> None:
+        statement = RaiffeisenCsv(raiffeisen_csv_example_path)
+        other = ParsedStatement("RaiffeisenCsv", {"CH99": make_batch([("2024-11-02", "coffee", "-4.5")])})
+        merged = merge_statements([statement, other, RaiffeisenCsv(raiffeisen_csv_example_path)])
+        assert merged.name == "RaiffeisenCsv"
+        expected = {account: len(batch) for account, batch in statement.get_batches().items()}
+        assert {account: len(batch) for account, batch in merged.get_batches().items()} == {**expected, "CH99": 1}
+
+    def test_should_keep_accounts_of_different_parsers_apart(self) -> None:
+        card, ynab = SwisscardXlsx(swisscard_xlsx_example_path), YnabXlsx(ynab_xlsx_example_path)
+        expected = {
+            "1234_56_7890": len(card.get_batches()["main"]),
+            "YnabXlsx": len(ynab.get_batches()["main"]),
+        }
+        merged = merge_statements([card, ynab])
+        assert {account: len(batch) for account, batch in merged.get_batches().items()} == expected
+        assert {account: merged.parser_name(account) for account in expected} == {
+            "1234_56_7890": "SwisscardXlsx",
+            "YnabXlsx": "YnabXlsx",
+        }
+        assert {account: merged.account_id(account) for account in expected} == {
+            "1234_56_7890": "1234 56**** *7890",
+            "YnabXlsx": "main",
+        }
+
+    def test_should_name_statements_of_one_account_by_their_account(self) -> None:
+        first = ParsedStatement("SwisscardXlsx", {"main": make_batch([("2024-11-02", "coffee", "-4.5")])})
+        second = ParsedStatement("SwisscardXlsx", {"main": make_batch([("2024-11-03", "tea", "-3")])})
+        merged = merge_statements([first, second])
+        assert {account: len(batch) for account, batch in merged.get_batches().items()} == {"main": 2}
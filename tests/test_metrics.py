@@ -0,0 +1,66 @@
+import logging
+import time
+
+import pytest
+
+from ynabify.metrics import Metrics, Progress, StageMetrics
+
+
+class TestMetrics:
+    def test_should_accumulate_repeated_stages(self) -> None:
+        cut = Metrics()
+        for n in (2, 3):
+            with cut.stage("parse") as stage:
+                stage.add_rows(n)
+        assert cut.stages["parse"].calls == 2
+        assert cut.stages["parse"].rows == 5
+        assert cut.stages["parse"].peak_bytes is None
+
+    def test_should_trace_peak_memory(self) -> None:
+        cut = Metrics(trace_memory=True)
+        try:
+            with cut.stage("allocate"):
+                data = bytearray(10 * 2**20)
+            del data
+        finally:
+            cut.close()
+        assert cut.stages["allocate"].peak_bytes is not None
+        assert cut.stages["allocate"].peak_bytes >= 10 * 2**20
+
+    def test_should_time_producing_items(self) -> None:
+        def slow_chunks() -> list[list[int]]:
+            time.sleep(0.05)
+            return [[1, 2], [3]]
+
+        cut = Metrics()
+        chunks = list(cut.iterate("parse", iter(slow_chunks()), len))
+        assert chunks == [[1, 2], [3]]
+        assert cut.stages["parse"].calls == 2
+        assert cut.stages["parse"].rows == 3
+
+    def test_should_merge_stages(self) -> None:
+        cut = Metrics()
+        cut.merge({"write": StageMetrics(1.0, 1, 10, 100)})
+        cut.merge({"write": StageMetrics(2.0, 1, 5, 50)})
+        assert cut.stages["write"] == StageMetrics(3.0, 2, 15, 100)
+        assert cut.to_json()["stages"]["write"]["rows_per_second"] == 5
+
+    def test_should_profile_hottest_stage(self) -> None:
+        cut = Metrics(profile=True)
+        with cut.stage("fast"):
+            pass
+        with cut.stage("slow"):
+            time.sleep(0.01)
+        assert cut.hottest_stage() == "slow"
+
+
+class TestProgress:
+    def test_should_log_at_most_every_interval(self, caplog: pytest.LogCaptureFixture) -> None:
+        caplog.set_level(logging.INFO)
+        cut = Progress("Writing", interval=3600)
+        cut.update(10)
+        assert cut.rows == 10
+        assert "Writing" not in caplog.text
+        cut.interval = 0
+        cut.update(5)
+        assert "Writing: 15 rows" in caplog.text
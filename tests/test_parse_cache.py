@@ -0,0 +1,150 @@
+import tracemalloc
+from collections.abc import Iterator
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import ynabify.parse_cache
+from ynabify.parse_cache import CachedStatement, ParseCache, file_digest
+from ynabify.parser.raiffeisen_csv import RaiffeisenCsv
+from ynabify.parser_base import ParserBase, TransactionBatch, TransactionFilter, amounts_from_text
+
+raiffeisen_csv_example_path = Path("tests/data/raiffeisen_csv/example_bill.csv")
+swisscard_xlsx_example_path = Path("tests/data/swisscard_xlsx/example_bill_de.xlsx")
+
+
+def contents(file_parser: ParserBase) -> dict[str, dict[str, list]]:
+    """Everything about the transactions except their payees."""
+    return {
+        account: {
+            "dates": batch.frame["Date"].tolist(),
+            "memos": batch.texts("Memo"),
+            "inflow": batch.amount_text("Inflow").tolist(),
+            "outflow": batch.amount_text("Outflow").tolist(),
+        }
+        for account, batch in file_parser.get_batches().items()
+    }
+
+
+class TestParseCache:
+    @pytest.mark.parametrize("src_path", [raiffeisen_csv_example_path, swisscard_xlsx_example_path])
+    def test_should_load_what_was_parsed(self, tmp_path: Path, src_path: Path) -> None:
+        cut = ParseCache(tmp_path)
+        parsed = cut.open(src_path)
+        assert parsed is not None
+        expected = contents(parsed)
+        cached = cut.open(src_path)
+        assert isinstance(cached, CachedStatement)
+        assert cached.name == parsed.name
+        assert contents(cached) == expected
+        assert {account: cached.account_id(account) for account in expected} == {
+            account: parsed.account_id(account) for account in expected
+        }
+        assert {batch.texts("Payee")[0] for batch in cached.get_batches().values()} == {""}
+
+    def test_should_skip_detection_for_known_content(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        ParseCache(tmp_path).open(raiffeisen_csv_example_path).get_batches()  # type: ignore[union-attr]
+        monkeypatch.setattr(ynabify.parse_cache, "open_parser", pytest.fail)
+        copy_path = tmp_path / "renamed.csv"
+        copy_path.write_bytes(raiffeisen_csv_example_path.read_bytes())
+        assert isinstance(ParseCache(tmp_path).open(copy_path), CachedStatement)
+
+    def test_should_store_streamed_statement_once_complete(self, tmp_path: Path) -> None:
+        cut = ParseCache(tmp_path)
+        parsed = cut.open(raiffeisen_csv_example_path)
+        assert parsed is not None
+        chunks = parsed.iter_batches(chunksize=3)
+        next(chunks)
+        assert not list(tmp_path.glob("parse-*.npz"))
+        list(chunks)
+        cached = cut.open(raiffeisen_csv_example_path)
+        assert isinstance(cached, CachedStatement)
+        assert contents(cached) == contents(RaiffeisenCsv(raiffeisen_csv_example_path))
+
+    def test_should_not_hold_streamed_chunks_in_memory(self, tmp_path: Path) -> None:
+        def chunks(n_chunks: int, rows: int = 5_000) -> Iterator[dict[str, TransactionBatch]]:
+            for k in range(n_chunks):
+                memos = [f"shop {k * rows + i}" for i in range(rows)]
+                yield {
+                    "main": TransactionBatch.from_columns(
+                        dates=pd.to_datetime(["2024-11-23"] * rows),
+                        memos=memos,
+                        inflow=amounts_from_text(pd.Series(["1.5"] * rows)),
+                        outflow=amounts_from_text(pd.Series(["0"] * rows)),
+                    )
+                }
+
+        cut = ParseCache(tmp_path)
+        parser = RaiffeisenCsv(raiffeisen_csv_example_path)
+        peaks = []
+        for n_chunks in (2, 20):
+            tracemalloc.start()
+            try:
+                cut.store(f"digest-{n_chunks}", parser, chunks(n_chunks))
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+        assert peaks[1] < 1.5 * peaks[0]
+        cached = cut.load("digest-20")
+        assert cached is not None
+        assert len(cached.get_batches()["main"]) == 100_000
+        assert cached.get_batches()["main"].texts("Memo")[-1] == "shop 99999"
+
+    def test_should_keep_missing_memos(self, tmp_path: Path) -> None:
+        batch = TransactionBatch.from_columns(
+            dates=pd.to_datetime(["2024-11-23", "2024-11-24"]),
+            memos=["foo", None],
+            inflow=amounts_from_text(pd.Series(["1", "2.5"])),
+            outflow=amounts_from_text(pd.Series(["0", "0"])),
+        )
+        cut = ParseCache(tmp_path)
+        cut.store("digest", RaiffeisenCsv(raiffeisen_csv_example_path), [{"main": batch}])
+        cached = cut.load("digest")
+        assert cached is not None
+        assert cached.get_batches()["main"].frame["Memo"].isna().tolist() == [False, True]
+
+    def test_should_ignore_statements_of_older_parser_version(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        cut = ParseCache(tmp_path)
+        cut.open(raiffeisen_csv_example_path).get_batches()  # type: ignore[union-attr]
+        monkeypatch.setattr(RaiffeisenCsv, "version", RaiffeisenCsv.version + 1)
+        assert cut.load(file_digest(raiffeisen_csv_example_path)) is None
+
+    def test_should_ignore_corrupt_entries(self, tmp_path: Path) -> None:
+        cut = ParseCache(tmp_path)
+        cut.open(raiffeisen_csv_example_path).get_batches()  # type: ignore[union-attr]
+        for cache_path in tmp_path.glob("parse-*.npz"):
+            cache_path.write_bytes(b"PK\x03\x04 broken")
+        assert cut.load(file_digest(raiffeisen_csv_example_path)) is None
+
+    def test_should_evict_least_recently_used_beyond_size_limit(self, tmp_path: Path) -> None:
+        probe_dir, cache_dir = tmp_path / "probe", tmp_path / "cache"
+        ParseCache(probe_dir).open(raiffeisen_csv_example_path).get_batches()  # type: ignore[union-attr]
+        size = next(probe_dir.glob("parse-*.npz")).stat().st_size
+
+        ParseCache(cache_dir).open(swisscard_xlsx_example_path).get_batches()  # type: ignore[union-attr]
+        ParseCache(cache_dir, max_bytes=size).open(raiffeisen_csv_example_path).get_batches()  # type: ignore[union-attr]
+        assert [p.name for p in cache_dir.glob("parse-*.npz")] == [
+            f"parse-{file_digest(raiffeisen_csv_example_path)}.npz"
+        ]
+
+    def test_should_filter_cached_statement(self, tmp_path: Path) -> None:
+        cut = ParseCache(tmp_path)
+        cut.open(swisscard_xlsx_example_path).get_batches()  # type: ignore[union-attr]
+        cached = cut.open(swisscard_xlsx_example_path, selection=TransactionFilter(until=date(2024, 2, 29)))
+        assert isinstance(cached, CachedStatement)
+        assert cached.get_batches()["main"].texts("Memo") == ["IHRE ZAHLUNG – BESTEN DANK"]  # noqa: RUF001
+
+    def test_should_not_store_filtered_parse(self, tmp_path: Path) -> None:
+        selection = TransactionFilter(until=date(2024, 2, 29))
+        ParseCache(tmp_path).open(swisscard_xlsx_example_path, selection=selection).get_batches()  # type: ignore[union-attr]
+        assert not list(tmp_path.glob("parse-*.npz"))
+
+    def test_should_not_cache_rejected_files(self, tmp_path: Path) -> None:
+        assert ParseCache(tmp_path).open(Path("tests/data/empty_textfile.txt")) is None
+        assert not list(tmp_path.iterdir())
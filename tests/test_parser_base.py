@@ -0,0 +1,151 @@
+from dataclasses import FrozenInstanceError
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ynabify.parser_base import (
+    RangeEnd,
+    Transaction,
+    TransactionBatch,
+    TransactionFilter,
+    amounts_from_float,
+    amounts_from_text,
+    format_amounts,
+)
+
+
+def make_batch() -> TransactionBatch:
+    return TransactionBatch.from_columns(
+        dates=pd.to_datetime(["2024-11-23", "2024-11-24"]),
+        memos=["foo", "bar"],
+        inflow=amounts_from_text(pd.Series(["2000", "0"])),
+        outflow=amounts_from_text(pd.Series(["0", "122.10"])),
+    )
+
+
+class TestAmounts:
+    @pytest.mark.parametrize("text", ["2000", "-15.5", "122.10", "0", "0.05", "-0.5"])
+    def test_should_round_trip_text(self, text: str) -> None:
+        cents, decimals = amounts_from_text(pd.Series([text]))
+        assert list(format_amounts(cents, decimals)) == [text]
+
+    def test_should_store_minor_units(self) -> None:
+        cents, decimals = amounts_from_text(pd.Series([" 12.3 ", "-7"]))
+        assert list(cents) == [1230, -700]
+        assert list(decimals) == [1, 0]
+
+    def test_should_round_sub_cent_amounts(self) -> None:
+        cents, decimals = amounts_from_text(pd.Series(["1.125", "1.135"]))
+        assert list(format_amounts(cents, decimals)) == ["1.12", "1.14"]
+
+    def test_should_reject_malformed_amounts(self) -> None:
+        with pytest.raises(ArithmeticError):
+            amounts_from_text(pd.Series(["abc"]))
+
+    def test_should_convert_floats_with_fewest_decimals(self) -> None:
+        cents, decimals = amounts_from_float(pd.Series([12.11, 3.5, 40.0, None]))
+        assert list(format_amounts(cents, decimals)) == ["12.11", "3.5", "40", "0"]
+
+    def test_should_format_empty_arrays(self) -> None:
+        assert len(format_amounts(np.zeros(0, dtype=np.int64), 2)) == 0
+
+
+class TestTransactionBatch:
+    def test_should_use_compact_dtypes(self) -> None:
+        dtypes = make_batch().frame.dtypes
+        assert dtypes["Date"] == "datetime64[s]"
+        assert isinstance(dtypes["Memo"], pd.CategoricalDtype)
+        assert isinstance(dtypes["Payee"], pd.CategoricalDtype)
+        assert dtypes["Inflow"] == np.int64
+        assert dtypes["InflowDecimals"] == np.int8
+
+    def test_should_convert_to_decimal_frame(self) -> None:
+        df = make_batch().to_frame()
+        assert list(df.columns) == ["Date", "Payee", "Memo", "Inflow", "Outflow"]
+        assert list(df["Inflow"]) == [Decimal(2000), Decimal(0)]
+        assert list(df["Outflow"]) == [Decimal(0), Decimal("122.10")]
+        assert list(df["Payee"]) == ["", ""]
+
+    def test_should_filter_and_set_payees(self) -> None:
+        batch = make_batch().filter(pd.Series([False, True]))
+        batch.set_payees(["Bar"])
+        assert len(batch) == 1
+        assert list(batch.to_frame().iloc[0]) == [pd.Timestamp("2024-11-24"), "Bar", "bar", 0, Decimal("122.10")]
+
+    def test_should_create_empty_batch(self) -> None:
+        assert len(TransactionBatch.empty().to_frame()) == 0
+
+    def test_should_yield_slotted_records(self) -> None:
+        records = list(make_batch().records())
+        assert records[1] == Transaction(date(2024, 11, 24), "", "bar", Decimal(0), Decimal("122.10"))
+        assert not hasattr(records[0], "__dict__")
+        with pytest.raises(FrozenInstanceError):
+            records[0].memo = "baz"  # type: ignore[misc]
+
+    def test_should_resolve_each_distinct_memo_once(self) -> None:
+        batch = TransactionBatch.from_columns(
+            dates=pd.to_datetime(["2024-11-23"] * 4),
+            memos=["foo", "bar", "foo", None],
+            inflow=amounts_from_text(pd.Series(["1"] * 4)),
+            outflow=amounts_from_text(pd.Series(["0"] * 4)),
+        )
+        calls = []
+
+        def resolve(memos: list[str]) -> list[str]:
+            calls.append(memos)
+            return [memo.title() for memo in memos]
+
+        batch.resolve_payees(resolve)
+        assert calls == [["bar", "foo"]]
+        assert batch.texts("Payee") == ["Foo", "Bar", "Foo", ""]
+
+    def test_should_split_by_month(self) -> None:
+        batch = TransactionBatch.from_columns(
+            dates=pd.to_datetime(["2024-12-01", "2024-11-30", "2024-12-31"]),
+            memos=["a", "b", "c"],
+            inflow=amounts_from_text(pd.Series(["1"] * 3)),
+            outflow=amounts_from_text(pd.Series(["0"] * 3)),
+        )
+        months = batch.by_month()
+        assert list(months) == ["2024-11", "2024-12"]
+        assert [months[month].texts("Memo") for month in months] == [["b"], ["a", "c"]]
+
+
+class TestTransactionFilter:
+    def test_should_select_inclusive_date_range(self) -> None:
+        cut = TransactionFilter(since=date(2024, 11, 24), until=date(2024, 11, 24))
+        assert cut.apply({"main": make_batch()})["main"].texts("Memo") == ["bar"]
+
+    def test_should_select_accounts_ignoring_spaces_and_case(self) -> None:
+        cut = TransactionFilter(accounts=frozenset(["ch12 3456"]))
+        assert list(cut.apply({"CH123456": make_batch(), "CH99": make_batch()})) == ["CH123456"]
+
+    def test_should_return_empty_main_account_if_nothing_is_selected(self) -> None:
+        batches = TransactionFilter(accounts=frozenset(["CH99"])).apply({"CH12": make_batch()})
+        assert list(batches) == ["main"]
+        assert len(batches["main"]) == 0
+
+
+class TestRangeEnd:
+    @pytest.mark.parametrize(
+        ("days", "expected"),
+        [
+            ([1, 2, 3, 5, 6], [False, False, False, True, True]),
+            ([6, 5, 3, 2, 1], [False, False, False, False, True]),
+            ([1, 1, 5], [False, False, True]),
+        ],
+    )
+    def test_should_end_once_sorted_dates_leave_range(self, days: list[int], expected: list[bool]) -> None:
+        cut = RangeEnd(TransactionFilter(since=date(2024, 11, 2), until=date(2024, 11, 4)))
+        assert [cut(date(2024, 11, day)) for day in days] == expected
+
+    def test_should_never_end_unsorted_dates(self) -> None:
+        cut = RangeEnd(TransactionFilter(until=date(2024, 11, 4)))
+        assert not any(cut(date(2024, 11, day)) for day in [1, 3, 2, 5, 6])
+
+    def test_should_ignore_rows_without_date(self) -> None:
+        cut = RangeEnd(TransactionFilter(until=date(2024, 11, 4)))
+        assert [cut(day) for day in [date(2024, 11, 1), None, date(2024, 11, 5)]] == [False, False, True]
@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import pytest
+
+import ynabify.parser_registry
+from ynabify.parser.raiffeisen_csv import RaiffeisenCsv
+from ynabify.parser.swisscard_xlsx import SwisscardXlsx
+from ynabify.parser.ynab_xlsx import YnabXlsx
+from ynabify.parser_registry import open_parser, registered_parsers
+from ynabify.sniff import FileHeader, sniff_header
+
+
+class TestSniffHeader:
+    def test_should_read_csv_header(self) -> None:
+        header = sniff_header(Path("tests/data/raiffeisen_csv/example_bill.csv"))
+        assert header is not None
+        assert header.suffix == ".csv"
+        assert header.columns[:4] == ("IBAN", "Booked At", "Text", "Credit/Debit Amount")
+
+    def test_should_read_xlsx_header(self) -> None:
+        header = sniff_header(Path("tests/data/swisscard_xlsx/example_bill_en.xlsx"))
+        assert header is not None
+        assert "Transaction date" in header.columns
+
+    def test_should_return_no_columns_for_empty_files(self) -> None:
+        csv_header = sniff_header(Path("tests/data/raiffeisen_csv/empty_csv.csv"))
+        xlsx_header = sniff_header(Path("tests/data/swisscard_xlsx/empty_excel.xlsx"))
+        assert csv_header is not None
+        assert csv_header.columns == ()
+        assert xlsx_header is not None
+        assert xlsx_header.columns == ()
+
+    def test_should_reject_unknown_suffix(self) -> None:
+        assert sniff_header(Path("tests/data/empty_textfile.txt")) is None
+
+    def test_should_reject_nonexisting_path(self) -> None:
+        assert sniff_header(Path("foobar1234.csv")) is None
+
+    def test_should_reject_non_xlsx_content(self, tmp_path: Path) -> None:
+        path = tmp_path / "not_a_workbook.xlsx"
+        path.write_text("foo")
+        assert sniff_header(path) is None
+
+
+class TestOpenParser:
+    def test_should_register_all_parsers(self) -> None:
+        assert {RaiffeisenCsv, SwisscardXlsx, YnabXlsx} <= set(registered_parsers())
+
+    @pytest.mark.parametrize(
+        ("path", "parser_cls"),
+        [
+            ("tests/data/raiffeisen_csv/example_bill.csv", RaiffeisenCsv),
+            ("tests/data/swisscard_xlsx/example_bill_de.xlsx", SwisscardXlsx),
+            ("tests/data/swisscard_xlsx/example_bill_en.xlsx", SwisscardXlsx),
+            ("tests/data/ynab_xlsx/example_bill.xlsx", YnabXlsx),
+        ],
+    )
+    def test_should_detect_parser(self, path: str, parser_cls: type) -> None:
+        assert isinstance(open_parser(Path(path)), parser_cls)
+
+    def test_should_reject_textfile(self) -> None:
+        assert open_parser(Path("tests/data/empty_textfile.txt")) is None
+
+    def test_should_reject_missing_columns(self) -> None:
+        assert open_parser(Path("tests/data/swisscard_xlsx/empty_excel.xlsx")) is None
+
+    def test_should_sniff_header_once(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        calls: list[Path] = []
+
+        def counting_sniff_header(path: Path) -> FileHeader | None:
+            calls.append(path)
+            return sniff_header(path)
+
+        monkeypatch.setattr(ynabify.parser_registry, "sniff_header", counting_sniff_header)
+        open_parser(Path("tests/data/ynab_xlsx/example_bill.xlsx"))
+        assert len(calls) == 1
+
+    def test_should_not_read_files_with_unknown_suffix(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(ynabify.parser_registry, "sniff_header", pytest.fail)
+        assert open_parser(Path("tests/data/empty_textfile.txt")) is None
@@ -0,0 +1,167 @@
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import ynabify.payee_matcher
+from ynabify.payee_matcher import PayeeMatcher, load_matcher
+from ynabify.ynabify import replace_text
+
+text_from = ["ASDF QWER", "TYU", "RTYU", "hjkl", "jkl"]
+text_to = ["Asdf qwer", "turn you u", "Rty united", "Hosenjodel", "Jokel"]
+
+
+@pytest.fixture
+def matcher() -> PayeeMatcher:
+    return PayeeMatcher(text_from, text_to)
+
+
+class TestMatch:
+    def test_should_return_empty_string_without_match(self, matcher: PayeeMatcher) -> None:
+        assert matcher.match("VBNM, ZURICH") == ""
+
+    def test_should_ignore_case(self, matcher: PayeeMatcher) -> None:
+        assert matcher.match("asdf qwer, mountain view") == "Asdf qwer"
+        assert matcher.match("HJKL, MOUNTAIN VIEW") == "Hosenjodel"
+
+    def test_should_prefer_longest_match(self, matcher: PayeeMatcher) -> None:
+        assert matcher.match("TYU *, SWITZERLAND") == "turn you u"
+        assert matcher.match("RTYU, LLC, SAN FRANCISCO") == "Rty united"
+
+    def test_should_prefer_first_pattern_on_equal_length(self) -> None:
+        cut = PayeeMatcher(["foo", "bar"], ["Foo", "Bar"])
+        assert cut.match("bar foo") == "Foo"
+
+    def test_should_match_pattern_inside_failed_prefix(self) -> None:
+        cut = PayeeMatcher(["abcx", "bcd"], ["Abcx", "Bcd"])
+        assert cut.match("abcd") == "Bcd"
+
+    def test_should_agree_with_replace_text(self, matcher: PayeeMatcher) -> None:
+        memos = ["", "rtyu tyu", "xhjklx", "JKL", "asdf qwe", "ASDF QWERTYU"]
+        for memo in memos:
+            assert matcher.match(memo) == replace_text(memo, text_from, text_to)
+
+
+class TestMatchMany:
+    def test_should_match_every_string(self, matcher: PayeeMatcher) -> None:
+        assert matcher.match_many(["tyu", "nothing", "rtyu"]) == ["turn you u", "", "Rty united"]
+
+    def test_should_handle_empty_mapping(self) -> None:
+        assert PayeeMatcher([], []).match_many(["foo"]) == [""]
+
+
+class TestResolve:
+    def test_should_agree_with_match_many(self, matcher: PayeeMatcher) -> None:
+        memos = ["tyu", "nothing", "rtyu", "tyu"]
+        assert matcher.resolve(memos) == matcher.match_many(memos)
+
+    def test_should_match_each_memo_once(self, matcher: PayeeMatcher, monkeypatch: pytest.MonkeyPatch) -> None:
+        matcher.resolve(["tyu", "nothing"])
+        monkeypatch.setattr(matcher, "match", pytest.fail)
+        assert matcher.resolve(["nothing", "tyu"]) == ["", "turn you u"]
+
+    def test_should_forget_least_recently_resolved_memos(
+        self,
+        matcher: PayeeMatcher,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(ynabify.payee_matcher, "MEMO_CACHE_ENTRIES", 2)
+        matcher.resolve(["tyu", "rtyu"])
+        matcher.resolve(["tyu", "hjkl"])
+        assert list(matcher._resolved) == ["tyu", "hjkl"]  # noqa: SLF001
+
+
+class TestMemoCache:
+    def test_should_reuse_payees_of_earlier_runs(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        first = PayeeMatcher(text_from, text_to)
+        first.load_memo_cache(tmp_path)
+        first.resolve(["tyu", "nothing"])
+        first.save_memo_cache()
+
+        second = PayeeMatcher(text_from, text_to)
+        second.load_memo_cache(tmp_path)
+        monkeypatch.setattr(second, "match", pytest.fail)
+        assert second.resolve(["nothing", "tyu"]) == ["", "turn you u"]
+
+    def test_should_not_reuse_payees_of_other_mapping(self, tmp_path: Path) -> None:
+        first = PayeeMatcher(text_from, text_to)
+        first.load_memo_cache(tmp_path)
+        first.resolve(["tyu"])
+        first.save_memo_cache()
+
+        changed = PayeeMatcher(["TYU"], ["Changed"])
+        changed.load_memo_cache(tmp_path)
+        assert changed.resolve(["tyu"]) == ["Changed"]
+
+    def test_should_keep_entries_saved_by_others(self, tmp_path: Path) -> None:
+        first, second = PayeeMatcher(text_from, text_to), PayeeMatcher(text_from, text_to)
+        for cut, memo in [(first, "tyu"), (second, "hjkl")]:
+            cut.load_memo_cache(tmp_path)
+            cut.resolve([memo])
+        first.save_memo_cache()
+        second.save_memo_cache()
+
+        third = PayeeMatcher(text_from, text_to)
+        third.load_memo_cache(tmp_path)
+        assert set(third._resolved) == {"tyu", "hjkl"}  # noqa: SLF001
+
+    def test_should_ignore_corrupt_cache(self, tmp_path: Path) -> None:
+        cut = PayeeMatcher(text_from, text_to)
+        cut.load_memo_cache(tmp_path)
+        assert cut.memo_cache_path is not None
+        cut.memo_cache_path.write_text("{")
+        cut.load_memo_cache(tmp_path)
+        assert cut.resolve(["rtyu"]) == ["Rty united"]
+
+    def test_should_not_write_without_new_memos(self, tmp_path: Path) -> None:
+        cut = PayeeMatcher(text_from, text_to)
+        cut.load_memo_cache(tmp_path)
+        cut.save_memo_cache()
+        assert not list(tmp_path.glob("memos-*.json"))
+
+
+mapping_path = Path("tests/data/mapping_example.xlsx")
+
+
+class TestLoadMatcher:
+    def test_should_read_mapping(self) -> None:
+        cut = load_matcher(mapping_path)
+        assert cut.match("RTYU, LLC, SAN FRANCISCO") == "Rty united"
+
+    def test_should_write_cache(self, tmp_path: Path) -> None:
+        load_matcher(mapping_path, tmp_path)
+        assert len(list(tmp_path.glob("mapping-*.json"))) == 1
+
+    def test_should_load_from_cache_without_reading_workbook(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        load_matcher(mapping_path, tmp_path)
+        monkeypatch.setattr(ynabify.payee_matcher, "read_mapping", pytest.fail)
+        cut = load_matcher(mapping_path, tmp_path)
+        assert cut.match("TYU *, SWITZERLAND") == "turn you u"
+
+    def test_should_rebuild_cache_when_mapping_changes(self, tmp_path: Path) -> None:
+        changed_mapping_path = tmp_path / "mapping.xlsx"
+        shutil.copyfile(mapping_path, changed_mapping_path)
+        cache_dir = tmp_path / "cache"
+        assert load_matcher(changed_mapping_path, cache_dir).match("TYU") == "turn you u"
+
+        pd.DataFrame({"from": ["TYU"], "to": ["Changed"]}).to_excel(changed_mapping_path, index=False)
+        assert load_matcher(changed_mapping_path, cache_dir).match("TYU") == "Changed"
+        assert len(list(cache_dir.glob("mapping-*.json"))) == 2
+
+    def test_should_ignore_corrupt_cache(self, tmp_path: Path) -> None:
+        load_matcher(mapping_path, tmp_path)
+        for cache_path in tmp_path.glob("mapping-*.json"):
+            cache_path.write_text("{")
+        assert load_matcher(mapping_path, tmp_path).match("HJKL") == "Hosenjodelkormoranenlau"
+
+    def test_should_keep_memo_cache_next_to_mapping_cache(self, tmp_path: Path) -> None:
+        cut = load_matcher(mapping_path, tmp_path)
+        cut.resolve(["RTYU, LLC, SAN FRANCISCO"])
+        cut.save_memo_cache()
+        assert load_matcher(mapping_path, tmp_path).resolve(["RTYU, LLC, SAN FRANCISCO"]) == ["Rty united"]
+        assert len(list(tmp_path.glob("memos-*.json"))) == 1
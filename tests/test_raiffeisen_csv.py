@@ -1,3 +1,4 @@
+from datetime import date
 from decimal import Decimal
 from pathlib import Path
 
@@ -6,6 +7,7 @@ import pytest
 
 from ynabify.exceptions import ParseError
 from ynabify.parser.raiffeisen_csv import RaiffeisenCsv
+from ynabify.parser_base import TransactionFilter
 
 
 class TestCanParse:
@@ -84,3 +86,82 @@ class TestGetTransactions:
         assert not df.empty
         assert all(df["Inflow"] >= 0)
         assert all(df["Outflow"] >= 0)
+
+    def test_should_fold_continuation_rows_into_memo_in_file_order(self) -> None:
+        df = RaiffeisenCsv(example_path).get_transactions()["CH1234567890123456789"]
+        assert list(df["Memo"]) == [
+            "E-Banking Auftrag (Foobar) Jolanda Muster Mitglieder Sparkonto CH12 3456 7890 1234 5678 8, "
+            "Foobar CHF 2'000.00",
+            "Einkauf RISSV, FOO,  CHF 1.00",
+            "Einkauf REFLO  RESTAURANT T 23.12.2024, 12:22, Visa Debit-Nr. 987654xxxxxx1234",
+            "Gutschrift RISSV von MUSTER, JOLANDA, RICH COLLOSSI VENDING AG CHF 122.10",
+        ]
+
+    def test_should_split_amounts_by_sign(self) -> None:
+        df = RaiffeisenCsv(example_path).get_transactions()["CH1234567890123456789"]
+        assert list(df["Inflow"]) == [Decimal(2000), Decimal(0), Decimal(0), Decimal("122.10")]
+        assert list(df["Outflow"]) == [Decimal(0), Decimal(1), Decimal("15.5"), Decimal(0)]
+
+
+class TestIterChunks:
+    @pytest.mark.parametrize("chunksize", [1, 2, 3, 100])
+    def test_should_yield_same_transactions_as_get_transactions(self, chunksize: int) -> None:
+        cut = RaiffeisenCsv(example_path)
+        expected = cut.get_transactions()
+        chunks = list(cut.iter_chunks(chunksize))
+        for iban, df in expected.items():
+            streamed = pd.concat([chunk[iban] for chunk in chunks if iban in chunk], ignore_index=True)
+            pd.testing.assert_frame_equal(streamed, df)
+
+    def test_should_not_load_whole_file(self) -> None:
+        cut = RaiffeisenCsv(example_path)
+        list(cut.iter_chunks(2))
+        assert "_df" not in vars(cut)
+
+    def test_should_yield_empty_DataFrame(self) -> None:  # noqa: N802
+        chunks = list(RaiffeisenCsv(Path("tests/data/raiffeisen_csv/empty_bill.csv")).iter_chunks(2))
+        assert len(chunks) == 1
+        assert chunks[0]["main"].empty
+
+
+class TestIterTransactions:
+    def test_should_yield_records_of_get_transactions(self) -> None:
+        cut = RaiffeisenCsv(example_path)
+        records = list(cut.iter_transactions(chunksize=2))
+        expected = cut.get_transactions()
+        assert len(records) == sum(len(df) for df in expected.values())
+        iban, first = records[0]
+        row = expected[iban].iloc[0]
+        assert (first.date, first.memo, first.inflow, first.outflow) == (
+            row["Date"].date(),
+            row["Memo"],
+            row["Inflow"],
+            row["Outflow"],
+        )
+
+
+class TestSelection:
+    def test_should_skip_unselected_ibans(self) -> None:
+        cut = RaiffeisenCsv(
+            example_path, selection=TransactionFilter(accounts=frozenset(["CH12 3456 7890 1234 5678 8"]))
+        )
+        assert list(cut.get_batches()) == ["CH1234567890123456788"]
+
+    def test_should_keep_memos_of_selected_dates(self) -> None:
+        selection = TransactionFilter(since=date(2024, 11, 24), until=date(2024, 11, 27))
+        batches = RaiffeisenCsv(example_path, selection=selection).get_batches()
+        assert list(batches) == ["CH1234567890123456789"]
+        assert batches["CH1234567890123456789"].texts("Memo") == [
+            "Einkauf RISSV, FOO,  CHF 1.00",
+            "Einkauf REFLO  RESTAURANT T 23.12.2024, 12:22, Visa Debit-Nr. 987654xxxxxx1234",
+        ]
+
+    def test_should_select_in_chunks_like_at_once(self) -> None:
+        selection = TransactionFilter(since=date(2024, 11, 24))
+        cut = RaiffeisenCsv(example_path, selection=selection)
+        chunked = [memo for chunk in cut.iter_batches(2) for batch in chunk.values() for memo in batch.texts("Memo")]
+        assert chunked == [memo for batch in cut.get_batches().values() for memo in batch.texts("Memo")]
+
+    def test_should_return_empty_main_account_without_selected_rows(self) -> None:
+        cut = RaiffeisenCsv(example_path, selection=TransactionFilter(since=date(2025, 1, 1)))
+        assert {account: len(batch) for account, batch in cut.get_batches().items()} == {"main": 0}
@@ -0,0 +1,133 @@
+import asyncio
+import http.client
+import io
+import os
+import queue
+import shutil
+import socket
+import threading
+import zipfile
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+import ynabify
+from ynabify.serve import ConversionServer, file_names
+
+mapping_path = Path("tests/data/mapping_example.xlsx")
+raiffeisen_csv_example_path = Path("tests/data/raiffeisen_csv/example_bill.csv")
+swisscard_xlsx_example_path = Path("tests/data/swisscard_xlsx/example_bill_de.xlsx")
+
+
+@pytest.fixture(scope="module")
+def served_mapping(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    path = tmp_path_factory.mktemp("serve") / "mapping.xlsx"
+    shutil.copyfile(mapping_path, path)
+    return path
+
+
+@pytest.fixture(scope="module")
+def server(served_mapping: Path) -> Iterator[ConversionServer]:
+    cut = ConversionServer(served_mapping, workers=1, max_upload_bytes=2**20)
+    ports: queue.Queue[int] = queue.Queue()
+    thread = threading.Thread(target=asyncio.run, args=(cut.serve("127.0.0.1", 0, ports.put),))
+    thread.start()
+    cut.port = ports.get(timeout=60)  # type: ignore[attr-defined]
+    yield cut
+    cut.stop()
+    thread.join()
+
+
+@pytest.fixture
+def connection(server: ConversionServer) -> Iterator[http.client.HTTPConnection]:
+    connection = http.client.HTTPConnection("127.0.0.1", server.port, timeout=60)  # type: ignore[attr-defined]
+    yield connection
+    connection.close()
+
+
+def post(connection: http.client.HTTPConnection, path: str, body: bytes) -> http.client.HTTPResponse:
+    connection.request("POST", path, body)
+    return connection.getresponse()
+
+
+def unzip(data: bytes) -> dict[str, bytes]:
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+
+class TestFileNames:
+    def test_should_name_single_account_after_statement(self) -> None:
+        assert file_names("bill", {"CH1": "Savings"}) == {"CH1": "bill_ynab.csv"}
+
+    def test_should_add_account_names_for_several_accounts(self) -> None:
+        names = {"CH1": "Savings", "CH2": "CH2"}
+        assert file_names("bill", names) == {"CH1": "bill_ynab_Savings.csv", "CH2": "bill_ynab_CH2.csv"}
+
+
+class TestConvert:
+    @pytest.mark.parametrize("src_path", [raiffeisen_csv_example_path, swisscard_xlsx_example_path])
+    def test_should_return_csvs_of_api(self, connection: http.client.HTTPConnection, src_path: Path) -> None:
+        response = post(connection, f"/convert?name={src_path.name}", src_path.read_bytes())
+        assert response.status == 200
+        assert response.getheader("Content-Type") == "application/zip"
+        conversion = ynabify.convert(src_path, ynabify.load_matcher(mapping_path))
+        targets = file_names(src_path.stem, conversion.names)
+        expected = {targets[account]: csv for account, csv in conversion.to_csv().items()}
+        assert unzip(response.read()) == expected
+
+    def test_should_keep_connection_open(self, connection: http.client.HTTPConnection) -> None:
+        for _ in range(3):
+            response = post(connection, "/convert", raiffeisen_csv_example_path.read_bytes())
+            assert response.status == 200
+            response.read()
+        assert connection.sock is not None
+
+    def test_should_reject_unparseable_statement(self, connection: http.client.HTTPConnection) -> None:
+        response = post(connection, "/convert?name=broken.csv", b"foo")
+        assert response.status == 422
+        assert b"broken.csv" in response.read()
+
+    def test_should_reject_too_large_upload_before_reading_it(self, server: ConversionServer) -> None:
+        with socket.create_connection(("127.0.0.1", server.port), timeout=60) as sock:  # type: ignore[attr-defined]
+            sock.sendall(b"POST /convert HTTP/1.1\r\nContent-Length: 1048577\r\n\r\n")
+            assert sock.recv(4096).startswith(b"HTTP/1.1 413 ")
+
+    def test_should_use_changed_mapping(self, connection: http.client.HTTPConnection, served_mapping: Path) -> None:
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(mapping_path)
+        workbook.worksheets[0].append(["rissv", "Renamed by test"])
+        workbook.save(served_mapping)
+        stat = served_mapping.stat()
+        os.utime(served_mapping, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        try:
+            response = post(connection, "/convert", raiffeisen_csv_example_path.read_bytes())
+            assert any(b"Renamed by test" in csv for csv in unzip(response.read()).values())
+        finally:
+            shutil.copyfile(mapping_path, served_mapping)
+
+
+class TestEndpoints:
+    def test_should_answer_health(self, connection: http.client.HTTPConnection) -> None:
+        connection.request("GET", "/health")
+        assert connection.getresponse().read() == b"ok\n"
+
+    def test_should_report_requests_and_stages(self, connection: http.client.HTTPConnection) -> None:
+        post(connection, "/convert", raiffeisen_csv_example_path.read_bytes()).read()
+        connection.request("GET", "/metrics")
+        response = connection.getresponse()
+        text = response.read().decode()
+        assert response.status == 200
+        assert 'ynabify_requests_total{path="/convert",status="200"}' in text
+        assert 'ynabify_request_seconds_count{path="/convert"}' in text
+        assert 'ynabify_stage_rows_total{stage="payees"}' in text
+
+    def test_should_reject_unknown_path_and_method(self, connection: http.client.HTTPConnection) -> None:
+        connection.request("GET", "/nothing")
+        assert connection.getresponse().status == 404
+        connection.close()
+        connection.request("GET", "/convert")
+        response = connection.getresponse()
+        assert response.status == 405
+        assert response.getheader("Allow") == "POST"
@@ -1,11 +1,14 @@
-from decimal import Decimal
+from datetime import date
+from decimal import Decimal, InvalidOperation
 from pathlib import Path
 
+import openpyxl
 import pandas as pd
 import pytest
 
 from ynabify.exceptions import ParseError
 from ynabify.parser.swisscard_xlsx import SwisscardXlsx
+from ynabify.parser_base import TransactionFilter
 
 
 class TestCanParse:
@@ -107,3 +110,63 @@ class TestGetTransactions:
         assert "Memo" in df.columns
         assert "Inflow" in df.columns
         assert "Outflow" in df.columns
+
+    def test_should_only_return_posted_transactions_split_by_sign(self) -> None:
+        df = SwisscardXlsx(example_path_de).get_transactions()["main"]
+        assert list(df["Memo"]) == ["VBNM, ZURICH", "WERTWERT, SAN FRANCISCO", "IHRE ZAHLUNG – BESTEN DANK"]  # noqa: RUF001
+        assert list(df["Inflow"]) == [Decimal(0), Decimal(0), Decimal("1291.5")]
+        assert list(df["Outflow"]) == [Decimal("74.95"), Decimal("9.85"), Decimal(0)]
+        assert tuple(df.columns) == SwisscardXlsx.target_columns
+
+    @pytest.mark.parametrize("path", [example_path_de, Path("tests/data/swisscard_xlsx/example_bill_en.xlsx")])
+    def test_should_identify_account_by_card_number(self, path: Path) -> None:
+        cut = SwisscardXlsx(path)
+        cut.get_batches()
+        assert cut.account_id("main") == "1234 56**** *7890"
+
+    def test_should_identify_account_without_card_number_by_name(self, tmp_path: Path) -> None:
+        path = write_statement(tmp_path / "no_card.xlsx", [1], ["1"])
+        assert SwisscardXlsx(path).account_id("main") == "main"
+
+
+def write_statement(path: Path, days: list[int], amounts: list[str]) -> Path:
+    workbook = openpyxl.Workbook()
+    workbook.active.append(["Transaktionsdatum", "Beschreibung", "Betrag", "Status"])
+    for day, amount in zip(days, amounts, strict=True):
+        workbook.active.append([date(2024, 11, day), f"shop {day}", amount, "Gebucht"])
+    workbook.save(path)
+    return path
+
+
+class TestSelection:
+    def test_should_select_dates_of_example(self) -> None:
+        cut = SwisscardXlsx(example_path_de, selection=TransactionFilter(since=date(2024, 4, 1)))
+        assert cut.get_batches()["main"].texts("Memo") == ["VBNM, ZURICH", "WERTWERT, SAN FRANCISCO"]
+
+    def test_should_skip_rows_of_sorted_sheet_after_range(self, tmp_path: Path) -> None:
+        # The malformed amount after the range would fail parsing if it were read.
+        path = write_statement(tmp_path / "sorted.xlsx", [1, 2, 3, 4], ["1", "2", "3", "broken"])
+        cut = SwisscardXlsx(path, selection=TransactionFilter(since=date(2024, 11, 2), until=date(2024, 11, 2)))
+        assert cut.get_batches()["main"].texts("Memo") == ["shop 2"]
+
+    def test_should_keep_row_out_of_order_after_range(self, tmp_path: Path) -> None:
+        path = write_statement(tmp_path / "late.xlsx", [20, 15, 8, 12], ["1", "2", "3", "4"])
+        cut = SwisscardXlsx(path, selection=TransactionFilter(since=date(2024, 11, 10)))
+        assert cut.get_batches()["main"].texts("Memo") == ["shop 20", "shop 15", "shop 12"]
+
+    def test_should_read_unsorted_sheet_completely(self, tmp_path: Path) -> None:
+        path = write_statement(tmp_path / "unsorted.xlsx", [2, 1, 3, 1], ["1", "2", "3", "4"])
+        cut = SwisscardXlsx(path, selection=TransactionFilter(until=date(2024, 11, 2)))
+        assert cut.get_batches()["main"].texts("Memo") == ["shop 2", "shop 1", "shop 1"]
+
+    def test_should_yield_chunks_before_reading_the_rest(self, tmp_path: Path) -> None:
+        path = write_statement(tmp_path / "statement.xlsx", [1, 2, 3], ["1", "2", "broken"])
+        chunks = SwisscardXlsx(path).iter_batches(2)
+        assert next(chunks)["main"].texts("Memo") == ["shop 1", "shop 2"]
+        with pytest.raises(InvalidOperation):
+            next(chunks)
+
+    def test_should_skip_reading_unselected_account(self) -> None:
+        cut = SwisscardXlsx(example_path_de, selection=TransactionFilter(accounts=frozenset(["CH12"])))
+        assert len(cut._df) == 0  # noqa: SLF001
+        assert len(cut.get_batches()["main"]) == 0
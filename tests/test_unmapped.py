@@ -0,0 +1,95 @@
+import csv
+import logging
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from ynabify.parser_base import ParsedStatement, TransactionBatch, amounts_from_text
+from ynabify.payee_matcher import PayeeMatcher
+from ynabify.unmapped import TrigramIndex, group_key, suggested_pattern, unmapped_report
+from ynabify.ynabify import main
+
+mapping_path = Path("tests/data/mapping_example.xlsx")
+raiffeisen_csv_example_path = Path("tests/data/raiffeisen_csv/example_bill.csv")
+
+
+def statement(memos: list[str], outflows: list[str]) -> ParsedStatement:
+    batch = TransactionBatch.from_columns(
+        dates=pd.to_datetime(["2024-11-23"] * len(memos)),
+        memos=memos,
+        inflow=amounts_from_text(pd.Series(["0"] * len(memos))),
+        outflow=amounts_from_text(pd.Series(outflows)),
+    )
+    return ParsedStatement("Test", {"main": batch})
+
+
+class TestTrigramIndex:
+    def test_should_find_patterns_mostly_contained_in_text(self) -> None:
+        cut = TrigramIndex(["COOP-PRONTO", "Migros", "Bahnhof Kiosk"])
+        assert [i for i, _ in cut.closest("COOP PRONTO WIL")] == [0]
+
+    def test_should_rank_by_share_of_trigrams_found(self) -> None:
+        cut = TrigramIndex(["migros bhf", "migros"])
+        (first, first_similarity), (second, second_similarity) = cut.closest("MIGROS BAHNHOF")
+        assert (first, second) == (1, 0)
+        assert first_similarity == 1.0
+        assert 0.5 <= second_similarity < 1.0  # noqa: PLR2004 - MIN_SIMILARITY
+
+    def test_should_skip_dissimilar_patterns(self) -> None:
+        assert TrigramIndex(["Zalando"]).closest("COOP PRONTO") == []
+
+
+class TestGrouping:
+    def test_should_group_memos_differing_in_numbers_case_and_spacing(self) -> None:
+        assert group_key("TWINT *Coop 1234  Zürich 23.11.2024") == group_key("twint *coop 987 zürich 24.11.2024")
+
+    def test_should_keep_different_merchants_apart(self) -> None:
+        assert group_key("TWINT *Coop Zürich") != group_key("TWINT *Migros Zürich")
+
+    @pytest.mark.parametrize(
+        ("memos", "expected"),
+        [
+            (["TWINT *Coop 1234 Zürich", "TWINT *Coop 987 Zürich"], "TWINT *Coop"),
+            (["COOP PRONTO WIL", "Coop Pronto Winterthur"], "COOP PRONTO"),
+            (["ZUHO, SAN FRANCISCO"], "ZUHO, SAN FRANCISCO"),
+            (["12345"], "12345"),
+        ],
+    )
+    def test_should_suggest_shared_words_before_first_number(self, memos: list[str], expected: str) -> None:
+        assert suggested_pattern(memos) == expected
+
+
+class TestUnmappedReport:
+    def test_should_rank_unmatched_groups_by_count_then_amount(self) -> None:
+        matcher = PayeeMatcher(["rissv", "coop-pronto"], ["Rissv", "Coop"])
+        memos = ["Einkauf RISSV", "COOP PRONTO 1", "COOP PRONTO 2", "Kiosk", "Bakery", "Bakery"]
+        report = unmapped_report([statement(memos, ["1", "2", "3", "50", "1", "1.5"])], matcher)
+        assert [(group.memo, group.count, group.amount) for group in report] == [
+            ("COOP PRONTO 1", 2, 500),
+            ("Bakery", 2, 250),
+            ("Kiosk", 1, 5000),
+        ]
+        assert report[0].pattern == "COOP PRONTO"
+        assert [(text_from, text_to) for text_from, text_to, _ in report[0].suggestions] == [("coop-pronto", "Coop")]
+
+    def test_should_count_across_statements_and_limit_groups(self) -> None:
+        matcher = PayeeMatcher([], [])
+        statements = [statement(["A", "B"], ["1", "1"]), statement(["A"], ["1"])]
+        report = unmapped_report(statements, matcher, top=1)
+        assert [(group.memo, group.count) for group in report] == [("A", 2)]
+
+
+class TestMain:
+    def test_should_write_report(self, tmp_path: Path) -> None:
+        report_path = tmp_path / "report.csv"
+        main(["unmapped", str(raiffeisen_csv_example_path), "-m", str(mapping_path), "-o", str(report_path)])
+        with report_path.open(encoding="utf_8", newline="") as f:
+            rows = list(csv.DictReader(f))
+        assert rows
+        assert {"Count", "Amount", "Memo", "Pattern", "Closest mapping entries"} <= set(rows[0])
+
+    def test_should_log_report(self, caplog: pytest.LogCaptureFixture) -> None:
+        with caplog.at_level(logging.INFO, logger="ynabify.unmapped"):
+            main(["unmapped", str(raiffeisen_csv_example_path), "-m", str(mapping_path)])
+        assert "pattern:" in caplog.text
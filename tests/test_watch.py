@@ -0,0 +1,174 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+import openpyxl
+import pytest
+
+from ynabify.watch import Watcher
+from ynabify.ynabify import ConvertOptions
+
+swisscard_xlsx_example_path = Path("tests/data/swisscard_xlsx/example_bill_de.xlsx").resolve()
+mapping_path = Path("tests/data/mapping_example.xlsx").resolve()
+
+
+@pytest.fixture
+def watch_dir(tmp_path: Path) -> Path:
+    directory = tmp_path / "downloads"
+    directory.mkdir()
+    return directory
+
+
+@pytest.fixture
+def watcher(watch_dir: Path) -> Watcher:
+    return Watcher(watch_dir, mapping_path, ConvertOptions(), settle=1.0)
+
+
+class TestPollOnce:
+    def test_should_ignore_files_present_at_start(self, watch_dir: Path) -> None:
+        shutil.copyfile(swisscard_xlsx_example_path, watch_dir / "old.xlsx")
+        cut = Watcher(watch_dir, mapping_path, ConvertOptions(), settle=0)
+        assert cut.poll_once() == []
+
+    def test_should_convert_new_file_once_settled(self, watcher: Watcher, watch_dir: Path) -> None:
+        shutil.copyfile(swisscard_xlsx_example_path, watch_dir / "new.xlsx")
+        assert watcher.poll_once(now=0.0) == []
+        results = watcher.poll_once(now=1.0)
+        assert [result.outputs for result in results] == [[watch_dir / "new_ynab.csv"]]
+        assert (watch_dir / "new_ynab.csv").exists()
+
+    def test_should_convert_file_only_once(self, watcher: Watcher, watch_dir: Path) -> None:
+        shutil.copyfile(swisscard_xlsx_example_path, watch_dir / "new.xlsx")
+        watcher.poll_once(now=0.0)
+        watcher.poll_once(now=1.0)
+        assert watcher.poll_once(now=2.0) == []
+
+    def test_should_wait_while_file_is_written(self, watcher: Watcher, watch_dir: Path) -> None:
+        path = watch_dir / "new.xlsx"
+        path.write_bytes(swisscard_xlsx_example_path.read_bytes()[:100])
+        watcher.poll_once(now=0.0)
+        shutil.copyfile(swisscard_xlsx_example_path, path)
+        assert watcher.poll_once(now=1.0) == []
+        assert len(watcher.poll_once(now=2.0)) == 1
+
+    def test_should_report_unparseable_file(self, watcher: Watcher, watch_dir: Path) -> None:
+        (watch_dir / "broken.xlsx").write_text("foo")
+        watcher.poll_once(now=0.0)
+        (result,) = watcher.poll_once(now=1.0)
+        assert result.error is not None
+
+    def test_should_retry_locked_output(
+        self,
+        watcher: Watcher,
+        watch_dir: Path,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        real_replace = os.replace
+        is_locked = True
+
+        def replace(src: Path, dst: Path) -> None:
+            if is_locked and Path(dst).suffix == ".csv":
+                raise PermissionError(dst)
+            real_replace(src, dst)
+
+        monkeypatch.setattr(os, "replace", replace)
+        shutil.copyfile(swisscard_xlsx_example_path, watch_dir / "new.xlsx")
+        watcher.poll_once(now=0.0)
+        watcher.poll_once(now=1.0)
+        assert not (watch_dir / "new_ynab.csv").exists()
+        assert not watcher.is_idle
+
+        is_locked = False
+        watcher.poll_once(now=2.0)
+        assert (watch_dir / "new_ynab.csv").exists()
+        assert watcher.is_idle
+
+    def test_should_record_locked_output_once_in_place(
+        self,
+        watch_dir: Path,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        ledger_path = tmp_path / "ledger.sqlite3"
+        cut = Watcher(watch_dir, mapping_path, ConvertOptions(ledger_path=ledger_path), settle=1.0)
+        real_replace = os.replace
+        is_locked = True
+
+        def replace(src: Path, dst: Path) -> None:
+            if is_locked and Path(dst).suffix == ".csv":
+                raise PermissionError(dst)
+            real_replace(src, dst)
+
+        def n_recorded() -> int:
+            with sqlite3.connect(ledger_path) as connection:
+                return connection.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+        monkeypatch.setattr(os, "replace", replace)
+        shutil.copyfile(swisscard_xlsx_example_path, watch_dir / "new.xlsx")
+        cut.poll_once(now=0.0)
+        cut.poll_once(now=1.0)
+        assert n_recorded() == 0
+
+        is_locked = False
+        cut.poll_once(now=2.0)
+        assert (watch_dir / "new_ynab.csv").exists()
+        assert n_recorded() == 3
+
+    def test_should_record_only_newest_conversion_of_locked_output(
+        self,
+        watch_dir: Path,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        ledger_path = tmp_path / "ledger.sqlite3"
+        cut = Watcher(watch_dir, mapping_path, ConvertOptions(ledger_path=ledger_path), settle=1.0)
+        real_replace = os.replace
+        is_locked = True
+
+        def replace(src: Path, dst: Path) -> None:
+            if is_locked and Path(dst).suffix == ".csv":
+                raise PermissionError(dst)
+            real_replace(src, dst)
+
+        monkeypatch.setattr(os, "replace", replace)
+        src_path = watch_dir / "new.xlsx"
+        shutil.copyfile(swisscard_xlsx_example_path, src_path)
+        cut.poll_once(now=0.0)
+        cut.poll_once(now=1.0)
+
+        # Downloaded again while the output is still locked, now with a single transaction.
+        workbook = openpyxl.Workbook()
+        workbook.active.append(["Transaktionsdatum", "Beschreibung", "Betrag", "Status"])
+        workbook.active.append([date(2024, 11, 1), "shop", "1", "Gebucht"])
+        workbook.save(src_path)
+        os.utime(src_path, ns=(0, 1))
+        cut.poll_once(now=2.0)
+        cut.poll_once(now=3.0)
+        assert len(list(watch_dir.glob("*.part"))) == 1
+
+        is_locked = False
+        cut.poll_once(now=4.0)
+        assert (watch_dir / "new_ynab.csv").read_text(encoding="utf_8_sig").count("shop") == 1
+        with sqlite3.connect(ledger_path) as connection:
+            assert connection.execute("SELECT memo FROM transactions").fetchall() == [("shop",)]
+
+
+class TestRun:
+    def test_should_convert_while_running(self, watch_dir: Path) -> None:
+        cut = Watcher(watch_dir, mapping_path, ConvertOptions(), settle=0.05, interval=0.05)
+        stop = threading.Event()
+        thread = threading.Thread(target=cut.run, args=(stop,))
+        thread.start()
+        try:
+            shutil.copyfile(swisscard_xlsx_example_path, watch_dir / "new.xlsx")
+            deadline = time.monotonic() + 10
+            while not (watch_dir / "new_ynab.csv").exists() and time.monotonic() < deadline:
+                time.sleep(0.05)
+        finally:
+            stop.set()
+            thread.join()
+        assert (watch_dir / "new_ynab.csv").exists()
@@ -0,0 +1,182 @@
+import csv
+import io
+import os
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import ynabify.writer
+from ynabify.exceptions import WriteError
+from ynabify.parser_base import TransactionBatch, amounts_from_text
+from ynabify.writer import AccountCsvWriter, csv_blocks, quote
+
+batch = TransactionBatch.from_columns(
+    dates=pd.to_datetime(["2024-11-23", "2024-11-24"]),
+    memos=["foo bar", "baz"],
+    inflow=(np.array([100, 0]), np.array([0, 0])),
+    outflow=(np.array([0, 250]), np.array([0, 1])),
+    payees=["Foo", ""],
+)
+
+
+@pytest.fixture
+def out_file_base(tmp_path: Path) -> Path:
+    return tmp_path / "statement_ynab.csv"
+
+
+class TestAccountCsvWriter:
+    def test_should_write_single_account_to_base_name(self, out_file_base: Path) -> None:
+        cut = AccountCsvWriter(out_file_base)
+        cut.write("CH1", "Savings", batch)
+        assert cut.close() == [out_file_base]
+        assert sorted(p.name for p in out_file_base.parent.iterdir()) == ["statement_ynab.csv"]
+
+    def test_should_write_one_file_per_account(self, out_file_base: Path) -> None:
+        cut = AccountCsvWriter(out_file_base)
+        cut.write("CH1", "Savings", batch)
+        cut.write("CH2", "Private", batch)
+        outputs = cut.close()
+        assert [p.name for p in outputs] == ["statement_ynab_Savings.csv", "statement_ynab_Private.csv"]
+
+    def test_should_append_month_to_file_names(self, out_file_base: Path) -> None:
+        cut = AccountCsvWriter(out_file_base)
+        cut.write("CH1", "Savings", batch, "2024-11")
+        cut.write("CH1", "Savings", batch, "2024-12")
+        assert [p.name for p in cut.close()] == ["statement_ynab_2024-11.csv", "statement_ynab_2024-12.csv"]
+
+    def test_should_append_account_name_and_month(self, out_file_base: Path) -> None:
+        cut = AccountCsvWriter(out_file_base)
+        cut.write("CH1", "Savings", batch, "2024-11")
+        cut.write("CH2", "Private", batch, "2024-11")
+        assert [p.name for p in cut.close()] == [
+            "statement_ynab_Savings_2024-11.csv",
+            "statement_ynab_Private_2024-11.csv",
+        ]
+
+    def test_should_append_chunks_with_one_header(self, out_file_base: Path) -> None:
+        cut = AccountCsvWriter(out_file_base)
+        cut.write("CH1", "Savings", batch)
+        cut.write("CH1", "Savings", batch)
+        cut.close()
+        text = out_file_base.read_text(encoding="utf_8_sig")
+        assert text.count("Date,Payee,Memo,Inflow,Outflow") == 1
+        assert text.count("2024-11-23,Foo,foo bar,1,0") == 2
+        assert out_file_base.read_bytes().count(b"\xef\xbb\xbf") == 1
+
+    def test_should_write_amounts_as_exported(self, out_file_base: Path) -> None:
+        cut = AccountCsvWriter(out_file_base)
+        cut.write("CH1", "Savings", batch)
+        cut.close()
+        assert out_file_base.read_text(encoding="utf_8_sig").splitlines()[2] == "2024-11-24,,baz,0,2.5"
+
+    def test_should_not_leave_files_behind_on_abort(self, out_file_base: Path) -> None:
+        cut = AccountCsvWriter(out_file_base)
+        cut.write("CH1", "Savings", batch)
+        cut.abort()
+        assert not list(out_file_base.parent.iterdir())
+
+    def test_should_only_create_destination_on_close(self, out_file_base: Path) -> None:
+        cut = AccountCsvWriter(out_file_base)
+        cut.write("CH1", "Savings", batch)
+        assert not out_file_base.exists()
+        cut.close()
+        assert [p.name for p in out_file_base.parent.iterdir()] == ["statement_ynab.csv"]
+
+    def test_should_keep_chunks_of_an_account_in_order(self, out_file_base: Path) -> None:
+        cut = AccountCsvWriter(out_file_base)
+        memos = [f"memo {i}" for i in range(50)]
+        for memo in memos:
+            chunk = TransactionBatch.from_columns(
+                dates=pd.to_datetime(["2024-11-23"]),
+                memos=[memo],
+                inflow=amounts_from_text(pd.Series(["1"])),
+                outflow=amounts_from_text(pd.Series(["0"])),
+            )
+            cut.write("CH1", "Savings", chunk)
+        cut.close()
+        rows = out_file_base.read_text(encoding="utf_8_sig").splitlines()[1:]
+        assert [row.split(",")[2] for row in rows] == memos
+
+    def test_should_not_let_locked_account_delay_others(
+        self,
+        out_file_base: Path,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        # Savings stays locked until Private is in place, which never happens if accounts are closed one by one.
+        savings_path = out_file_base.with_name("statement_ynab_Savings.csv")
+        private_path = out_file_base.with_name("statement_ynab_Private.csv")
+        real_replace = os.replace
+
+        def replace(src: Path, dst: Path) -> None:
+            if Path(dst) == savings_path and not private_path.exists():
+                raise PermissionError(dst)
+            real_replace(src, dst)
+
+        monkeypatch.setattr(ynabify.writer.os, "replace", replace)
+        real_sleep = time.sleep
+        monkeypatch.setattr(ynabify.writer.time, "sleep", lambda _: real_sleep(0.01))
+        cut = AccountCsvWriter(out_file_base)
+        cut.write("CH1", "Savings", batch)
+        cut.write("CH2", "Private", batch)
+        assert cut.close() == [savings_path, private_path]
+
+    def test_should_raise_for_destination_that_stays_locked(
+        self,
+        out_file_base: Path,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        def replace(_src: Path, dst: Path) -> None:
+            raise PermissionError(dst)
+
+        monkeypatch.setattr(ynabify.writer.os, "replace", replace)
+        monkeypatch.setattr(ynabify.writer.time, "sleep", lambda _: None)
+        cut = AccountCsvWriter(out_file_base)
+        cut.write("CH1", "Savings", batch)
+        with pytest.raises(WriteError, match="CH1: PermissionError") as excinfo:
+            cut.close()
+        assert excinfo.value.outputs == []
+        assert cut.written == []
+        assert not list(out_file_base.parent.iterdir())
+
+    def test_should_collect_errors_per_account(self, out_file_base: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        broken = TransactionBatch.from_columns(
+            dates=pd.to_datetime(["2024-11-23"]),
+            memos=["broken"],
+            inflow=amounts_from_text(pd.Series(["1"])),
+            outflow=amounts_from_text(pd.Series(["0"])),
+        )
+        real_csv_blocks = csv_blocks
+
+        def failing_csv_blocks(chunk: TransactionBatch) -> Iterator[str]:
+            if chunk is broken:
+                message = "disk full"
+                raise OSError(message)
+            return real_csv_blocks(chunk)
+
+        monkeypatch.setattr(ynabify.writer, "csv_blocks", failing_csv_blocks)
+        cut = AccountCsvWriter(out_file_base)
+        cut.write("CH1", "Savings", batch)
+        cut.write("CH2", "Private", broken)
+        cut.write("CH2", "Private", batch)
+        with pytest.raises(WriteError, match="CH2: OSError: disk full") as excinfo:
+            cut.close()
+        assert list(excinfo.value.errors) == ["CH2"]
+        assert [p.name for p in excinfo.value.outputs] == ["statement_ynab_Savings.csv"]
+        assert sorted(p.name for p in out_file_base.parent.iterdir()) == ["statement_ynab_Savings.csv"]
+        assert cut.written == [("CH1", None)]
+
+
+class TestCsvBlocks:
+    def test_should_split_rows_into_blocks(self) -> None:
+        blocks = list(csv_blocks(batch, block_rows=1))
+        assert blocks == [f"2024-11-23,Foo,foo bar,1,0{os.linesep}", f"2024-11-24,,baz,0,2.5{os.linesep}"]
+
+    @pytest.mark.parametrize("text", ["plain", "a, b", 'say "hi"', "two\nlines", " spaced ", ""])
+    def test_should_quote_like_csv_module(self, text: str) -> None:
+        expected = io.StringIO()
+        csv.writer(expected, lineterminator="\n").writerow([text, ""])
+        assert f"{quote(text)},\n" == expected.getvalue()
@@ -0,0 +1,123 @@
+from datetime import date
+from pathlib import Path
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from ynabify import xlsx_reader
+from ynabify.parser_base import TransactionFilter
+from ynabify.sniff import StatementBytes, sniff_header
+from ynabify.xlsx_reader import date_range_skip, first_row, iter_xlsx, read_xlsx
+
+swisscard_xlsx_example_path = Path("tests/data/swisscard_xlsx/example_bill_de.xlsx")
+
+
+@pytest.fixture(params=["calamine", "openpyxl"], autouse=True)
+def backend(request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch) -> str:
+    if request.param == "calamine":
+        pytest.importorskip("python_calamine")
+    monkeypatch.setenv(xlsx_reader.BACKEND_ENV_VAR, request.param)
+    return request.param
+
+
+def write_workbook(path: Path, rows: list[tuple]) -> Path:
+    workbook = openpyxl.Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    workbook.save(path)
+    return path
+
+
+class TestReadXlsx:
+    def test_should_read_like_read_excel(self) -> None:
+        columns = ["Transaktionsdatum", "Beschreibung", "Betrag", "Status"]
+        expected = pd.read_excel(swisscard_xlsx_example_path, dtype=str, usecols=columns)
+        df = read_xlsx(swisscard_xlsx_example_path, columns, as_text=True)
+        assert df.fillna("").to_dict("list") == expected.fillna("").to_dict("list")
+
+    def test_should_read_only_requested_columns_in_order(self, tmp_path: Path) -> None:
+        path = write_workbook(tmp_path / "book.xlsx", [("a", "b", "c"), (1, 2.5, "x")])
+        df = read_xlsx(path, ["c", "a"])
+        assert list(df.columns) == ["c", "a"]
+        assert df.to_dict("list") == {"c": ["x"], "a": [1]}
+
+    def test_should_normalize_cells(self, tmp_path: Path) -> None:
+        rows = [("date", "amount", "text"), (date(2024, 11, 23), 40.0, ""), (date(2024, 11, 24), 12.5, "x")]
+        path = write_workbook(tmp_path / "book.xlsx", rows)
+        df = read_xlsx(path, ["date", "amount", "text"], as_text=True)
+        assert df["date"].tolist() == ["2024-11-23 00:00:00", "2024-11-24 00:00:00"]
+        assert df["amount"].tolist() == ["40", "12.5"]
+        assert df["text"].isna().tolist() == [True, False]
+
+    def test_should_drop_trailing_blank_rows(self, tmp_path: Path) -> None:
+        path = write_workbook(tmp_path / "book.xlsx", [("a", "b"), (1, None), (None, None), (2, None), (None, None)])
+        assert read_xlsx(path, ["a", "b"])["a"].notna().tolist() == [True, False, True]
+
+    def test_should_raise_for_missing_column(self, tmp_path: Path) -> None:
+        path = write_workbook(tmp_path / "book.xlsx", [("a", "b")])
+        with pytest.raises(KeyError, match="c"):
+            read_xlsx(path, ["a", "c"])
+
+    def test_should_read_content_in_memory(self) -> None:
+        columns = ["Beschreibung", "Betrag"]
+        from_bytes = read_xlsx(StatementBytes(swisscard_xlsx_example_path.read_bytes()), columns)
+        pd.testing.assert_frame_equal(from_bytes, read_xlsx(swisscard_xlsx_example_path, columns))
+
+    def test_should_reread_workbook_changed_after_sniffing(self, tmp_path: Path) -> None:
+        path = write_workbook(tmp_path / "book.xlsx", [("a",), ("old",)])
+        assert first_row(path) == ("a",)
+        write_workbook(path, [("a",), ("new",), ("rows",)])
+        assert read_xlsx(path, ["a"])["a"].tolist() == ["new", "rows"]
+
+    def test_should_reuse_sheet_loaded_while_sniffing(self, backend: str, monkeypatch: pytest.MonkeyPatch) -> None:
+        columns = ["Beschreibung", "Betrag"]
+        expected = read_xlsx(swisscard_xlsx_example_path, columns)
+        header = sniff_header(swisscard_xlsx_example_path)
+        assert header is not None
+        assert (header.sheet is not None) == (backend == "calamine")
+        if backend == "calamine":
+            monkeypatch.setattr(xlsx_reader, "load_sheet", lambda _path: pytest.fail("sheet loaded again"))
+        pd.testing.assert_frame_equal(read_xlsx(swisscard_xlsx_example_path, columns, header=header), expected)
+        assert header.sheet is None
+
+    def test_should_skip_rows_past_end_of_sorted_dates(self, tmp_path: Path) -> None:
+        rows = [("Datum", "Betrag"), ("01.11.2024", 1), ("02.11.2024", 2), ("03.11.2024", 3), ("not a date", 4)]
+        path = write_workbook(tmp_path / "book.xlsx", rows)
+        skip = date_range_skip(TransactionFilter(until=date(2024, 11, 2)))
+        assert read_xlsx(path, ["Datum", "Betrag"], as_text=True, skip=skip)["Betrag"].tolist() == ["1", "2", "4"]
+
+    def test_should_read_on_past_end_of_range(self, tmp_path: Path) -> None:
+        days = ["10.11.2024", "05.11.2024", "28.10.2024", "02.11.2024"]
+        path = write_workbook(tmp_path / "book.xlsx", [("Datum", "Betrag"), *((day, i) for i, day in enumerate(days))])
+        skip = date_range_skip(TransactionFilter(since=date(2024, 11, 1)))
+        assert read_xlsx(path, ["Datum", "Betrag"], as_text=True, skip=skip)["Datum"].tolist() == [
+            "10.11.2024",
+            "05.11.2024",
+            "02.11.2024",
+        ]
+
+
+class TestIterXlsx:
+    def test_should_yield_chunks_of_read_xlsx(self, tmp_path: Path) -> None:
+        path = write_workbook(tmp_path / "book.xlsx", [("a", "b"), *((i, f"row {i}") for i in range(5))])
+        chunks = list(iter_xlsx(path, ["a", "b"], 2))
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+        pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), read_xlsx(path, ["a", "b"]))
+
+    def test_should_keep_inner_and_drop_trailing_blank_rows(self, tmp_path: Path) -> None:
+        path = write_workbook(tmp_path / "book.xlsx", [("a",), ("x",), (None,), ("y",), (None,), (None,)])
+        assert [chunk["a"].notna().tolist() for chunk in iter_xlsx(path, ["a"], 1)] == [[True], [False, True]]
+
+    def test_should_yield_one_empty_frame_for_empty_sheet(self, tmp_path: Path) -> None:
+        path = write_workbook(tmp_path / "book.xlsx", [("a",)])
+        (chunk,) = iter_xlsx(path, ["a"], 10)
+        assert chunk.empty
+        assert list(chunk.columns) == ["a"]
+
+
+class TestFallback:
+    def test_should_fall_back_to_openpyxl_without_calamine(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.delenv(xlsx_reader.BACKEND_ENV_VAR)
+        monkeypatch.setattr(xlsx_reader, "_calamine", lambda: None)
+        assert first_row(swisscard_xlsx_example_path)[:2] == ("Transaktionsdatum", "Beschreibung")
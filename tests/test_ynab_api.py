@@ -0,0 +1,160 @@
+import json
+import threading
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import ynabify
+from ynabify.exceptions import ExportError
+from ynabify.ledger import fingerprints
+from ynabify.parser_base import TransactionBatch, amounts_from_text
+from ynabify.ynab_api import ExportOptions, YnabApiWriter, YnabClient, import_id, transactions
+from ynabify.ynabify import main
+
+mapping_path = Path("tests/data/mapping_example.xlsx")
+raiffeisen_csv_example_path = Path("tests/data/raiffeisen_csv/example_bill.csv")
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Records the posted transactions and answers with the scripted statuses first, then with 201."""
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.requests: list[dict] = []
+        self.client_ports: set[int] = set()
+        self.statuses: list[int] = []
+        self.import_ids: set[str] = set()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StandInServer
+
+    def do_POST(self) -> None:  # noqa: N802 - name required by BaseHTTPRequestHandler
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        status = self.server.statuses.pop(0) if self.server.statuses else 201
+        if status == 201:
+            self.server.client_ports.add(self.client_address[1])
+            request = {"path": self.path, "authorization": self.headers["Authorization"], **json.loads(body)}
+            self.server.requests.append(request)
+            ids = [transaction["import_id"] for transaction in request["transactions"]]
+            duplicates = [i for i in ids if i in self.server.import_ids]
+            self.server.import_ids.update(ids)
+            data = json.dumps({"data": {"duplicate_import_ids": duplicates}}).encode()
+        else:
+            data = b'{"error": {"detail": "scripted"}}'
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002 - signature of the base class
+        pass
+
+
+@pytest.fixture
+def server() -> Iterator[StandInServer]:
+    server = StandInServer()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def make_batch(memos: list[str], inflows: list[str], outflows: list[str]) -> TransactionBatch:
+    return TransactionBatch.from_columns(
+        dates=pd.to_datetime(["2024-11-23"] * len(memos)),
+        memos=memos,
+        inflow=amounts_from_text(pd.Series(inflows)),
+        outflow=amounts_from_text(pd.Series(outflows)),
+    )
+
+
+def posted(server: StandInServer) -> list[dict]:
+    return [transaction for request in server.requests for transaction in request["transactions"]]
+
+
+class TestTransactions:
+    def test_should_convert_amounts_to_milliunits(self) -> None:
+        batch = make_batch(["in", "out"], ["15.5", "0"], ["0", "122.10"])
+        result = transactions("acct", batch, fingerprints("acct", batch))
+        assert [t["amount"] for t in result] == [15_500, -122_100]
+        assert [t["date"] for t in result] == ["2024-11-23", "2024-11-23"]
+        assert result[0]["account_id"] == "acct"
+
+    def test_should_derive_distinct_import_ids_for_identical_transactions(self) -> None:
+        batch = make_batch(["coffee", "coffee"], ["0", "0"], ["4.5", "4.5"])
+        ids = [str(t["import_id"]) for t in transactions("acct", batch, fingerprints("acct", batch))]
+        assert len(set(ids)) == 2
+        assert all(len(i) == 36 and i.startswith("ynabify:") for i in ids)  # noqa: PLR2004 - YNAB limit
+
+    def test_should_send_empty_payee_and_memo_as_null(self) -> None:
+        batch = make_batch([None], ["1"], ["0"])  # type: ignore[list-item]
+        (result,) = transactions("acct", batch, ["0" * 64])
+        assert result["payee_name"] is None
+        assert result["memo"] is None
+        assert result["import_id"] == import_id("0" * 64)
+
+
+class TestYnabApiWriter:
+    def test_should_send_in_batches_over_one_connection(self, server: StandInServer) -> None:
+        batch = make_batch([f"memo {i}" for i in range(25)], ["1"] * 25, ["0"] * 25)
+        options = ExportOptions("budget", server.base_url, "token", {"Savings": "id-1"}, batch_size=10)
+        cut = YnabApiWriter(options, YnabClient(server.base_url, "token"))
+        cut.write("CH12", "Savings", batch, fingerprints("CH12", batch))
+        assert cut.close() == []
+        assert [len(request["transactions"]) for request in server.requests] == [10, 10, 5]
+        assert {request["path"] for request in server.requests} == {"/v1/budgets/budget/transactions"}
+        assert {request["authorization"] for request in server.requests} == {"Bearer token"}
+        assert {t["account_id"] for t in posted(server)} == {"id-1"}
+        assert len(server.client_ports) == 1
+
+    def test_should_retry_server_errors(self, server: StandInServer) -> None:
+        server.statuses = [503, 429]
+        batch = make_batch(["a"], ["1"], ["0"])
+        cut = YnabApiWriter(ExportOptions("budget", server.base_url), YnabClient(server.base_url, backoff=0.01))
+        cut.write("CH12", "CH12", batch, fingerprints("CH12", batch))
+        cut.close()
+        assert len(posted(server)) == 1
+
+    def test_should_raise_for_rejected_request(self, server: StandInServer) -> None:
+        server.statuses = [400]
+        client = YnabClient(server.base_url, backoff=0.01)
+        with pytest.raises(ExportError, match="HTTP 400"):
+            client.post("/budgets/b/transactions", {"transactions": []})
+
+    def test_should_give_up_after_max_retries(self, server: StandInServer) -> None:
+        server.statuses = [500] * 3
+        client = YnabClient(server.base_url, max_retries=2, backoff=0.01)
+        with pytest.raises(ExportError, match="failed 3 times"):
+            client.post("/budgets/b/transactions", {"transactions": []})
+        assert server.requests == []
+
+
+class TestMain:
+    def test_should_send_statement_instead_of_writing_csv(
+        self,
+        tmp_path: Path,
+        server: StandInServer,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setenv("YNAB_ACCESS_TOKEN", "secret")
+        argv = [str(raiffeisen_csv_example_path), "-d", str(tmp_path / "out.csv"), "-m", str(mapping_path)]
+        argv += ["--ynab-budget", "b1", "--ynab-url", server.base_url, "--ynab-batch-size", "4"]
+        main(argv)
+        main(argv)
+        assert not list(tmp_path.glob("out*.csv"))
+        n_rows = sum(len(batch) for batch in ynabify.convert(raiffeisen_csv_example_path).batches.values())
+        assert len(server.import_ids) == n_rows
+        assert len(posted(server)) == 2 * n_rows
+        assert {request["authorization"] for request in server.requests} == {"Bearer secret"}
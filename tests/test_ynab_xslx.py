@@ -80,3 +80,9 @@ class TestGetTransactions:
         df = cut.get_transactions()["main"]
         assert all(df["Inflow"] >= 0)
         assert all(df["Outflow"] >= 0)
+
+    def test_should_treat_empty_cells_as_zero(self) -> None:
+        df = YnabXlsx(example_path).get_transactions()["main"]
+        assert list(df["Inflow"]) == [Decimal(0), Decimal(100), Decimal(0), Decimal(0), Decimal(0)]
+        assert list(df["Outflow"]) == [Decimal(32), Decimal(0), Decimal("2.5"), Decimal(49), Decimal(10)]
+        assert tuple(df.columns) == YnabXlsx.target_columns
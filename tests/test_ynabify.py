@@ -1,9 +1,13 @@
+import json
+import logging
+import pstats
 import shutil
 from pathlib import Path
 
 import pandas as pd
 import pytest
 
+import ynabify.writer
 from ynabify.ynabify import main
 
 swisscard_xlsx_example_path = Path("tests/data/swisscard_xlsx/example_bill_de.xlsx").resolve()
@@ -80,7 +84,200 @@ class TestYnabify:
         assert len(df.index) > 0
         assert pd.notna(df["Payee"]).all()
 
+    def test_should_stream_in_chunks(self, tmp_path: Path) -> None:
+        main(argv=[str(raiffeisen_csv_example_path), "-d", str(tmp_path / "full.csv")])
+        main(argv=[str(raiffeisen_csv_example_path), "-d", str(tmp_path / "chunked.csv"), "--chunksize", "2"])
+        for account in ("CH1234567890123456788", "CH1234567890123456789"):
+            full = (tmp_path / f"full_{account}.csv").read_bytes()
+            chunked = (tmp_path / f"chunked_{account}.csv").read_bytes()
+            assert full == chunked
+
     @pytest.mark.xfail
     def test_manual_path(self) -> None:
         args = [r"foo", "--mapping", "./mapping.xlsx", "-d", "output_path"]
         main(argv=args)
+
+
+class TestBatch:
+    @pytest.fixture
+    def statements_dir(self, tmp_path: Path) -> Path:
+        src_dir = tmp_path / "statements"
+        src_dir.mkdir()
+        shutil.copyfile(swisscard_xlsx_example_path, src_dir / "card.xlsx")
+        shutil.copyfile(ynab_xlsx_example_path, src_dir / "ynab.xlsx")
+        return src_dir
+
+    def test_should_convert_all_files_in_directory(self, statements_dir: Path) -> None:
+        main(argv=[str(statements_dir), "-j", "1"])
+        assert (statements_dir / "card_ynab.csv").exists()
+        assert (statements_dir / "ynab_ynab.csv").exists()
+
+    def test_should_convert_in_process_pool(self, statements_dir: Path, tmp_path: Path) -> None:
+        out_dir = tmp_path / "out"
+        main(argv=[str(statements_dir / "*.xlsx"), "-d", str(out_dir), "-j", "2"])
+        assert sorted(p.name for p in out_dir.iterdir()) == ["card_ynab.csv", "ynab_ynab.csv"]
+
+    def test_should_refuse_sources_sharing_an_output(self, tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+        for bank in ("a", "b"):
+            (tmp_path / bank).mkdir()
+            shutil.copyfile(swisscard_xlsx_example_path, tmp_path / bank / "export.xlsx")
+        out_dir = tmp_path / "out"
+        with pytest.raises(SystemExit):
+            main(argv=[str(tmp_path / "*" / "export.xlsx"), "-d", str(out_dir), "-j", "2"])
+        assert "export_ynab.xlsx" in caplog.text
+        assert str(tmp_path / "a" / "export.xlsx") in caplog.text
+        assert not out_dir.exists()
+
+    def test_should_skip_own_output_files(self, statements_dir: Path) -> None:
+        main(argv=[str(statements_dir), "-j", "1"])
+        main(argv=[str(statements_dir), "-j", "1"])
+        assert not list(statements_dir.glob("*_ynab_ynab*"))
+
+    def test_should_report_failures_per_file(self, statements_dir: Path, caplog: pytest.LogCaptureFixture) -> None:
+        caplog.set_level(logging.INFO)
+        shutil.copyfile(Path("tests/data/swisscard_xlsx/empty_excel.xlsx"), statements_dir / "broken.xlsx")
+        with pytest.raises(SystemExit):
+            main(argv=[str(statements_dir), "-j", "1"])
+        assert "FAILED" in caplog.text
+        assert "broken.xlsx" in caplog.text
+        assert "Converted 2 of 3 files" in caplog.text
+        assert (statements_dir / "card_ynab.csv").exists()
+
+
+class TestMerge:
+    def test_should_write_one_csv_per_account_without_duplicates(self, tmp_path: Path) -> None:
+        lines = raiffeisen_csv_example_path.read_text(encoding="cp1252").splitlines(keepends=True)
+        older, newer = tmp_path / "older.csv", tmp_path / "newer.csv"
+        older.write_text("".join(lines[:6]), encoding="cp1252")
+        newer.write_text("".join([lines[0], *lines[3:]]), encoding="cp1252")
+        main(argv=[str(tmp_path / "*.csv"), "--merge", "-d", str(tmp_path / "out")])
+        main(argv=[str(raiffeisen_csv_example_path), "-d", str(tmp_path / "single.csv")])
+
+        merged = sorted(tmp_path.glob("out_*.csv"))
+        assert [p.name for p in merged] == [p.name.replace("single", "out") for p in sorted(tmp_path.glob("single_*"))]
+        for merged_path in merged:
+            single = pd.read_csv(merged_path.with_name(merged_path.name.replace("out", "single")))
+            assert_frame = pd.read_csv(merged_path)
+            assert sorted(map(tuple, assert_frame.fillna("").to_numpy().tolist())) == sorted(
+                map(tuple, single.fillna("").to_numpy().tolist()),
+            )
+
+    def test_should_default_to_merged_file_next_to_statements(self, tmp_path: Path) -> None:
+        shutil.copyfile(swisscard_xlsx_example_path, tmp_path / "a.xlsx")
+        shutil.copyfile(swisscard_xlsx_example_path, tmp_path / "b.xlsx")
+        main(argv=[str(tmp_path), "--merge"])
+        assert len(pd.read_csv(tmp_path / "merged_ynab.csv")) == 3
+
+
+class TestSelection:
+    def test_should_only_write_selected_dates_and_accounts(self, tmp_path: Path) -> None:
+        args = [str(raiffeisen_csv_example_path), "-d", str(tmp_path / "out.csv")]
+        main(argv=[*args, "--since", "2024-11-24", "--account", "CH1234567890123456789"])
+        assert [p.name for p in tmp_path.glob("out*.csv")] == ["out.csv"]
+        assert len(pd.read_csv(tmp_path / "out.csv")) == 3
+
+    def test_should_split_months(self, tmp_path: Path) -> None:
+        main(argv=[str(swisscard_xlsx_example_path), "-d", str(tmp_path / "out.csv"), "--split-months"])
+        sizes = {p.name: len(pd.read_csv(p)) for p in tmp_path.glob("out*.csv")}
+        assert sizes == {"out_2024-05.csv": 1, "out_2024-04.csv": 1, "out_2024-02.csv": 1}
+
+    def test_should_filter_cached_statements(self, tmp_path: Path) -> None:
+        main(argv=[str(swisscard_xlsx_example_path), "-d", str(tmp_path / "all.csv")])
+        main(argv=[str(swisscard_xlsx_example_path), "-d", str(tmp_path / "feb.csv"), "--until", "2024-02-29"])
+        assert len(pd.read_csv(tmp_path / "all.csv")) == 3
+        assert len(pd.read_csv(tmp_path / "feb.csv")) == 1
+
+
+class TestIncremental:
+    def test_should_only_write_new_transactions(self, tmp_path: Path) -> None:
+        ledger_path = tmp_path / "ledger.sqlite3"
+        args = [str(swisscard_xlsx_example_path), "--ledger", str(ledger_path), "--incremental"]
+        main(argv=[*args, "-d", str(tmp_path / "first.csv")])
+        main(argv=[*args, "-d", str(tmp_path / "second.csv")])
+        assert len(pd.read_csv(tmp_path / "first.csv")) == 3
+        assert len(pd.read_csv(tmp_path / "second.csv")) == 0
+
+    def test_should_write_everything_without_incremental(self, tmp_path: Path) -> None:
+        ledger_path = tmp_path / "ledger.sqlite3"
+        main(argv=[str(swisscard_xlsx_example_path), "--ledger", str(ledger_path), "-d", str(tmp_path / "first.csv")])
+        main(argv=[str(swisscard_xlsx_example_path), "--ledger", str(ledger_path), "-d", str(tmp_path / "second.csv")])
+        assert len(pd.read_csv(tmp_path / "second.csv")) == 3
+
+    def test_should_not_record_transactions_of_locked_file(
+        self,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        def replace(_src: Path, dst: Path) -> None:
+            raise PermissionError(dst)
+
+        args = [str(swisscard_xlsx_example_path), "--ledger", str(tmp_path / "ledger.sqlite3"), "--incremental"]
+        with monkeypatch.context() as m:
+            m.setattr(ynabify.writer.os, "replace", replace)
+            m.setattr(ynabify.writer.time, "sleep", lambda _: None)
+            with pytest.raises(SystemExit):
+                main(argv=[*args, "-d", str(tmp_path / "first.csv")])
+        assert not list(tmp_path.glob("*.csv"))
+        main(argv=[*args, "-d", str(tmp_path / "second.csv")])
+        assert len(pd.read_csv(tmp_path / "second.csv")) == 3
+
+    def test_should_tell_cards_apart(self, tmp_path: Path) -> None:
+        import openpyxl
+
+        other_card_path = tmp_path / "other_card.xlsx"
+        workbook = openpyxl.load_workbook(swisscard_xlsx_example_path)
+        for (cell,) in workbook.active.iter_rows(min_row=2, min_col=4, max_col=4):
+            cell.value = "9876 54**** *3210"
+        workbook.save(other_card_path)
+        args = ["--ledger", str(tmp_path / "ledger.sqlite3"), "--incremental"]
+        main(argv=[str(swisscard_xlsx_example_path), *args, "-d", str(tmp_path / "first.csv")])
+        main(argv=[str(other_card_path), *args, "-d", str(tmp_path / "second.csv")])
+        assert len(pd.read_csv(tmp_path / "second.csv")) == 3
+
+    def test_should_use_default_ledger(self, tmp_path: Path) -> None:
+        main(argv=[str(swisscard_xlsx_example_path), "--incremental", "-d", str(tmp_path / "out.csv")])
+        assert (tmp_path / "data" / "ledger.sqlite3").exists()
+
+
+class TestMetrics:
+    def test_should_write_metrics_json(self, tmp_path: Path) -> None:
+        metrics_path = tmp_path / "metrics.json"
+        main(
+            argv=[
+                str(raiffeisen_csv_example_path),
+                "-d",
+                str(tmp_path / "out.csv"),
+                "--metrics-json",
+                str(metrics_path),
+            ]
+        )
+        stages = json.loads(metrics_path.read_text())["stages"]
+        assert list(stages) == ["detect", "read", "mapping", "parse", "payees", "write"]
+        assert stages["parse"]["rows"] == 5
+        assert stages["write"]["peak_bytes"] > 0
+
+    def test_should_log_summary_and_dump_profile(self, tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+        caplog.set_level(logging.INFO)
+        profile_path = tmp_path / "hot.prof"
+        args = [str(swisscard_xlsx_example_path), "-d", str(tmp_path / "out.csv"), "--profile"]
+        main(argv=[*args, "--profile-dump", str(profile_path)])
+        assert "Stage metrics" in caplog.text
+        assert pstats.Stats(str(profile_path)).get_stats_profile().func_profiles
+
+    def test_should_merge_metrics_of_batch(self, tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        src_dir = tmp_path / "statements"
+        src_dir.mkdir()
+        shutil.copyfile(ynab_xlsx_example_path, src_dir / "a.xlsx")
+        shutil.copyfile(ynab_xlsx_example_path, src_dir / "b.xlsx")
+        main(argv=[str(src_dir), "-j", "2", "--metrics-json", "-"])
+        stages = json.loads(capsys.readouterr().out)["stages"]
+        assert stages["detect"]["calls"] == 2
+        assert stages["write"]["rows"] == 2 * 5
+
+
+class TestWatchCommand:
+    def test_should_show_watch_help(self, capsys: pytest.CaptureFixture[str]) -> None:
+        with pytest.raises(SystemExit):
+            main(argv=["watch", "--help"])
+        out, err = capsys.readouterr()
+        assert "ynabify watch" in out